@@ -1,28 +1,425 @@
+import contextlib
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import openai
+import tiktoken
+
+from sdb.cache import ContentCache
+from sdb.models import db
+from sdb.rate_limit import RateLimiter
 
 # Add OpenAI API key to environment
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+MODEL = "gpt-3.5-turbo"
 
-def get_ai_summary_for_arabic_text(text):
-    """Makes request to OpenAI API to summarize Arabic article in English."""
+SYSTEM_PROMPT = "Write a direct, shorthand summary in English of the included Arabic article. Include only summarized content."
 
-    # Make request to OpenAI API
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {
-                "role": "system",
-                "content": "Write a direct, shorthand summary in English of the included Arabic article. Include only summarized content."
-            },
-            {
-                "role": "user",
-                "content": text
-            }
+CHUNK_PROMPT = "Write a direct, shorthand summary in English of the included part of an Arabic article. Include only summarized content."
+
+MERGE_PROMPT = "Combine the included partial summaries of one article into a single direct, shorthand summary in English. Include only summarized content."
+
+# Longer articles are summarized in chunks of CHUNK_TOKENS, then merged
+MAX_SINGLE_SHOT_TOKENS = 3000
+CHUNK_TOKENS = 2000
 
-        ]
+# Requests in flight at once while summarizing many entries
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", 8))
+
+# Budgets for the account's OpenAI rate limits
+DEFAULT_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", 3500))
+DEFAULT_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", 90000))
+
+if DEFAULT_REQUESTS_PER_MINUTE <= 0 or DEFAULT_TOKENS_PER_MINUTE <= 0:
+    raise ValueError(
+        "OPENAI_REQUESTS_PER_MINUTE and OPENAI_TOKENS_PER_MINUTE must be positive"
     )
 
+# The budgets are the account's, so every SummaryScheduler in this process
+# shares them
+LIMITER = RateLimiter(DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_TOKENS_PER_MINUTE)
+
+# Summaries written to the db per commit
+DEFAULT_SUMMARY_BATCH_SIZE = 20
+
+# Retries for rate limited or failed requests, with exponential backoff
+MAX_RETRIES = 5
+BACKOFF_BASE = 1
+BACKOFF_MAX = 60
+
+# Rough size of a request: the prompt and a budget for the reply. Without the
+# tokenizer, Arabic runs about 2 characters per token.
+CHARS_PER_TOKEN = 2
+REQUEST_TOKEN_OVERHEAD = 500
+
+# MODEL's tiktoken encoding, loaded on first use (False if unavailable)
+ENCODING = None
+
+# Summaries shared across entries and collections, keyed by a hash of model,
+# prompt and article text
+SUMMARY_CACHE = ContentCache("summary")
+
+# Errors worth retrying
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.APIError,
+    openai.error.APIConnectionError,
+    openai.error.Timeout,
+    openai.error.ServiceUnavailableError,
+)
+
+
+def get_summary_cache_text(text, model=MODEL, prompt=SYSTEM_PROMPT):
+    """Returns what a summary is cached under, so changing the model or prompt
+    never serves an old summary.
+    """
+
+    if text is None:
+        return None
+
+    return "\n".join([model, prompt, text])
+
+
+def get_encoding():
+    """Returns MODEL's tiktoken encoding, or None if it can't be loaded (its
+    data is downloaded on first use, so e.g. offline).
+    """
+
+    global ENCODING
+
+    if ENCODING is None:
+        try:
+            ENCODING = tiktoken.encoding_for_model(MODEL)
+        except Exception as e:
+            print(f"Tokenizer unavailable ({e}), estimating token counts")
+            ENCODING = False
+
+    return ENCODING or None
+
+
+def count_tokens(text):
+    """Returns the number of tokens in text."""
+
+    encoding = get_encoding()
+
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN
+
+    return len(encoding.encode(text))
+
+
+def split_into_chunks(text, max_tokens=None):
+    """Splits text into chunks of at most max_tokens (default CHUNK_TOKENS)
+    tokens. Chunks end on paragraph boundaries, unless a single paragraph is
+    too long by itself.
+    """
+
+    max_tokens = max_tokens or CHUNK_TOKENS
+
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    for paragraph in text.splitlines():
+        if not paragraph.strip():
+            continue
+
+        tokens = count_tokens(paragraph)
+
+        # Starts a new chunk if this paragraph doesn't fit
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("\n".join(current))
+            current = []
+            current_tokens = 0
+
+        if tokens > max_tokens:
+            chunks += split_paragraph(paragraph, max_tokens)
+            continue
+
+        current.append(paragraph)
+        current_tokens += tokens
+
+    if current:
+        chunks.append("\n".join(current))
+
+    return chunks
+
+
+def split_paragraph(paragraph, max_tokens):
+    """Splits a single paragraph into pieces of at most max_tokens tokens."""
+
+    encoding = get_encoding()
+
+    if encoding is None:
+        size = max_tokens * CHARS_PER_TOKEN
+        return [paragraph[i : i + size] for i in range(0, len(paragraph), size)]
+
+    tokens = encoding.encode(paragraph)
+    return [
+        encoding.decode(tokens[i : i + max_tokens])
+        for i in range(0, len(tokens), max_tokens)
+    ]
+
+
+def request_summary(text, prompt=SYSTEM_PROMPT, slots=None):
+    """Makes a single request to the OpenAI API to summarize text with the given
+    system prompt. Served from SUMMARY_CACHE if already summarized.
+
+    slots (a semaphore) caps the requests in flight across every caller that
+    shares it.
+    """
+
+    cache_text = get_summary_cache_text(text, prompt=prompt)
+    cached_summary = SUMMARY_CACHE.get(cache_text)
+
+    if cached_summary is not None:
+        return cached_summary
+
+    # Make request to OpenAI API
+    with slots or contextlib.nullcontext():
+        response = openai.ChatCompletion.create(
+            model=MODEL,
+            messages=[
+                {
+                    "role": "system",
+                    "content": prompt
+                },
+                {
+                    "role": "user",
+                    "content": text
+                }
+
+            ]
+        )
+
     ai_summary = response["choices"][0]["message"]["content"]
-    return ai_summary
\ No newline at end of file
+    SUMMARY_CACHE.set(cache_text, ai_summary)
+    return ai_summary
+
+
+def get_ai_summary_for_arabic_text(
+    text, max_workers=DEFAULT_MAX_CONCURRENCY, slots=None
+):
+    """Makes request to OpenAI API to summarize Arabic article in English.
+    Articles longer than MAX_SINGLE_SHOT_TOKENS are summarized in chunks (see
+    summarize_in_chunks for max_workers and slots).
+    """
+
+    if text is None or count_tokens(text) <= MAX_SINGLE_SHOT_TOKENS:
+        return request_summary(text, slots=slots)
+
+    cache_text = get_summary_cache_text(text)
+    cached_summary = SUMMARY_CACHE.get(cache_text)
+
+    if cached_summary is not None:
+        return cached_summary
+
+    ai_summary = summarize_in_chunks(text, max_workers=max_workers, slots=slots)
+    SUMMARY_CACHE.set(cache_text, ai_summary)
+    return ai_summary
+
+
+def summarize_in_chunks(text, max_workers=DEFAULT_MAX_CONCURRENCY, slots=None):
+    """Map-reduce summary of a long article: every chunk is summarized in
+    parallel, then the partial summaries are merged. Partial summaries too long
+    to merge at once are merged in parallel rounds first.
+
+    Called for many articles at once (see SummaryScheduler), every request
+    waits for one of the caller's shared slots, so the articles' chunks
+    together stay within its concurrency limit.
+    """
+
+    chunks = split_into_chunks(text)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        partials = list(
+            executor.map(
+                lambda chunk: request_summary(chunk, CHUNK_PROMPT, slots), chunks
+            )
+        )
+
+        merged = "\n\n".join(partials)
+
+        while len(partials) > 1 and count_tokens(merged) > MAX_SINGLE_SHOT_TOKENS:
+            chunks = split_into_chunks(merged)
+
+            # Stops once another round wouldn't shrink the summaries any further
+            if len(chunks) >= len(partials):
+                break
+
+            partials = list(
+                executor.map(
+                    lambda chunk: request_summary(chunk, MERGE_PROMPT, slots), chunks
+                )
+            )
+            merged = "\n\n".join(partials)
+
+    if len(partials) == 1:
+        return partials[0]
+
+    return request_summary(merged, MERGE_PROMPT, slots)
+
+
+def estimate_tokens(text):
+    """Returns a rough count of the tokens a summary request for text uses."""
+
+    return count_tokens(text or "") + REQUEST_TOKEN_OVERHEAD
+
+
+def estimate_requests(text):
+    """Returns how many API requests summarizing text takes."""
+
+    if text is None or count_tokens(text) <= MAX_SINGLE_SHOT_TOKENS:
+        return 1
+
+    return len(split_into_chunks(text)) + 1
+
+
+def get_backoff_seconds(error, attempt):
+    """Returns how long to wait before retrying. Uses the server's Retry-After
+    header if it sent one, else jittered exponential backoff.
+    """
+
+    retry_after = (getattr(error, "headers", None) or {}).get("retry-after")
+
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+
+
+class SummaryScheduler:
+    """Summarizes many texts concurrently while staying inside the account's
+    request-per-minute and token-per-minute budgets. Rate limited and failed
+    requests are retried with backoff.
+
+    At most max_concurrency requests are in flight at once, counting the chunk
+    and merge requests of long texts. limiter (default LIMITER) holds the
+    budgets, which schedulers running side by side share.
+    """
+
+    def __init__(
+        self,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        limiter=None,
+        max_retries=MAX_RETRIES,
+    ):
+        if limiter is None:
+            limiter = LIMITER
+
+        self.max_concurrency = max_concurrency
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+    def summarize(self, text):
+        """Summarizes a single text once the budgets allow it, retrying
+        retryable errors up to max_retries times.
+        """
+
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(estimate_tokens(text), estimate_requests(text))
+
+            try:
+                return get_ai_summary_for_arabic_text(
+                    text, max_workers=self.max_concurrency, slots=self.slots
+                )
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+
+                wait = get_backoff_seconds(e, attempt)
+                print(f"OpenAI request failed ({e}), retrying in {wait:.1f}s")
+                time.sleep(wait)
+
+    def summarize_entries(
+        self, entries, batch_size=DEFAULT_SUMMARY_BATCH_SIZE, on_progress=None
+    ):
+        """Summarizes entries concurrently and writes each ai_summary back to
+        the db, committing every batch_size summaries. Must be called where the
+        entries' session lives; only the API calls run in worker threads.
+
+        Entries sharing the same text are summarized once, and texts already in
+        SUMMARY_CACHE aren't sent to the API at all.
+
+        If given, on_progress(done, total) is called after every commit with
+        the number of unique texts finished so far.
+
+        Returns a list of error messages for entries that couldn't be summarized.
+        """
+
+        errors = []
+        pending = {}
+
+        entries_by_text = {}
+        for e in entries:
+            entries_by_text.setdefault(e.full_text, []).append(e)
+
+        # Summaries already paid for, in this or another collection
+        cached = SUMMARY_CACHE.get_many(
+            [get_summary_cache_text(text) for text in entries_by_text]
+        )
+
+        total = len(entries_by_text)
+
+        for text in list(entries_by_text):
+            summary = cached.get(get_summary_cache_text(text))
+
+            if summary is not None:
+                for e in entries_by_text.pop(text):
+                    e.ai_summary = summary
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = {
+                executor.submit(self.summarize, text): text for text in entries_by_text
+            }
+
+            for done, future in enumerate(as_completed(futures), 1):
+                text = futures[future]
+
+                try:
+                    summary = future.result()
+                except Exception as e:
+                    errors += [
+                        f"Entry {entry.id}: {e}" for entry in entries_by_text[text]
+                    ]
+                    continue
+
+                for entry in entries_by_text[text]:
+                    entry.ai_summary = summary
+
+                pending[text] = summary
+
+                if len(pending) >= batch_size:
+                    self.save(pending)
+                    pending = {}
+
+                    if on_progress:
+                        on_progress(total - len(entries_by_text) + done, total)
+
+        self.save(pending)
+
+        if on_progress:
+            on_progress(total, total)
+
+        return errors
+
+    def save(self, summaries):
+        """Caches new {text: summary} pairs and commits the entries updated so
+        far.
+        """
+
+        SUMMARY_CACHE.set_many(
+            {
+                get_summary_cache_text(text): summary
+                for text, summary in summaries.items()
+            }
+        )
+        db.session.commit()
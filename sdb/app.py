@@ -12,10 +12,12 @@ from sdb.controller import (
     generate_excel_from_collection,
     add_entries_to_db,
 )
+from sdb.jobs import JOBS, fail_interrupted_jobs, set_progress
 from sdb.models import db, connect_db, Collection, Entry
 from sdb.schemas import (
     SummarizeSchema,
     EntrySchema,
+    JobSchema,
     MigrateSchema,
     PrintSchema,
     TranslateSchema,
@@ -27,12 +29,14 @@ load_dotenv()
 
 from sdb.blueprints.collections.routes import collection
 from sdb.blueprints.entries.routes import entry
+from sdb.blueprints.jobs.routes import job
 from sdb.blueprints.scrape.routes import scrape
 
 app = Flask(__name__)
 app.register_blueprint(collection, url_prefix="/api/collections")
 app.register_blueprint(entry, url_prefix="/api/entries")
 app.register_blueprint(scrape, url_prefix="/api/scrape")
+app.register_blueprint(job, url_prefix="/api/jobs")
 CORS(app)
 
 ma = Marshmallow(app)
@@ -49,6 +53,16 @@ app.json.sort_keys = False
 connect_db(app)
 
 
+@app.cli.command("fail-interrupted-jobs")
+def fail_interrupted_jobs_command():
+    """Marks jobs whose app process has exited as failed. Run it on startup,
+    before serving, so clients stop polling jobs that will never finish.
+    """
+
+    interrupted = fail_interrupted_jobs()
+    print(f"Marked {interrupted} interrupted jobs as failed")
+
+
 @app.post("/api/migrate_entries")
 def migrate_entries():
     """Adds entries to a given collection and returns updated collection.
@@ -108,13 +122,16 @@ def migrate_entries():
 # Translate multiple entries
 @app.post("/api/translate")
 def translate_entries():
-    """Translates multiple entries from a collection using Argos translate and
-    updates them in the db.
+    """Starts a background job that translates multiple entries from a
+    collection using Argos translate and updates them in the db. Poll
+    /api/jobs/<id> for progress and /api/jobs/<id>/result for the result.
 
     Accepts: {"entry_ids": [1, 34, 34]}
 
-    Returns: {"Translated":
-                [{id: 1 ...}, ...]}
+    Returns: {"job": {id: 1, kind: "translate", status: "queued", ...}}
+
+    Job result: {"Translated":
+                    [{id: 1 ...}, ...]}
     """
 
     # Gets JSON from request
@@ -126,39 +143,85 @@ def translate_entries():
 
     # Gets list of entry ids
     entry_ids = data["entry_ids"]
+
+    # Return error if no entries found
+    if not Entry.query.filter(Entry.id.in_(entry_ids)).count():
+        return jsonify({"error": "No entries found."}), 400
+
+    new_job = JOBS.submit("translate", translate_entries_job, entry_ids)
+
+    return jsonify(job=JobSchema().dump(new_job)), 202
+
+
+def translate_entries_job(job_id, entry_ids):
+    """Translates the given entries and updates them in the db. Runs as a
+    background job.
+    """
+
     entry_schema = EntrySchema(many=True)
 
     # Filters for entry ids with query
-    entries = Entry.query.filter(Entry.id.in_(entry_ids))
+    entries = Entry.query.filter(Entry.id.in_(entry_ids)).all()
 
-    if not entries.all():
-        return jsonify({"error": "No entries found."}), 400
-
-    # Translate all entries in list if list contains values
-    translation.initialize_argostranslate()
+    # Translate all entries in one batch, spread across every core
+    translations = translation.translate_entries_batch(
+        entries, on_progress=lambda done, total: set_progress(job_id, done, total)
+    )
 
-    for e in entries:
-        [en_title, en_full_text] = translation.get_translated_entry_title_and_text(e)
+    for e, [en_title, en_full_text] in zip(entries, translations):
         e.title_translated = en_title
         e.full_text_translated = en_full_text
 
     db.session.commit()
 
-    results = entry_schema.dump(entries)
+    return {"Translated": entry_schema.dump(entries)}
 
-    return jsonify({"Translated": results})
+
+@app.get("/api/translate/status")
+def get_translation_status():
+    """Returns the health status of the translation engine and the hit rate of
+    the translation memory.
+
+    Returns: {"status": "cold" | "loading" | "ready" | "error", ...,
+              "translation_memory": {"hit_rate": 0.41, ...}}
+    """
+
+    status = translation.ENGINE.get_status()
+    status["translation_memory"] = translation.TRANSLATION_MEMORY.get_stats()
+
+    return jsonify(status)
+
+
+@app.post("/api/translate/warm_up")
+def warm_up_translation():
+    """Installs (if needed) and loads the translation model so the first
+    /api/translate call doesn't have to.
+
+    Returns: {"status": "ready", ...}
+    """
+
+    try:
+        translation.ENGINE.warm_up()
+    except translation.TranslationError:
+        return jsonify(translation.ENGINE.get_status()), 503
+
+    return jsonify(translation.ENGINE.get_status())
 
 
 # Summarize multiple entries
 @app.post("/api/summarize")
 def summarize_entries():
-    """Uses the OpenAI API to summarize given entries and update them in the
-    database
+    """Starts a background job that uses the OpenAI API to summarize given
+    entries and update them in the database. Poll /api/jobs/<id> for progress
+    and /api/jobs/<id>/result for the result.
 
     Accepts: {"entry_ids": [1, 34, 34]}
 
-    Returns: {"Summarized":
-                [{id: 1 ...}, ...]}
+    Returns: {"job": {id: 1, kind: "summarize", status: "queued", ...}}
+
+    Job result: {"Summarized":
+                    [{id: 1 ...}, ...],
+                 "errors": ["Entry 34: ...", ...] (only if some entries failed)}
     """
 
     # Load OpenAI API key (will return None if not found)
@@ -177,25 +240,39 @@ def summarize_entries():
 
     # Gets list of entry ids
     entry_ids = data["entry_ids"]
-    entry_schema = EntrySchema(many=True)
-
-    # Filters for entry ids with query
-    entries = Entry.query.filter(Entry.id.in_(entry_ids))
 
     # Return error if no entries found
-    if not entries.all():
+    if not Entry.query.filter(Entry.id.in_(entry_ids)).count():
         return jsonify({"error": "No entries found."}), 400
 
-    # Summarize all entries in list if list contains values
-    if entries:
-        for e in entries:
-            e.ai_summary = ai_utils.get_ai_summary_for_arabic_text(e.full_text)
+    new_job = JOBS.submit("summarize", summarize_entries_job, entry_ids)
 
-    db.session.commit()
+    return jsonify(job=JobSchema().dump(new_job)), 202
+
+
+def summarize_entries_job(job_id, entry_ids):
+    """Summarizes the given entries and updates them in the db. Runs as a
+    background job.
+    """
+
+    entry_schema = EntrySchema(many=True)
+
+    # Filters for entry ids with query
+    entries = Entry.query.filter(Entry.id.in_(entry_ids)).all()
+
+    # Summarize entries concurrently within the OpenAI rate limits. Summaries
+    # are committed in batches as they come back.
+    scheduler = ai_utils.SummaryScheduler()
+    errors = scheduler.summarize_entries(
+        entries, on_progress=lambda done, total: set_progress(job_id, done, total)
+    )
 
     results = entry_schema.dump(entries)
 
-    return jsonify({"Summarized": results})
+    if errors:
+        return {"Summarized": results, "errors": errors}
+
+    return {"Summarized": results}
 
 
 # Print to excel
@@ -203,7 +280,13 @@ def summarize_entries():
 
 @app.post("/api/print")
 def generate_excel():
-    """Generates an excel and saves it to the server"""
+    """Starts a background job that generates an excel and saves it to the
+    server.
+
+    Returns: {"job": {id: 1, kind: "print", status: "queued", ...}}
+
+    Job result: {"message": "Excel generated", "path": "../excels/..."}
+    """
 
     # Gets JSON from request
     data = request.get_json()
@@ -216,13 +299,17 @@ def generate_excel():
     # Verifies that collection exists
     Collection.query.get_or_404(collection_id)
 
-    # Generates excel
-    try:
-        generate_excel_from_collection(collection_id)
-    except Exception as e:
-        return jsonify(error=str(e)), 400
+    new_job = JOBS.submit("print", generate_excel_job, collection_id)
+
+    return jsonify(job=JobSchema().dump(new_job)), 202
+
+
+def generate_excel_job(job_id, collection_id):
+    """Generates an excel for a collection. Runs as a background job."""
+
+    path = generate_excel_from_collection(collection_id)
 
-    return jsonify(message="Excel generated"), 200
+    return {"message": "Excel generated", "path": path}
 
 
 # Error handlers
@@ -0,0 +1,501 @@
+# Benchmarks comparing scraping engines against a local stub HTTP server, so
+# results don't depend on (or hammer) the real publications.
+#
+# Run from the project root with:
+#
+#   python -m sdb.benchmark --publications 6 --pages 3 --latency 0.2
+#
+# The bulk_insert benchmark writes to (and cleans up after itself in) the db
+# configured by DATABASE_URL:
+#
+#   python -m sdb.benchmark bulk_insert --entries 20000 --chunk-size 1000
+#
+# The parsing benchmark compares parser backends on stub pages padded to the
+# size of real ones:
+#
+#   python -m sdb.benchmark parsing --pages 20 --padding 200000
+#
+# The parse_pool benchmark extracts article pages from worker threads, with
+# and without the process pool:
+#
+#   python -m sdb.benchmark parse_pool --pages 40 --padding 200000
+#
+# The extraction benchmark measures the CPU time spent reading each article's
+# fields out of already parsed listing and article pages:
+#
+#   python -m sdb.benchmark extraction --pages 20 --padding 200000
+#
+# The streaming benchmark downloads and parses listing pages in full, and
+# streamed only up to the end of the listing:
+#
+#   python -m sdb.benchmark streaming --pages 20 --padding 200000
+
+import argparse
+import datetime
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sdb.scrapers import dez24
+from sdb.scrapers.base_scraper import DEFAULT_MAX_WORKERS
+from sdb.scrapers.parse_pool import ParsePool
+from sdb.scrapers.async_scraper import crawl
+
+# Newest article served by the stub server
+STUB_START_TIMESTAMP = datetime.datetime(
+    2023, 7, 23, 12, tzinfo=datetime.timezone.utc
+).timestamp()
+
+# Articles listed on each stub listing page
+STUB_ARTICLES_PER_PAGE = 10
+
+# Seconds between consecutive stub articles
+STUB_ARTICLE_INTERVAL = 3600
+
+
+def get_stub_article_timestamp(page_num, index):
+    """Returns the timestamp of the index-th article on a stub listing page."""
+
+    position = (page_num - 1) * STUB_ARTICLES_PER_PAGE + index
+    return STUB_START_TIMESTAMP - position * STUB_ARTICLE_INTERVAL
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves Deir Ezzor 24-shaped pages:
+
+    /<publication>/page/<page_num>/              listing page
+    /<publication>/article/<page_num>/<index>/   article page
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.count_request()
+
+        # Simulated network/server latency
+        time.sleep(self.server.latency)
+
+        parts = self.path.strip("/").split("/")
+
+        if len(parts) == 3 and parts[1] == "page":
+            body = self.listing_page(parts[0], int(parts[2]))
+        elif len(parts) == 4 and parts[1] == "article":
+            body = self.article_page(int(parts[2]), int(parts[3]))
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def listing_page(self, publication, page_num):
+        """Returns a listing page of links to stub articles."""
+
+        articles = ""
+        for index in range(STUB_ARTICLES_PER_PAGE):
+            link = f"{self.server.url}/{publication}/article/{page_num}/{index}/"
+            articles += (
+                f'<article><h2 class="entry-title">'
+                f'<a href="{link}">عنوان {page_num}-{index}</a></h2></article>'
+            )
+
+        # Padding stands in for the navigation and widgets of a real page
+        return (
+            f"<html><head><title>{publication}</title></head><body>"
+            f'<div class="vce-loop-wrap">{articles}</div>'
+            f'<div class="footer">{self.server.padding}</div></body></html>'
+        )
+
+    def article_page(self, page_num, index):
+        """Returns a stub article page."""
+
+        date_posted = datetime.datetime.fromtimestamp(
+            get_stub_article_timestamp(page_num, index), tz=datetime.timezone.utc
+        ).strftime("%Y-%m-%dT%H:%M:%S%z")
+
+        paragraphs = "".join(f"<p>فقرة {i} من المقالة</p>" for i in range(10))
+
+        return (
+            f'<html><head><meta property="article:published_time" '
+            f'content="{date_posted}"/></head><body>'
+            f'<div class="entry-content">{paragraphs}</div>'
+            f'<div class="footer">{self.server.padding}</div></body></html>'
+        )
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    """Local HTTP server for benchmarks and tests. Runs in a daemon thread."""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, latency=0.0, padding_bytes=20000):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.latency = latency
+        self.padding = "<span>.</span>" * (padding_bytes // 14)
+        self.url = f"http://127.0.0.1:{self.server_port}"
+        self.request_count = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def count_request(self):
+        with self.lock:
+            self.request_count += 1
+
+    def handle_error(self, request, client_address):
+        # Clients that stop reading a streamed page close the connection early
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def make_stub_scraper(server, publication):
+    """Returns a DEZ24 scraper pointed at the stub server."""
+
+    scraper = dez24.DEZ24()
+    scraper.config = scraper.config._replace(
+        url_template=f"{server.url}/{publication}/page/{{page_num}}/",
+        publication=publication,
+        # Measures the engines, not the politeness limits
+        requests_per_second=None,
+    )
+    return scraper
+
+
+def get_stub_stop_timestamp(pages):
+    """Returns a stop timestamp that makes a scraper read exactly `pages` pages."""
+
+    return get_stub_article_timestamp(pages + 1, 0) + STUB_ARTICLE_INTERVAL / 2
+
+
+def report(name, server, start, results):
+    """Prints throughput for a single benchmark run."""
+
+    elapsed = time.perf_counter() - start
+    articles = sum(r.article_count for r in results)
+    print(
+        f"{name:>8}: {articles} articles, {server.request_count} requests in "
+        f"{elapsed:.2f}s ({server.request_count / elapsed:.1f} req/s)"
+    )
+
+
+def report_rows(name, rows, start):
+    """Prints throughput for a single db benchmark run."""
+
+    elapsed = time.perf_counter() - start
+    print(f"{name:>8}: {rows} rows in {elapsed:.2f}s ({rows / elapsed:.0f} rows/s)")
+
+
+def benchmark_engines(publications=6, pages=3, latency=0.2, padding_bytes=2000):
+    """Crawls the same stub publications with the threaded (requests) engine and
+    the asyncio (aiohttp) engine and prints throughput for each.
+    """
+
+    stop_timestamp = get_stub_stop_timestamp(pages)
+    names = [f"publication{i}" for i in range(publications)]
+
+    server = StubServer(latency=latency, padding_bytes=padding_bytes).start()
+
+    try:
+        # Synchronous path: one thread per publication, as run_selected_scrapers
+        scrapers = [make_stub_scraper(server, name) for name in names]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=publications) as executor:
+            results = list(
+                executor.map(lambda s: s.get_data(stop_timestamp), scrapers)
+            )
+        report("threads", server, start, results)
+
+        # Asyncio path: every publication on one event loop. The stub serves all
+        # publications from one host, so the per-host limit is lifted.
+        server.request_count = 0
+        scrapers = [make_stub_scraper(server, name) for name in names]
+        start = time.perf_counter()
+        results = crawl(scrapers, stop_timestamp, limit_per_host=0)
+        report("asyncio", server, start, results)
+    finally:
+        server.stop()
+
+
+def benchmark_parsing(pages=20, padding_bytes=200000):
+    """Extracts the same stub listing and article pages with html.parser, with
+    lxml, and with lxml limited to the scraper's strainers, and prints pages
+    parsed per second for each.
+    """
+
+    server = StubServer(padding_bytes=padding_bytes).start()
+
+    try:
+        scraper = make_stub_scraper(server, "parsing")
+
+        # Parses in this thread, so only the parser backends are measured
+        scraper.parse_pool = None
+        listing_urls = [
+            scraper.config.url_template.format(page_num=page_num)
+            for page_num in range(1, pages + 1)
+        ]
+        article_urls = [
+            f"{server.url}/parsing/article/{page_num}/0/"
+            for page_num in range(1, pages + 1)
+        ]
+        bodies = {
+            url: scraper.get_page_content(url) for url in listing_urls + article_urls
+        }
+    finally:
+        server.stop()
+
+    configs = {
+        "html": scraper.config._replace(
+            parser="html.parser", listing_strainer=None, article_strainer=None
+        ),
+        "lxml": scraper.config._replace(
+            parser="lxml", listing_strainer=None, article_strainer=None
+        ),
+        "strained": scraper.config._replace(parser="lxml"),
+    }
+
+    for name, config in configs.items():
+        scraper.config = config
+        start = time.perf_counter()
+
+        for url in listing_urls:
+            soup = scraper.make_soup(bodies[url], parse_only=config.listing_strainer)
+            scraper.get_listing_details(scraper.get_all_articles(soup))
+
+        for url in article_urls:
+            scraper.prefetched_pages[url] = bodies[url]
+            scraper.get_full_text_and_date_posted(url)
+
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:>8}: {len(bodies)} pages in {elapsed:.2f}s "
+            f"({len(bodies) / elapsed:.1f} pages/s)"
+        )
+
+
+def benchmark_parse_pool(pages=40, padding_bytes=200000, threads=DEFAULT_MAX_WORKERS):
+    """Extracts the same stub article pages from a pool of threads, parsing in
+    the threads themselves and in the parse pool, and prints pages parsed per
+    second for each.
+    """
+
+    server = StubServer(padding_bytes=padding_bytes).start()
+
+    try:
+        scraper = make_stub_scraper(server, "parse_pool")
+        urls = [
+            f"{server.url}/parse_pool/article/{page_num}/0/"
+            for page_num in range(1, pages + 1)
+        ]
+        bodies = {url: scraper.get_page_content(url) for url in urls}
+    finally:
+        server.stop()
+
+    pool = ParsePool()
+
+    # Starts the workers so their start-up time isn't measured
+    pool.extract_article(type(scraper), scraper.config, bodies[urls[0]])
+
+    try:
+        for name, parse_pool in (("threads", None), ("pool", pool)):
+            scraper.parse_pool = parse_pool
+            scraper.prefetched_pages = dict(bodies)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                list(executor.map(scraper.get_full_text_and_date_posted, urls))
+
+            elapsed = time.perf_counter() - start
+            print(
+                f"{name:>8}: {pages} pages in {elapsed:.2f}s "
+                f"({pages / elapsed:.1f} pages/s, {pool.max_workers} workers)"
+            )
+    finally:
+        pool.shutdown()
+
+
+def benchmark_extraction(pages=20, padding_bytes=200000, repeat=50):
+    """Reads every field out of the same parsed stub listing and article pages
+    with the scraper's hooks, and prints the CPU time per listed article and
+    per article page. Parsing itself isn't measured (see benchmark_parsing).
+    """
+
+    server = StubServer(padding_bytes=padding_bytes).start()
+
+    try:
+        scraper = make_stub_scraper(server, "extraction")
+        listing_soups = [
+            scraper.get_soup(
+                scraper.config.url_template.format(page_num=page_num),
+                parse_only=scraper.config.listing_strainer,
+            )
+            for page_num in range(1, pages + 1)
+        ]
+        article_soups = [
+            scraper.get_soup(
+                f"{server.url}/extraction/article/{page_num}/0/",
+                parse_only=scraper.config.article_strainer,
+            )
+            for page_num in range(1, pages + 1)
+        ]
+    finally:
+        server.stop()
+
+    articles = [
+        article for soup in listing_soups for article in scraper.get_all_articles(soup)
+    ]
+
+    start = time.process_time()
+    for _ in range(repeat):
+        scraper.get_listing_details(articles)
+    listed = (time.process_time() - start) / (repeat * len(articles))
+
+    start = time.process_time()
+    for _ in range(repeat):
+        for soup in article_soups:
+            scraper.parse_article(soup)
+    parsed = (time.process_time() - start) / (repeat * len(article_soups))
+
+    print(f" listing: {listed * 1e6:.1f}us CPU per listed article")
+    print(f" article: {parsed * 1e6:.1f}us CPU per article page")
+
+
+def benchmark_streaming(pages=20, padding_bytes=200000):
+    """Downloads and parses the same stub listing pages in full and streamed up
+    to the scraper's listing_end, and prints bytes read and pages per second
+    for each.
+    """
+
+    server = StubServer(padding_bytes=padding_bytes).start()
+
+    try:
+        scraper = make_stub_scraper(server, "streaming")
+        urls = [
+            scraper.config.url_template.format(page_num=page_num)
+            for page_num in range(1, pages + 1)
+        ]
+
+        for name, until in (("full", None), ("streamed", scraper.config.listing_end)):
+            read = 0
+            start = time.perf_counter()
+
+            for url in urls:
+                content = scraper.get_page_content(url, until=until)
+                scraper.make_soup(content, parse_only=scraper.config.listing_strainer)
+                read += len(content)
+
+            elapsed = time.perf_counter() - start
+            print(
+                f"{name:>8}: {pages} pages, {read / pages / 1000:.1f}KB read per "
+                f"page in {elapsed:.2f}s ({pages / elapsed:.1f} pages/s)"
+            )
+    finally:
+        server.stop()
+
+
+def benchmark_bulk_insert(entries=20000, chunk_size=1000):
+    """Adds the same stub entries to a scratch collection with the original
+    one-ORM-object-per-entry loop and with add_entries_to_db, and prints
+    throughput for each.
+    """
+
+    # Imported here so the scraping benchmarks don't need a db
+    from sdb.app import app
+    from sdb.controller import add_entries_to_db
+    from sdb.models import db, Collection, Entry
+
+    stub_entries = [
+        {
+            "title": f"عنوان {i}",
+            "publication": "Benchmark",
+            "link": f"https://example.com/article/{i}/",
+            "date_posted": get_stub_article_timestamp(1, i),
+            "full_text": "فقرة من المقالة " * 50,
+        }
+        for i in range(entries)
+    ]
+
+    with app.app_context():
+        collection = Collection(name="Bulk insert benchmark")
+        db.session.add(collection)
+        db.session.commit()
+
+        try:
+            # Original path: one ORM object per entry
+            start = time.perf_counter()
+            for e in stub_entries:
+                db.session.add(Entry(collection_id=collection.id, **e))
+            db.session.commit()
+            report_rows("orm", entries, start)
+
+            Entry.query.filter_by(collection_id=collection.id).delete()
+            db.session.commit()
+
+            start = time.perf_counter()
+            add_entries_to_db(stub_entries, collection.id, chunk_size=chunk_size)
+            report_rows("bulk", entries, start)
+        finally:
+            db.session.rollback()
+            db.session.delete(collection)
+            db.session.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Syria Daily Brief benchmarks")
+    parser.add_argument(
+        "benchmark",
+        nargs="?",
+        default="engines",
+        choices=[
+            "engines",
+            "bulk_insert",
+            "parsing",
+            "parse_pool",
+            "extraction",
+            "streaming",
+        ],
+    )
+    parser.add_argument("--publications", type=int, default=6)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--padding", type=int, default=2000)
+    parser.add_argument("--entries", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.benchmark == "bulk_insert":
+        benchmark_bulk_insert(entries=args.entries, chunk_size=args.chunk_size)
+    elif args.benchmark == "parsing":
+        benchmark_parsing(pages=args.pages, padding_bytes=args.padding)
+    elif args.benchmark == "parse_pool":
+        benchmark_parse_pool(pages=args.pages, padding_bytes=args.padding)
+    elif args.benchmark == "extraction":
+        benchmark_extraction(pages=args.pages, padding_bytes=args.padding)
+    elif args.benchmark == "streaming":
+        benchmark_streaming(pages=args.pages, padding_bytes=args.padding)
+    else:
+        benchmark_engines(
+            publications=args.publications,
+            pages=args.pages,
+            latency=args.latency,
+            padding_bytes=args.padding,
+        )
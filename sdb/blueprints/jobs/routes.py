@@ -0,0 +1,67 @@
+from flask import Blueprint, jsonify, request
+
+from sdb.models import Job
+from sdb.schemas import JobSchema
+
+job = Blueprint("job", __name__)
+
+# Jobs returned by GET /api/jobs
+MAX_LISTED_JOBS = 50
+
+
+@job.get("")
+def list_jobs():
+    """Returns the most recent jobs, newest first. Accepts ?kind=scrape to only
+    list one kind.
+
+    Returns: [{id: 1, kind: "scrape", status: "running", progress: 0.5, ...}, ...]
+    """
+
+    query = Job.query
+
+    kind = request.args.get("kind")
+    if kind:
+        query = query.filter_by(kind=kind)
+
+    jobs = query.order_by(Job.id.desc()).limit(MAX_LISTED_JOBS).all()
+    job_schema = JobSchema(many=True)
+
+    return jsonify(job_schema.dump(jobs))
+
+
+@job.get("/<int:job_id>")
+def get_job(job_id):
+    """Returns a job's status and progress.
+
+    Returns: {id: 1, kind: "translate", status: "queued" | "running" |
+              "succeeded" | "failed" | "cancelled", progress: 0.5, ...}
+    """
+
+    found_job = Job.query.get_or_404(job_id)
+    job_schema = JobSchema()
+
+    return jsonify(job_schema.dump(found_job))
+
+
+@job.get("/<int:job_id>/result")
+def get_job_result(job_id):
+    """Returns the result of a finished job. The result is whatever the route
+    that started the job used to return itself, e.g. {"Translated": [...]}.
+
+    Returns (if not finished): {error: "Job 1 is running.", status: "running"}
+    """
+
+    found_job = Job.query.get_or_404(job_id)
+
+    if found_job.status == "failed":
+        return jsonify(error=found_job.error, status=found_job.status), 400
+
+    if found_job.status not in ("succeeded", "cancelled"):
+        return (
+            jsonify(
+                error=f"Job {job_id} is {found_job.status}.", status=found_job.status
+            ),
+            400,
+        )
+
+    return jsonify(found_job.result)
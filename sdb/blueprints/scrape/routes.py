@@ -1,33 +1,34 @@
 from flask import Blueprint, jsonify, request
 
-from multiprocessing import Process
-
 from sdb.controller import get_available_scrapers, ScraperMap, run_selected_scrapers
-from sdb.processes import cleanup_processes, ACTIVE_PROCESSES, STOP_EVENT
-from sdb.schemas import ScrapeSchema
+from sdb.jobs import JOBS
+from sdb.models import Entry, Job
+from sdb.processes import PROCESSES
+from sdb.schemas import JobSchema, ScrapeSchema
 
 scrape = Blueprint("scrape", __name__)
 
 
 @scrape.post("")
 def scrape_data():
-    """Initiates the scraping process.
+    """Starts a background job that scrapes the selected publications into a
+    collection. Poll /api/jobs/<id> for its status. Different collections can
+    be scraped at once; jobs beyond MAX_SCRAPE_PROCESSES wait for a free slot.
 
     Accepts JSON:
     {
         selected_scrapers: [ENUMNAME, ...],
         stop_timestamp: int,
-        collection_id: int
+        collection_id: int,
+        incremental: bool (optional, stop at already ingested articles),
+        skip_known: "collection" | "global" | null (optional, default "collection")
     }
 
-    Returns: {message: "Scraping initiated."}
-    """
-
-    if "scraper" in ACTIVE_PROCESSES:
-        return jsonify(error="Scraping already in progress."), 400
+    Returns: {message: "Scraping initiated.", job: {id: 1, kind: "scrape", ...}}
 
-    # Resets the stop event
-    STOP_EVENT.clear()
+    Job result: {message: "Scraping finished.", collection_id: 1, entry_count: 120,
+                 errors: [...], failed_articles: [{publication, link, error}, ...]}
+    """
 
     # Gets JSON from request
     data = request.get_json()
@@ -37,50 +38,175 @@ def scrape_data():
     scrape_schema.load(data)
 
     # Gets parameters from request
-    scraper_strings = data["selected_scrapers"]
-    stop_timestamp = data["stop_timestamp"]
-    collection_id = data["collection_id"]
+    params = {
+        "selected_scrapers": data["selected_scrapers"],
+        "stop_timestamp": data["stop_timestamp"],
+        "collection_id": data["collection_id"],
+        "incremental": data.get("incremental", False),
+        "skip_known": data.get("skip_known", "collection"),
+    }
+
+    return start_scrape_job(params)
+
+
+@scrape.post("/<int:job_id>/resume")
+def resume_scrape(job_id):
+    """Starts a new job with the parameters of a cancelled, failed or
+    interrupted scraping job. Each publication continues after the last listing
+    page the old job fully saved, instead of starting over at page 1.
+
+    Returns: {message: "Scraping initiated.", job: {id: 2, kind: "scrape", ...}}
+    Returns 409 if the job isn't failed or cancelled.
+    """
+
+    found_job = Job.query.get_or_404(job_id)
+
+    if found_job.kind != "scrape" or not found_job.params:
+        return jsonify(error=f"Job {job_id} is not a scraping job."), 400
 
-    # Gets enums corresponding to strings in scraper_strings
+    # Queued and running jobs are still going, and succeeded ones are done
+    if found_job.status not in ("failed", "cancelled"):
+        return jsonify(error=f"Job {job_id} is {found_job.status}."), 409
+
+    return start_scrape_job(found_job.params, resume_from=job_id)
+
+
+def start_scrape_job(params, resume_from=None):
+    """Submits a scraping job for the params given to POST /api/scrape,
+    optionally resuming an earlier job. Returns the route's response.
+    """
+
+    collection_id = params["collection_id"]
+
+    # Gets enums corresponding to strings in selected_scrapers
     try:
-        selected_scrapers = [ScraperMap[scraper_str] for scraper_str in scraper_strings]
+        selected_scrapers = [
+            ScraperMap[scraper_str] for scraper_str in params["selected_scrapers"]
+        ]
     except KeyError as e:
         raise Exception(f"Scraper {e} not found.")
 
-    # Activates scraper and adds it to a process. When the process is finished it runs a cleanup.
-    try:
-        p = Process(
-            target=run_selected_scrapers,
-            args=(selected_scrapers, stop_timestamp, collection_id),
+    # Only one job per collection. The check and the registration happen under
+    # one lock so two requests can't both pass.
+    with PROCESSES.lock:
+        if PROCESSES.find(collection_id):
+            return jsonify(error="Scraping already in progress."), 400
+
+        new_job = JOBS.submit(
+            "scrape",
+            scrape_job,
+            selected_scrapers,
+            params["stop_timestamp"],
+            collection_id,
+            incremental=params["incremental"],
+            skip_known=params["skip_known"],
+            resume_from=resume_from,
+            job_params={**params, "resume_from": resume_from},
         )
-        p.start()
-        ACTIVE_PROCESSES["scraper"] = p
-        p.join()
-        if not STOP_EVENT.is_set():
-            cleanup_processes()
-    except Exception as e:
-        return jsonify(error=str(e)), 400
+        PROCESSES.add(new_job.id, key=collection_id)
+
+    return jsonify(message="Scraping initiated.", job=JobSchema().dump(new_job)), 202
 
-    return jsonify({"message": "Scraping initiated."}), 200
+
+def scrape_job(job_id, selected_scrapers, stop_timestamp, collection_id, **kwargs):
+    """Runs the selected scrapers in a child process with the job's own stop
+    event, and waits for it. Runs as a background job, which checkpoints its
+    progress under its job id. The job's result lists the scrapers' errors and
+    the articles they skipped.
+    """
+
+    managed = PROCESSES.run(
+        job_id,
+        run_scrapers_in_child,
+        selected_scrapers,
+        stop_timestamp,
+        collection_id,
+        job_id=job_id,
+        **kwargs,
+    )
+
+    if managed.status == "stopped":
+        JOBS.cancel(job_id)
+    elif managed.error is not None:
+        raise Exception(f"Scraper process failed:\n{managed.error}")
+    elif managed.process.exitcode:
+        raise Exception(
+            f"Scraper process exited with code {managed.process.exitcode}."
+        )
+
+    return {
+        "message": "Scraping finished.",
+        "collection_id": collection_id,
+        "entry_count": Entry.query.filter_by(collection_id=collection_id).count(),
+        "errors": managed.result["errors"],
+        "failed_articles": managed.result["failed_articles"],
+    }
+
+
+def run_scrapers_in_child(*args, **kwargs):
+    """Child process target that runs run_selected_scrapers and returns only
+    what the job reports, so the articles themselves aren't sent back.
+
+    Returns: {errors: ["SANA: ..."],
+              failed_articles: [{publication: "SANA", link: "...", error: "...",
+                                 status_code: 404}]}
+    """
+
+    [all_data, errors] = run_selected_scrapers(*args, **kwargs)
+
+    return {
+        "errors": errors,
+        "failed_articles": [
+            {"publication": data.publication, **failed}
+            for data in all_data
+            for failed in data.failed_articles
+        ],
+    }
 
 
 @scrape.delete("")
 def cancel_scrape():
-    """Terminates any active scraping process.
+    """Stops every active scraping job.
 
-    Returns (if success): {message: "Scraping terminated."}
+    Returns (if success): {message: "Scraping terminated.", job_ids: [1, 2]}
     """
 
-    # Is scraper currently running? If so, return error.
-    if "scraper" not in ACTIVE_PROCESSES:
+    job_ids = [
+        status["job_id"]
+        for status in PROCESSES.get_status()
+        if PROCESSES.stop(status["job_id"])
+    ]
+
+    # Is scraper currently running? If not, return error.
+    if not job_ids:
         return jsonify({"error": "Scraping is not currently in progress."}), 400
 
-    # If scraper is running, terminate it by activating the stop event. Then, delete the process and clear the event.
-    STOP_EVENT.set()
-    ACTIVE_PROCESSES["scraper"].join()
-    del ACTIVE_PROCESSES["scraper"]
-    STOP_EVENT.clear()
-    return jsonify({"message": "Scraping terminated."}), 200
+    return jsonify({"message": "Scraping terminated.", "job_ids": job_ids}), 200
+
+
+@scrape.delete("/<int:job_id>")
+def cancel_scrape_job(job_id):
+    """Stops a single scraping job. Its job is recorded as cancelled once the
+    scrapers have stopped.
+
+    Returns (if success): {message: "Scraping terminated.", job_ids: [1]}
+    """
+
+    if not PROCESSES.stop(job_id):
+        return jsonify({"error": f"Scraping job {job_id} is not in progress."}), 400
+
+    return jsonify({"message": "Scraping terminated.", "job_ids": [job_id]}), 200
+
+
+@scrape.get("/active")
+def get_active_scrapes():
+    """Returns the status of every scraping job still waiting or running.
+
+    Returns: [{job_id: 1, key: 3 (collection id), status: "waiting" |
+               "running" | "stopping", pid: 4120}, ...]
+    """
+
+    return jsonify(PROCESSES.get_status())
 
 
 @scrape.get("")
@@ -0,0 +1,207 @@
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from flask import has_app_context
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from sdb.models import db, CacheEntry
+
+# Values kept in memory per cache before the least recently used are evicted
+DEFAULT_MAX_SIZE = 10000
+
+# Rows written to the db tier per INSERT
+DB_CHUNK_SIZE = 1000
+
+# Dialects with INSERT ... ON CONFLICT DO NOTHING. Other databases check for
+# existing rows first.
+UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text):
+    """Normalizes text so that trivially different copies share a key."""
+
+    return WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class ContentCache:
+    """Content-addressed cache of text -> text, keyed by a sha256 of the
+    normalized source text.
+
+    Lookups hit an in-memory LRU first, then the cache_entries table. The db
+    tier is only used where an app context is available, so pool workers
+    fall back to memory. A cache may be shared by several threads.
+    """
+
+    def __init__(self, namespace, max_size=DEFAULT_MAX_SIZE, durable=True):
+        self.namespace = namespace
+        self.max_size = max_size
+        self.durable = durable
+
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def make_key(self, text):
+        """Returns the content address of a piece of text."""
+
+        return hashlib.sha256(normalize(text).encode("utf-8")).hexdigest()
+
+    def get(self, text):
+        """Returns the cached value for text, or None."""
+
+        return self.get_many([text]).get(text)
+
+    def set(self, text, value):
+        """Caches a value for text."""
+
+        self.set_many({text: value})
+
+    def get_many(self, texts):
+        """Returns {text: value} for every text found in either tier. None is
+        never cached.
+        """
+
+        keys = {text: self.make_key(text) for text in texts if text is not None}
+        found = {}
+        missing = {}
+
+        with self.lock:
+            for text, key in keys.items():
+                if key in self.memory:
+                    self.memory.move_to_end(key)
+                    found[text] = self.memory[key]
+                    self.memory_hits += 1
+                else:
+                    missing[text] = key
+
+        if missing and self.use_db():
+            missing_keys = list(set(missing.values()))
+            stored = {}
+
+            for start in range(0, len(missing_keys), DB_CHUNK_SIZE):
+                rows = CacheEntry.query.filter(
+                    CacheEntry.namespace == self.namespace,
+                    CacheEntry.key.in_(missing_keys[start : start + DB_CHUNK_SIZE]),
+                ).all()
+                stored.update((row.key, row.value) for row in rows)
+
+            for text, key in list(missing.items()):
+                if key in stored:
+                    found[text] = stored[key]
+                    self.remember(key, stored[key])
+                    del missing[text]
+
+                    with self.lock:
+                        self.db_hits += 1
+
+        with self.lock:
+            self.misses += len(missing)
+
+        return found
+
+    def set_many(self, values):
+        """Caches {text: value} in both tiers."""
+
+        rows = {
+            self.make_key(text): value
+            for text, value in values.items()
+            if text is not None and value is not None
+        }
+
+        for key, value in rows.items():
+            self.remember(key, value)
+
+        if not rows or not self.use_db():
+            return
+
+        rows = [
+            {"namespace": self.namespace, "key": key, "value": value}
+            for key, value in rows.items()
+        ]
+
+        for start in range(0, len(rows), DB_CHUNK_SIZE):
+            self.insert_new(rows[start : start + DB_CHUNK_SIZE])
+
+    def insert_new(self, rows):
+        """Adds rows to the db tier, skipping keys another process may have
+        stored already.
+        """
+
+        insert = UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+
+        if insert is not None:
+            db.session.execute(insert(CacheEntry).values(rows).on_conflict_do_nothing())
+            db.session.commit()
+            return
+
+        stored = {
+            row.key
+            for row in CacheEntry.query.filter(
+                CacheEntry.namespace == self.namespace,
+                CacheEntry.key.in_([row["key"] for row in rows]),
+            )
+        }
+        db.session.add_all(
+            CacheEntry(**row) for row in rows if row["key"] not in stored
+        )
+
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Stored by another process meanwhile. The values are the same, so
+            # theirs are kept.
+            db.session.rollback()
+
+    def remember(self, key, value):
+        """Adds a value to the memory tier, evicting the least recently used."""
+
+        with self.lock:
+            self.memory[key] = value
+            self.memory.move_to_end(key)
+
+            while len(self.memory) > self.max_size:
+                self.memory.popitem(last=False)
+
+    def use_db(self):
+        """Returns True if the db tier can be used from this thread."""
+
+        return self.durable and has_app_context()
+
+    def clear(self):
+        """Empties the memory tier and resets the metrics."""
+
+        with self.lock:
+            self.memory.clear()
+            self.memory_hits = 0
+            self.db_hits = 0
+            self.misses = 0
+
+    def get_stats(self):
+        """Returns hit-rate metrics for this cache.
+
+        Returns: {"size": 120, "memory_hits": 40, "db_hits": 2, "misses": 60,
+                  "hit_rate": 0.41}
+        """
+
+        with self.lock:
+            stats = {
+                "size": len(self.memory),
+                "max_size": self.max_size,
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+            }
+
+        hits = stats["memory_hits"] + stats["db_hits"]
+        lookups = hits + stats["misses"]
+
+        return {**stats, "hit_rate": hits / lookups if lookups else 0.0}
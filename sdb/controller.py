@@ -10,12 +10,27 @@ from sdb.scrapers import (
     syriadirect,
 )
 
-from sdb.models import db, Entry, Collection
-
+from sdb.jobs import set_progress
+from sdb.models import db, Entry, Collection, CrawlMark, ScrapeCheckpoint
+from sdb.scrapers.async_scraper import crawl
+from sdb.scrapers.base_scraper import HighWaterMark
+from sdb.scrapers.scrape_result import Checkpoint, ScrapeResult, DEFAULT_BATCH_SIZE
+
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 
+from sqlalchemy import insert
+
 from sdb.processes import STOP_EVENT
 
+# Rows sent per INSERT when adding entries to the db
+DEFAULT_CHUNK_SIZE = 1000
+
+# Full batches of scraped articles allowed to wait for the db
+MAX_PENDING_BATCHES = 10
+
 
 class ScraperMap(Enum):
     DEZ24 = dez24.DEZ24
@@ -44,17 +59,52 @@ def get_available_scrapers(map=ScraperMap):
     return scraper_list
 
 
-def run_selected_scrapers(selections, stop_timestamp, collection_id):
+def run_selected_scrapers(
+    selections,
+    stop_timestamp,
+    collection_id,
+    parallel=True,
+    engine="threads",
+    incremental=False,
+    skip_known="collection",
+    batch_size=DEFAULT_BATCH_SIZE,
+    stop_event=None,
+    job_id=None,
+    resume_from=None,
+):
     """Controller function that takes an array of values corresponding to websites
     and a stop timestamp. The function will then call the correct scraper for
     each website and instruct it to grab data until the stop_timestamp is reached.
-    """
 
-    # List of dataclass objects to be returned
-    all_data = []
+    When parallel is True each scraper runs in its own worker thread, so a job
+    takes about as long as the slowest site rather than all sites added together.
+    With engine="asyncio" every scraper instead shares a single event loop (see
+    sdb/scrapers/async_scraper.py).
+
+    When incremental is True each scraper also stops as soon as it reaches the
+    newest article a previous scrape ingested for its publication into this
+    collection. Every complete scrape moves the collection's marks, whether or
+    not it was incremental.
 
-    # Empty list to be populated with entries
-    entries = []
+    skip_known ("collection", "global" or None) controls which stored links are
+    skipped without downloading their article pages: those already in the
+    target collection, those anywhere in the db, or none.
+
+    Articles are added to the db in batches of batch_size while the scrapers
+    run, so a cancelled or crashed job keeps everything saved up to that point.
+
+    Setting stop_event (default STOP_EVENT) cancels the job. Jobs run side by
+    side each pass their own, so they can be cancelled one at a time.
+
+    Given a job_id, a checkpoint is saved per publication after every listing
+    page whose articles are all in the db, and the job's progress is updated
+    with it. resume_from is the id of an earlier, interrupted job: each
+    publication then continues after that job's last checkpoint instead of
+    starting over at page 1.
+    """
+
+    if stop_event is None:
+        stop_event = STOP_EVENT
 
     # Empty list for errors
     errors = []
@@ -65,49 +115,442 @@ def run_selected_scrapers(selections, stop_timestamp, collection_id):
     except Exception as e:
         raise Exception(f"Collection with id {collection_id} does not exist")
 
-    # Iterate through selections and run each scraper individually
-    for scraper in selections:
-        scraper = scraper.value()
-        print(f"Gathering data from {scraper.config.publication}")
-        data = scraper.get_data(stop_timestamp=stop_timestamp)
-        entries += data.article_list
+    # Newest article already ingested into this collection per publication
+    high_water_marks = get_high_water_marks(collection_id) if incremental else {}
+
+    # Links already stored, preloaded once per job
+    if skip_known == "collection":
+        known_links = get_known_links(collection_id=collection_id)
+    elif skip_known == "global":
+        known_links = get_known_links()
+    else:
+        known_links = {}
+
+    # Where an interrupted job left off. Articles on its last page may have
+    # moved onto the next one since, so they count as known too.
+    checkpoints = get_checkpoints(resume_from) if resume_from else {}
+    for checkpoint in checkpoints.values():
+        known_links = {**known_links, **(checkpoint.links or {})}
+
+        # Carried over, so this job can be resumed in turn
+        if job_id is not None:
+            save_checkpoint(job_id, checkpoint)
+
+    # The job's progress, estimated from the last saved page of each publication
+    publications = [scraper.value().config.publication for scraper in selections]
+    saved_checkpoints = dict(checkpoints)
+    started_at = time.time()
+
+    def report_progress(checkpoint):
+        saved_checkpoints[checkpoint.publication] = checkpoint
+        progress = get_scrape_progress(
+            saved_checkpoints,
+            publications,
+            started_at,
+            stop_timestamp,
+            high_water_marks=high_water_marks,
+        )
+        set_progress(job_id, progress, 1)
+
+    # Scrapers hand over full batches through a bounded queue, which keeps
+    # memory flat and blocks them if the db falls behind
+    batches = queue.Queue(maxsize=MAX_PENDING_BATCHES)
+
+    def scrape():
+        try:
+            return scrape_publications(
+                selections,
+                stop_timestamp,
+                high_water_marks=high_water_marks,
+                known_links=known_links,
+                parallel=parallel,
+                engine=engine,
+                sink=batches.put,
+                batch_size=batch_size,
+                stop_event=stop_event,
+                checkpoints=checkpoints,
+                # Checkpoints queue up behind the batches they cover
+                on_checkpoint=batches.put if job_id is not None else None,
+            )
+        finally:
+            # Tells save_batches that no more batches are coming
+            batches.put(None)
+
+    # Scraping runs in the background while this thread owns the db session
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        job = executor.submit(scrape)
+        save_batches(
+            batches, collection_id, job_id=job_id, on_checkpoint_saved=report_progress
+        )
+        all_data = job.result()
 
-        # We will save the dataclass object for each scraper in a list for reference
-        all_data.append(data)
+    # Articles that never went through the sink (e.g. results built elsewhere)
+    leftovers = []
+
+    for data in all_data:
+        leftovers += data.article_list
 
         # If scraper was unsuccessful, we should get errors as well
         if not data.success:
             errors.append(data.error_message)
 
+        # Articles skipped along the way
+        errors += [
+            f"{data.publication}: {failed['link']}: {failed['error']}"
+            for failed in data.failed_articles
+        ]
+
+    if leftovers:
+        add_entries_to_db(entries=leftovers, collection_id=collection_id)
+
+    # Cancelled jobs may have skipped articles, so only complete ones move marks
+    if not stop_event.is_set():
+        update_high_water_marks(all_data, collection_id)
+
+    return all_data, errors
+
+
+def scrape_publications(
+    selections,
+    stop_timestamp,
+    high_water_marks=None,
+    known_links=None,
+    parallel=True,
+    engine="threads",
+    sink=None,
+    batch_size=DEFAULT_BATCH_SIZE,
+    stop_event=None,
+    checkpoints=None,
+    on_checkpoint=None,
+):
+    """Runs every selected scraper with the chosen engine and returns their
+    ScrapeResults in the order selected.
+    """
+
+    high_water_marks = high_water_marks or {}
+
+    if stop_event is None:
+        stop_event = STOP_EVENT
+
+    if engine == "asyncio":
+        # All publications are crawled on one event loop and aiohttp session
+        return crawl(
+            [scraper.value() for scraper in selections],
+            stop_timestamp,
+            high_water_marks=high_water_marks,
+            known_links=known_links,
+            sink=sink,
+            batch_size=batch_size,
+            stop_event=stop_event,
+            checkpoints=checkpoints,
+            on_checkpoint=on_checkpoint,
+        )
+
+    if parallel and selections:
+        # One worker per publication. Results come back in the order selected.
+        with ThreadPoolExecutor(max_workers=len(selections)) as executor:
+            return list(
+                executor.map(
+                    lambda scraper: run_scraper(
+                        scraper,
+                        stop_timestamp,
+                        high_water_marks,
+                        known_links,
+                        sink=sink,
+                        batch_size=batch_size,
+                        stop_event=stop_event,
+                        checkpoints=checkpoints,
+                        on_checkpoint=on_checkpoint,
+                    ),
+                    selections,
+                )
+            )
+
+    all_data = []
+
+    # Iterate through selections and run each scraper individually
+    for scraper in selections:
+        all_data.append(
+            run_scraper(
+                scraper,
+                stop_timestamp,
+                high_water_marks,
+                known_links,
+                sink=sink,
+                batch_size=batch_size,
+                stop_event=stop_event,
+                checkpoints=checkpoints,
+                on_checkpoint=on_checkpoint,
+            )
+        )
+
         # Check if stop event was set
-        if STOP_EVENT.is_set():
+        if stop_event.is_set():
             break
 
-    # Add all our entries to db.
-    add_entries_to_db(entries=entries, collection_id=collection_id)
+    return all_data
 
-    return all_data, errors
 
+def save_batches(batches, collection_id, job_id=None, on_checkpoint_saved=None):
+    """Adds batches of articles from the queue to the db until None is received.
+    Checkpoints in the queue are saved for job_id, after the batches before
+    them, and then passed to on_checkpoint_saved. If saving fails, the queue is
+    still drained so scrapers never block on it, and the error is raised once
+    the job is finished.
+    """
 
-def add_entries_to_db(entries, collection_id):
-    """Adds entries to local db"""
+    error = None
+
+    for batch in iter(batches.get, None):
+        # Nothing after a failed batch is saved, checkpoints included
+        if error is not None:
+            continue
+
+        try:
+            if isinstance(batch, Checkpoint):
+                save_checkpoint(job_id, batch)
+
+                if on_checkpoint_saved is not None:
+                    on_checkpoint_saved(batch)
+            else:
+                add_entries_to_db(entries=batch, collection_id=collection_id)
+        except Exception as e:
+            db.session.rollback()
+            error = e
+
+    if error is not None:
+        raise error
+
+
+def run_scraper(
+    scraper,
+    stop_timestamp,
+    high_water_marks=None,
+    known_links=None,
+    sink=None,
+    batch_size=DEFAULT_BATCH_SIZE,
+    stop_event=None,
+    checkpoints=None,
+    on_checkpoint=None,
+):
+    """Runs a single ScraperMap scraper and returns its ScrapeResult. Any
+    unexpected exception is caught and returned as an unsuccessful result so
+    that one publication failing doesn't take down the others.
+    """
 
-    for e in entries:
-        current_entry = Entry(
-            collection_id=collection_id,
-            title=e.get("title", ""),
-            link=e.get("link", ""),
-            date_posted=e.get("date_posted", ""),
-            full_text=e.get("full_text", ""),
-            publication=e.get("publication", ""),
+    scraper = scraper.value()
+    print(f"Gathering data from {scraper.config.publication}")
+
+    high_water_mark = (high_water_marks or {}).get(scraper.config.publication)
+
+    try:
+        return scraper.get_data(
+            stop_timestamp=stop_timestamp,
+            high_water_mark=high_water_mark,
+            known_links=known_links,
+            sink=sink,
+            batch_size=batch_size,
+            stop_event=stop_event,
+            checkpoint=(checkpoints or {}).get(scraper.config.publication),
+            on_checkpoint=on_checkpoint,
+        )
+    except Exception as e:
+        print(f"Scraper for {scraper.config.publication} failed: {e}")
+        return ScrapeResult(
+            success=False,
+            error_message=f"{scraper.config.publication}: {e}",
+            publication=scraper.config.publication,
         )
-        db.session.add(current_entry)
 
+
+def get_known_links(collection_id=None):
+    """Returns every stored link mapped to its timestamp, either for a single
+    collection or (collection_id=None) for the whole db.
+
+    Returns: {"https://...": 1690117416.0, ...}
+    """
+
+    query = db.session.query(Entry.link, Entry.date_posted)
+
+    if collection_id is not None:
+        query = query.filter(Entry.collection_id == collection_id)
+
+    known_links = {}
+
+    for link, date_posted in query:
+        # Entries without a usable timestamp can't drive the stop logic
+        try:
+            known_links[link] = float(date_posted)
+        except (TypeError, ValueError):
+            continue
+
+    return known_links
+
+
+def get_checkpoints(job_id):
+    """Returns the last checkpoint a job saved for each publication.
+
+    Returns: {"SANA": Checkpoint(publication="SANA", page_num=12, ...), ...}
+    """
+
+    return {
+        checkpoint.publication: Checkpoint(
+            publication=checkpoint.publication,
+            page_num=checkpoint.page_num,
+            last_timestamp=checkpoint.last_timestamp,
+            links=checkpoint.links,
+        )
+        for checkpoint in ScrapeCheckpoint.query.filter_by(job_id=job_id)
+    }
+
+
+def save_checkpoint(job_id, checkpoint):
+    """Saves a job's Checkpoint for a publication, replacing the previous one."""
+
+    db.session.merge(
+        ScrapeCheckpoint(
+            job_id=job_id,
+            publication=checkpoint.publication,
+            page_num=checkpoint.page_num,
+            last_timestamp=checkpoint.last_timestamp,
+            links=checkpoint.links,
+            updated_at=time.time(),
+        )
+    )
     db.session.commit()
 
 
+def get_scrape_progress(
+    checkpoints, publications, started_at, stop_timestamp, high_water_marks=None
+):
+    """Estimates the share of a scraping job that is done, from the last
+    checkpoint of each publication. A publication is scraped from when the job
+    started back to stop_timestamp (or its high-water mark, if newer), so its
+    share is how much of that range its saved pages already cover.
+
+    Returns: 0.4
+    """
+
+    high_water_marks = high_water_marks or {}
+
+    if not publications:
+        return 0.0
+
+    done = 0.0
+
+    for publication in publications:
+        checkpoint = checkpoints.get(publication)
+
+        if checkpoint is None or checkpoint.last_timestamp is None:
+            continue
+
+        stop_at = stop_timestamp
+        if publication in high_water_marks:
+            stop_at = max(stop_at, high_water_marks[publication].date_posted)
+
+        # Nothing to scrape, so done as soon as a page is
+        if started_at <= stop_at:
+            done += 1.0
+            continue
+
+        covered = (started_at - checkpoint.last_timestamp) / (started_at - stop_at)
+        done += min(max(covered, 0.0), 1.0)
+
+    return done / len(publications)
+
+
+def get_high_water_marks(collection_id):
+    """Returns the newest article ingested into a collection for every
+    publication.
+
+    Returns: {"Enab Baladi": HighWaterMark(date_posted=1690117416.0, link=...), ...}
+    """
+
+    return {
+        mark.publication: HighWaterMark(date_posted=mark.date_posted, link=mark.link)
+        for mark in CrawlMark.query.filter_by(collection_id=collection_id)
+    }
+
+
+def update_high_water_marks(scrape_results, collection_id):
+    """Moves each publication's high-water mark in a collection up to the newest
+    article in its ScrapeResult. Marks are kept per collection, since a scrape
+    into one collection says nothing about what another already holds.
+
+    Unsuccessful results, and results with articles that failed to scrape, are
+    skipped since older articles may be missing from them. A failed article's
+    date is unknown, so the mark can't be capped below it, and a mark past it
+    would keep the next incremental run from retrying it.
+    """
+
+    for result in scrape_results:
+        if not result.success or result.failed_articles or not result.publication:
+            continue
+
+        newest = result.get_newest_article()
+
+        if newest is None:
+            continue
+
+        mark = CrawlMark.query.get((result.publication, collection_id))
+
+        if mark is None:
+            mark = CrawlMark(
+                publication=result.publication, collection_id=collection_id
+            )
+            db.session.add(mark)
+        elif mark.date_posted > newest["date_posted"]:
+            continue
+
+        mark.date_posted = newest["date_posted"]
+        mark.link = newest["link"]
+
+    db.session.commit()
+
+
+def add_entries_to_db(
+    entries, collection_id, chunk_size=DEFAULT_CHUNK_SIZE, return_ids=False
+):
+    """Adds entries to local db. Rows are inserted chunk_size at a time with a
+    single executemany per chunk instead of one ORM object per entry.
+
+    If return_ids is True, each chunk is a multi-row INSERT ... RETURNING and
+    the new ids are returned in the same order as entries.
+    """
+
+    rows = [
+        {
+            "collection_id": collection_id,
+            "title": e.get("title", ""),
+            "link": e.get("link", ""),
+            "date_posted": e.get("date_posted", ""),
+            "full_text": e.get("full_text", ""),
+            "publication": e.get("publication", ""),
+        }
+        for e in entries
+    ]
+
+    ids = []
+
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start : start + chunk_size]
+
+        if return_ids:
+            result = db.session.execute(
+                insert(Entry).values(chunk).returning(Entry.id)
+            )
+            ids += result.scalars().all()
+        else:
+            db.session.execute(insert(Entry), chunk)
+
+    db.session.commit()
+
+    if return_ids:
+        return ids
+
+
 def generate_excel_from_collection(collection_id):
-    """Generates excel file from db"""
+    """Generates excel file from db and returns its path"""
 
     # Get all entries from db
     entries = Entry.query.filter_by(collection_id=collection_id).all()
@@ -139,12 +582,13 @@ def generate_excel_from_collection(collection_id):
     current_timestamp = pd.Timestamp.now().strftime("%Y-%m-%d_%H-%M-%S")
 
     # Create excel writer object
-    writer = pd.ExcelWriter(
-        f"../excels/output_collection{collection_id}_{current_timestamp}.xlsx"
-    )
+    path = f"../excels/output_collection{collection_id}_{current_timestamp}.xlsx"
+    writer = pd.ExcelWriter(path)
 
     # Write dataframe to excel
     df.to_excel(writer, index=False)
 
     # Save excel file
     writer.close()
+
+    return path
@@ -0,0 +1,202 @@
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from sdb.models import db, Job
+from sdb.processes import MAX_PROCESSES
+
+# Jobs run at once per app process. Later jobs wait in the queue.
+DEFAULT_JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+
+# Kinds of jobs with workers of their own, so they never hold up the others.
+# Scrape jobs spend their time waiting on a scraper process (or for a free
+# one), so they get one worker per process slot.
+DEDICATED_JOB_WORKERS = {"scrape": MAX_PROCESSES}
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def update_job(job_id, **values):
+    """Updates a job's row and commits."""
+
+    db.session.query(Job).filter(Job.id == job_id).update(values)
+    db.session.commit()
+
+
+def fail_interrupted_jobs():
+    """Marks jobs left queued or running by app processes on this host that
+    no longer exist as failed. Their workers (and scraper processes) stopped
+    with them, so they would otherwise stay active for good. Jobs of live
+    processes, and of other hosts, are left alone. Returns how many were
+    marked.
+    """
+
+    active = (
+        db.session.query(Job.id, Job.owner_pid)
+        .filter(Job.status.in_(ACTIVE_STATUSES))
+        .filter(Job.owner_host == socket.gethostname())
+        .all()
+    )
+    interrupted = [job_id for job_id, pid in active if not process_exists(pid)]
+
+    if not interrupted:
+        return 0
+
+    db.session.query(Job).filter(Job.id.in_(interrupted)).update(
+        {
+            "status": "failed",
+            "error": "Interrupted: the app process running the job exited.",
+            "finished_at": time.time(),
+        },
+        synchronize_session=False,
+    )
+    db.session.commit()
+
+    return len(interrupted)
+
+
+def process_exists(pid):
+    """Returns whether a process with this pid is running on this host."""
+
+    if pid is None:
+        return False
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running, but owned by another user
+        return True
+
+    return True
+
+
+def set_progress(job_id, done, total):
+    """Records that done of total units of a job's work are finished."""
+
+    update_job(job_id, progress=done / total if total else 1.0)
+
+
+class JobRunner:
+    """Runs long operations on a pool of worker threads so the request that
+    starts them can return at once. Every job has a row in the jobs table with
+    its status, progress and result, which clients poll by job id.
+
+    Workers run each job inside its own app context, so jobs get their own db
+    session. Kinds in dedicated_workers run on a pool of their own; every other
+    kind shares max_workers.
+    """
+
+    def __init__(self, max_workers=DEFAULT_JOB_WORKERS, dedicated_workers=None):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="job"
+        )
+        self.executors = {
+            kind: ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix=f"job-{kind}"
+            )
+            for kind, workers in (dedicated_workers or {}).items()
+        }
+        self.futures = {}
+        self.kinds = {}
+        self.cancelled = set()
+        self.lock = threading.Lock()
+
+    def submit(self, kind, target, *args, job_params=None, **kwargs):
+        """Records a queued job and runs target(job_id, *args, **kwargs) on a
+        worker. target's return value (JSON-serializable) becomes the job's
+        result. job_params (JSON-serializable) is stored with the job so it can
+        be started again later. Returns the Job.
+        """
+
+        job = Job(
+            kind=kind,
+            status="queued",
+            progress=0.0,
+            params=job_params,
+            created_at=time.time(),
+            owner_host=socket.gethostname(),
+            owner_pid=os.getpid(),
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        app = current_app._get_current_object()
+
+        with self.lock:
+            # Finished jobs only need their rows from here on
+            for job_id, future in list(self.futures.items()):
+                if future.done():
+                    del self.futures[job_id]
+                    del self.kinds[job_id]
+                    self.cancelled.discard(job_id)
+
+            self.kinds[job.id] = kind
+            executor = self.executors.get(kind, self.executor)
+            self.futures[job.id] = executor.submit(
+                self.run, app, job.id, target, args, kwargs
+            )
+
+        return job
+
+    def run(self, app, job_id, target, args, kwargs):
+        """Runs a job on a worker and records how it ended."""
+
+        with app.app_context():
+            update_job(job_id, status="running", started_at=time.time())
+
+            try:
+                result = target(job_id, *args, **kwargs)
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}")
+                db.session.rollback()
+                update_job(
+                    job_id, status="failed", error=str(e), finished_at=time.time()
+                )
+                return
+
+            status = "cancelled" if job_id in self.cancelled else "succeeded"
+            update_job(
+                job_id,
+                status=status,
+                progress=1.0,
+                result=result,
+                finished_at=time.time(),
+            )
+
+    def get_active(self, kind=None):
+        """Returns the ids of this process's unfinished jobs, optionally of one
+        kind.
+        """
+
+        with self.lock:
+            return [
+                job_id
+                for job_id, future in self.futures.items()
+                if not future.done() and (kind is None or self.kinds[job_id] == kind)
+            ]
+
+    def cancel(self, job_id):
+        """Marks a job as cancelled. The job itself is responsible for
+        stopping; it is recorded as cancelled rather than succeeded when it
+        does.
+        """
+
+        self.cancelled.add(job_id)
+
+    def wait(self, job_id, timeout=None):
+        """Blocks until a job submitted by this process has finished."""
+
+        future = self.futures.get(job_id)
+
+        if future is not None:
+            future.result(timeout=timeout)
+
+
+# Shared by every request handled by this process
+JOBS = JobRunner(dedicated_workers=DEDICATED_JOB_WORKERS)
@@ -92,6 +92,7 @@ class Entry(db.Model):
 
     link = db.Column(
         db.Text,
+        index=True,
     )
 
     date_posted = db.Column(
@@ -101,3 +102,158 @@ class Entry(db.Model):
     ai_summary = db.Column(
         db.Text,
     )
+
+
+class CrawlMark(db.Model):
+    """High-water mark for a publication in a collection: the newest article
+    already ingested into it. Incremental scrapes stop as soon as they reach it."""
+
+    __tablename__ = "crawl_marks"
+
+    publication = db.Column(
+        db.Text,
+        primary_key=True,
+    )
+
+    collection_id = db.Column(
+        db.Integer,
+        db.ForeignKey("collections.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+
+    date_posted = db.Column(
+        db.Float,
+        nullable=False,
+    )
+
+    link = db.Column(
+        db.Text,
+    )
+
+
+class CacheEntry(db.Model):
+    """Durable tier of a ContentCache (see cache.py). Values are keyed by a
+    hash of their normalized source text within a namespace."""
+
+    __tablename__ = "cache_entries"
+
+    namespace = db.Column(
+        db.Text,
+        primary_key=True,
+    )
+
+    key = db.Column(
+        db.Text,
+        primary_key=True,
+    )
+
+    value = db.Column(
+        db.Text,
+        nullable=False,
+    )
+
+
+class Job(db.Model):
+    """A long-running operation (scrape, translate, summarize, export) run in
+    the background by a JobRunner (see jobs.py)."""
+
+    __tablename__ = "jobs"
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True,
+        autoincrement=True,
+    )
+
+    kind = db.Column(
+        db.Text,
+        nullable=False,
+    )
+
+    # queued, running, succeeded, failed or cancelled
+    status = db.Column(
+        db.Text,
+        nullable=False,
+        default="queued",
+    )
+
+    # Fraction of the work done, from 0 to 1
+    progress = db.Column(
+        db.Float,
+        nullable=False,
+        default=0.0,
+    )
+
+    # Arguments the job was started with, so it can be run again
+    params = db.Column(
+        db.JSON,
+    )
+
+    result = db.Column(
+        db.JSON,
+    )
+
+    error = db.Column(
+        db.Text,
+    )
+
+    created_at = db.Column(
+        db.Float,
+        nullable=False,
+    )
+
+    started_at = db.Column(
+        db.Float,
+    )
+
+    finished_at = db.Column(
+        db.Float,
+    )
+
+    # Host and pid of the app process whose workers run the job
+    owner_host = db.Column(
+        db.Text,
+    )
+
+    owner_pid = db.Column(
+        db.Integer,
+    )
+
+
+class ScrapeCheckpoint(db.Model):
+    """How far a scrape job got through one publication's listing pages. A job
+    resumed from it starts at the page after page_num."""
+
+    __tablename__ = "scrape_checkpoints"
+
+    job_id = db.Column(
+        db.Integer,
+        db.ForeignKey("jobs.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+
+    publication = db.Column(
+        db.Text,
+        primary_key=True,
+    )
+
+    # Last listing page whose articles were all saved
+    page_num = db.Column(
+        db.Integer,
+        nullable=False,
+    )
+
+    last_timestamp = db.Column(
+        db.Float,
+    )
+
+    # {link: timestamp} for the articles on that page, which may shift onto
+    # the next page as new articles are published
+    links = db.Column(
+        db.JSON,
+    )
+
+    updated_at = db.Column(
+        db.Float,
+        nullable=False,
+    )
@@ -1,11 +1,198 @@
-from multiprocessing import Process, Event
+import multiprocessing
+import os
+import threading
+import traceback
+from dataclasses import dataclass, field
+from multiprocessing.process import BaseProcess
+from typing import Any, Optional
 
-ACTIVE_PROCESSES = {}
-STOP_EVENT = Event()
+# Children are spawned rather than forked, so they start without the parent's
+# threads, locks and db connections
+CONTEXT = multiprocessing.get_context("spawn")
 
-def cleanup_processes():
-    """Cleans up processes dictionary after process is complete."""
-    global ACTIVE_PROCESSES
-    if 'scraper' in ACTIVE_PROCESSES:
-        del ACTIVE_PROCESSES['scraper']
-    return
+# Default stop event, for scrapes run outside of a job (e.g. from a shell)
+STOP_EVENT = CONTEXT.Event()
+
+# Scraper processes allowed to run at once. Later jobs wait for a free slot.
+MAX_PROCESSES = int(os.getenv("MAX_SCRAPE_PROCESSES", 2))
+
+# How often a waiting job checks whether it was cancelled
+SLOT_POLL_SECONDS = 0.5
+
+# Characters of a failed child's traceback sent back to its parent
+MAX_ERROR_LENGTH = 4000
+
+
+@dataclass
+class ManagedProcess:
+    """A job's child process and the event that stops it. result is what the
+    child's target returned, and error the traceback of the exception it
+    failed with, if any.
+    """
+
+    job_id: int
+    key: Any = None
+    stop_event: Any = field(default_factory=CONTEXT.Event, repr=False)
+    process: Optional[BaseProcess] = field(default=None, repr=False)
+    status: str = "waiting"
+    result: Any = None
+    error: Optional[str] = None
+
+    def get_status(self):
+        """Returns this process's status.
+
+        Returns: {"job_id": 1, "key": 3, "status": "running", "pid": 4120}
+        """
+
+        return {
+            "job_id": self.job_id,
+            "key": self.key,
+            "status": self.status,
+            "pid": self.process.pid if self.process else None,
+        }
+
+
+class ProcessManager:
+    """Runs the child processes of background jobs, keyed by job id. Every job
+    has its own stop event, so jobs can be cancelled one at a time, and at most
+    max_processes children run at once.
+    """
+
+    def __init__(self, max_processes=MAX_PROCESSES):
+        self.max_processes = max_processes
+        self.slots = threading.Semaphore(max_processes)
+        self.processes = {}
+        self.lock = threading.RLock()
+
+    def add(self, job_id, key=None):
+        """Registers a job before it starts, optionally under a key such as the
+        collection it scrapes. Returns the job's ManagedProcess.
+        """
+
+        with self.lock:
+            if job_id not in self.processes:
+                self.processes[job_id] = ManagedProcess(job_id=job_id)
+
+            if key is not None:
+                self.processes[job_id].key = key
+
+            return self.processes[job_id]
+
+    def run(self, job_id, target, /, *args, **kwargs):
+        """Runs target(*args, stop_event=..., **kwargs) in a child process once
+        a slot is free, and waits for it. Returns the job's ManagedProcess.
+
+        The child is spawned, so target must be a module-level function and its
+        arguments and return value must be picklable. Its return value is kept
+        in the ManagedProcess's result or, if target raises, its traceback in
+        error.
+        """
+
+        managed = self.add(job_id)
+
+        try:
+            # Waits for a slot, giving up if the job is cancelled meanwhile
+            while not self.slots.acquire(timeout=SLOT_POLL_SECONDS):
+                if managed.stop_event.is_set():
+                    managed.status = "stopped"
+                    return managed
+
+            try:
+                if managed.stop_event.is_set():
+                    managed.status = "stopped"
+                    return managed
+
+                [receiver, sender] = CONTEXT.Pipe(duplex=False)
+                p = CONTEXT.Process(
+                    target=run_in_child,
+                    args=(sender, target, *args),
+                    kwargs={**kwargs, "stop_event": managed.stop_event},
+                )
+
+                with self.lock:
+                    managed.process = p
+                    managed.status = "running"
+
+                try:
+                    p.start()
+
+                    # Read before joining: a child can't exit while it is
+                    # blocked sending more than the pipe's buffer holds
+                    message = None
+                    while message is None and (p.is_alive() or receiver.poll()):
+                        if receiver.poll(SLOT_POLL_SECONDS):
+                            message = receiver.recv()
+
+                    p.join()
+
+                    if message is not None:
+                        [kind, value] = message
+
+                        if kind == "error":
+                            managed.error = value
+                        else:
+                            managed.result = value
+                finally:
+                    receiver.close()
+                    sender.close()
+            finally:
+                self.slots.release()
+
+            managed.status = "stopped" if managed.stop_event.is_set() else "finished"
+            return managed
+        finally:
+            with self.lock:
+                del self.processes[job_id]
+
+    def stop(self, job_id):
+        """Sets a job's stop event. Returns False if the job isn't running."""
+
+        with self.lock:
+            managed = self.processes.get(job_id)
+
+            if managed is None:
+                return False
+
+            managed.stop_event.set()
+            managed.status = "stopping"
+            return True
+
+    def find(self, key):
+        """Returns the ids of jobs registered under key."""
+
+        with self.lock:
+            return [
+                job_id
+                for job_id, managed in self.processes.items()
+                if managed.key == key
+            ]
+
+    def get_status(self):
+        """Returns the status of every job, oldest first."""
+
+        with self.lock:
+            return [managed.get_status() for managed in self.processes.values()]
+
+
+# Shared by every request handled by this process
+PROCESSES = ProcessManager()
+
+
+def run_in_child(connection, target, *args, **kwargs):
+    """Process target that runs target inside the app's context, so it can use
+    the db with connections of its own. What target returns is sent to the
+    parent through connection as ("result", value). If target raises, the end
+    of its traceback is sent as ("error", traceback) before the child exits.
+    """
+
+    try:
+        # Imported here, since the app imports this module
+        from sdb.app import app
+
+        with app.app_context():
+            result = target(*args, **kwargs)
+    except Exception:
+        connection.send(("error", traceback.format_exc()[-MAX_ERROR_LENGTH:]))
+        raise
+
+    connection.send(("result", result))
@@ -0,0 +1,81 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket. Holds up to capacity tokens and refills at
+    refill_rate tokens per second. acquire() blocks until enough tokens are
+    available.
+    """
+
+    def __init__(self, capacity, refill_rate):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        """Adds the tokens earned since the last refill. Call with lock held."""
+
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate
+        )
+        self.updated_at = now
+
+    def acquire(self, amount=1, stop_event=None):
+        """Takes amount tokens, waiting for the bucket to refill if needed.
+        Requests larger than the bucket wait for a full bucket.
+
+        Waiting stops early once stop_event is set. Returns True if the tokens
+        were taken, False if stop_event was set first.
+        """
+
+        amount = min(amount, self.capacity)
+
+        while True:
+            with self.lock:
+                self.refill()
+
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return True
+
+                wait = (amount - self.tokens) / self.refill_rate
+
+            if stop_event is None:
+                time.sleep(wait)
+            elif stop_event.wait(wait):
+                return False
+
+    def pause(self, seconds):
+        """Empties the bucket so nothing is acquired for the next seconds,
+        e.g. when a server asks us to back off.
+        """
+
+        with self.lock:
+            self.refill()
+            self.tokens = min(self.tokens, -seconds * self.refill_rate)
+
+
+class RateLimiter:
+    """Request-per-minute and token-per-minute budgets, e.g. for an API with
+    both limits.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        if requests_per_minute <= 0 or tokens_per_minute <= 0:
+            raise ValueError(
+                "requests_per_minute and tokens_per_minute must be positive, got "
+                f"{requests_per_minute} and {tokens_per_minute}"
+            )
+
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+
+    def acquire(self, tokens, requests=1):
+        """Blocks until requests using the given tokens fit both budgets."""
+
+        self.requests.acquire(requests)
+        self.tokens.acquire(tokens)
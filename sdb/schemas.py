@@ -91,8 +91,40 @@ class ScrapeSchema(ma.Schema):
             "collection_id",
             "selected_scrapers",
             "stop_timestamp",
+            "incremental",
+            "skip_known",
         )
 
     collection_id = fields.Integer(required=True)
     selected_scrapers = fields.List(fields.String(), required=True)
     stop_timestamp = fields.Integer(required=True)
+    incremental = fields.Boolean(required=False)
+    skip_known = fields.String(
+        required=False,
+        allow_none=True,
+        validate=validate.OneOf(["collection", "global"]),
+    )
+
+
+class JobSchema(ma.Schema):
+    class Meta:
+        ordered = True
+        fields = (
+            "id",
+            "kind",
+            "status",
+            "progress",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+        )
+
+    id = fields.Integer(dump_only=True)
+    kind = fields.String(dump_only=True)
+    status = fields.String(dump_only=True)
+    progress = fields.Float(dump_only=True)
+    error = fields.String(dump_only=True)
+    created_at = fields.Float(dump_only=True)
+    started_at = fields.Float(dump_only=True)
+    finished_at = fields.Float(dump_only=True)
@@ -0,0 +1,385 @@
+import asyncio
+import time
+
+import aiohttp
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from sdb.scrapers.http_session import STREAM_CHUNK_SIZE
+from sdb.scrapers.pagination import Pagination
+from sdb.scrapers.parsing import ElementWatcher
+from sdb.scrapers.scraping_error import ScrapingError
+from sdb.scrapers.scrape_result import (
+    ScrapeResult,
+    DEFAULT_BATCH_SIZE,
+    get_resume_page,
+)
+from sdb.scrapers.utils import DEFAULT_HEADERS
+
+# Default number of requests in flight across all publications
+DEFAULT_CONNECTION_LIMIT = 100
+
+# Default number of requests in flight to a single host
+DEFAULT_CONNECTION_LIMIT_PER_HOST = 10
+
+# Seconds before a request is abandoned (same as the synchronous engine)
+REQUEST_TIMEOUT = 10
+
+
+class AsyncScraper:
+    """Runs an existing BaseScraper subclass on an asyncio event loop.
+
+    Pages are downloaded with a non-blocking aiohttp session, then handed to the
+    scraper's own hooks (get_all_articles, get_listing_item, parse_article, ...)
+    through its prefetched_pages, so the scrapers in sdb/scrapers/ run unchanged
+    on this engine. Which pages are read is decided by the same Pagination as
+    on the synchronous engine, and requests go through the scraper's host
+    limits and HttpCache (see PooledSession).
+    """
+
+    def __init__(self, scraper, session):
+        self.scraper = scraper
+        self.config = scraper.config
+        self.session = session
+
+    async def get_data(
+        self,
+        stop_timestamp,
+        high_water_mark=None,
+        known_links=None,
+        sink=None,
+        batch_size=DEFAULT_BATCH_SIZE,
+        stop_event=None,
+        checkpoint=None,
+        on_checkpoint=None,
+    ):
+        """Async counterpart to BaseScraper.get_data. sink and on_checkpoint
+        may block (e.g. on a full queue or the db), so they are called from a
+        worker thread.
+        """
+
+        if stop_event is not None:
+            self.scraper.stop_event = stop_event
+
+        scrape_result = ScrapeResult(
+            publication=self.config.publication,
+            sink=sink,
+            batch_size=batch_size,
+            on_checkpoint=on_checkpoint,
+        )
+
+        try:
+            await self.get_news_articles_by_page(
+                page_num=get_resume_page(checkpoint),
+                stop_timestamp=stop_timestamp,
+                high_water_mark=high_water_mark,
+                known_links=known_links,
+                scrape_result=scrape_result,
+            )
+        finally:
+            # Hands over the last partial batch, even if scraping failed midway
+            await asyncio.to_thread(scrape_result.flush)
+
+        return scrape_result
+
+    async def fetch(self, url, until=None):
+        """Returns the raw body of a page, retried according to the scraper's
+        retry policy. If it still fails, a ScrapingError is raised.
+        """
+
+        return await self.scraper.retry_policy.call_async(
+            self.request_page, url, until, stop_event=self.scraper.stop_event
+        )
+
+    async def request_page(self, url, until=None):
+        """Makes a single request for a page, from the scraper's HttpCache if
+        possible, and returns its body. Raises a ScrapingError carrying the
+        response status (None if there was no response).
+        """
+
+        cache = self.scraper.session.cache
+
+        try:
+            if cache is not None:
+                response = await cache.get_async(url, self.request, until=until)
+            else:
+                response = await self.request(url, until=until)
+        except Exception as e:
+            raise ScrapingError(f"Failed to get response from {url}", url) from e
+
+        if response.status_code not in range(200, 300):
+            raise ScrapingError(
+                f"Server responded with {response.status_code}",
+                url,
+                status_code=response.status_code,
+                retry_after=response.headers.get("Retry-After"),
+            )
+
+        return response.content
+
+    async def request(self, url, until=None, headers=None):
+        """Makes a GET request once the host's limits allow it (see
+        PooledSession.fetch) and returns it as a requests.Response.
+        """
+
+        limiter = self.scraper.session.get_limiter(url)
+
+        if limiter is None:
+            return await self.download(url, until, headers)
+
+        if not await acquire(limiter, self.scraper.stop_event):
+            raise ScrapingError(f"Stopped before requesting {url}", url)
+
+        start = time.monotonic()
+
+        try:
+            response = await self.download(url, until, headers)
+        except asyncio.CancelledError:
+            # Abandoned rather than failed, so it says nothing about the host
+            limiter.cancel()
+            raise
+        except Exception:
+            limiter.release(time.monotonic() - start)
+            raise
+
+        limiter.release(
+            time.monotonic() - start,
+            status=response.status_code,
+            retry_after=response.headers.get("Retry-After"),
+        )
+
+        return response
+
+    async def download(self, url, until=None, headers=None):
+        """Downloads a page with the aiohttp session. Given an until target,
+        only the body up to the end of that element is read.
+        """
+
+        async with self.session.get(url, headers=headers) as response:
+            truncated = False
+
+            if until is None:
+                content = await response.read()
+            else:
+                [content, truncated] = await read_until(response, until)
+
+            return make_response(
+                url, response.status, response.headers, content, truncated
+            )
+
+    async def fetch_article(self, link):
+        """Downloads an article page without blocking the loop, then runs the
+        scraper's synchronous parsing hooks on it in a worker thread.
+        """
+
+        if self.scraper.stop_event.is_set():
+            return None
+
+        self.scraper.prefetched_pages[link] = await self.fetch(link)
+
+        return await asyncio.to_thread(self.scraper.fetch_article, link)
+
+    async def get_news_articles_by_page(
+        self,
+        page_num=1,
+        stop_timestamp=False,
+        high_water_mark=None,
+        known_links=None,
+        scrape_result=None,
+    ):
+        """Async counterpart to BaseScraper.get_news_articles_by_page. Every
+        article page on a listing page is requested at once and results are
+        consumed in page order.
+        """
+
+        pagination = Pagination(
+            self.scraper,
+            page_num=page_num,
+            stop_timestamp=stop_timestamp,
+            high_water_mark=high_water_mark,
+            known_links=known_links,
+            scrape_result=scrape_result,
+        )
+
+        while True:
+            url = pagination.get_url()
+            if url is None:
+                return pagination.scrape_result
+
+            try:
+                content = await self.fetch(url, until=self.config.listing_end)
+            except ScrapingError as e:
+                pagination.fail(e)
+                return pagination.scrape_result
+
+            # Listing pages are parsed with the scraper's own hooks
+            soup = await asyncio.to_thread(
+                self.scraper.make_soup, content, self.config.listing_strainer
+            )
+            listing = pagination.read_listing(soup)
+
+            # Articles already stored in the db are never fetched (None)
+            tasks = [
+                asyncio.create_task(self.fetch_article(link))
+                if pagination.should_fetch(link)
+                else None
+                for [title, link, date_posted] in listing
+            ]
+
+            try:
+                for item, task in zip(listing, tasks):
+                    fetched = None
+                    error = None
+
+                    if task is not None:
+                        try:
+                            fetched = await task
+                        except Exception as e:
+                            error = e
+
+                    # A full batch goes to the sink, which may block
+                    if not await asyncio.to_thread(
+                        pagination.add_article, item, fetched, error
+                    ):
+                        return pagination.scrape_result
+            finally:
+                # Cancels outstanding requests once we stop reading this page
+                tasks = [task for task in tasks if task is not None]
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+            # The page's checkpoint may be written to the db
+            if not await asyncio.to_thread(pagination.complete_page):
+                return pagination.scrape_result
+
+
+async def crawl_async(
+    scrapers,
+    stop_timestamp,
+    high_water_marks=None,
+    known_links=None,
+    sink=None,
+    batch_size=DEFAULT_BATCH_SIZE,
+    stop_event=None,
+    checkpoints=None,
+    on_checkpoint=None,
+    limit=DEFAULT_CONNECTION_LIMIT,
+    limit_per_host=DEFAULT_CONNECTION_LIMIT_PER_HOST,
+):
+    """Crawls every given scraper instance concurrently on one event loop with
+    a shared aiohttp session. Returns a ScrapeResult per scraper, in order.
+
+    high_water_marks optionally maps publication -> HighWaterMark for an
+    incremental crawl. known_links maps stored links to their timestamps.
+    sink and batch_size are passed on to every scraper (see ScrapeResult), and
+    stop_event cancels the whole crawl when set. checkpoints optionally maps
+    publication -> Checkpoint to resume from, and on_checkpoint receives new
+    ones.
+    """
+
+    high_water_marks = high_water_marks or {}
+    checkpoints = checkpoints or {}
+
+    connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+
+    async with aiohttp.ClientSession(
+        connector=connector, timeout=timeout, headers=DEFAULT_HEADERS
+    ) as session:
+        async_scrapers = [AsyncScraper(scraper, session) for scraper in scrapers]
+
+        results = await asyncio.gather(
+            *[
+                s.get_data(
+                    stop_timestamp=stop_timestamp,
+                    high_water_mark=high_water_marks.get(s.config.publication),
+                    known_links=known_links,
+                    sink=sink,
+                    batch_size=batch_size,
+                    stop_event=stop_event,
+                    checkpoint=checkpoints.get(s.config.publication),
+                    on_checkpoint=on_checkpoint,
+                )
+                for s in async_scrapers
+            ],
+            return_exceptions=True,
+        )
+
+    # An unexpected exception becomes an unsuccessful result for that scraper
+    scrape_results = []
+    for scraper, result in zip(scrapers, results):
+        if isinstance(result, Exception):
+            publication = scraper.config.publication
+            result = ScrapeResult(
+                success=False,
+                error_message=f"{publication}: {result}",
+                publication=publication,
+            )
+        scrape_results.append(result)
+
+    return scrape_results
+
+
+def crawl(scrapers, stop_timestamp, **kwargs):
+    """Synchronous entry point for crawl_async."""
+
+    return asyncio.run(crawl_async(scrapers, stop_timestamp, **kwargs))
+
+
+async def acquire(limiter, stop_event=None):
+    """Waits for a HostLimiter without blocking the loop. HostLimiter blocks,
+    so the wait happens in a worker thread. If the wait is cancelled, the slot
+    the thread still goes on to take is handed back.
+
+    Returns False if stop_event was set before the slot was taken.
+    """
+
+    acquiring = asyncio.ensure_future(asyncio.to_thread(limiter.acquire, stop_event))
+
+    def hand_back(future):
+        if future.result():
+            limiter.cancel()
+
+    try:
+        return await asyncio.shield(acquiring)
+    except asyncio.CancelledError:
+        acquiring.add_done_callback(hand_back)
+        raise
+
+
+def make_response(url, status, headers, content, truncated=False):
+    """Returns a downloaded page as a requests.Response, the way PooledSession
+    returns it, so HttpCache and HostLimiter treat both engines alike.
+    """
+
+    response = requests.Response()
+    response.status_code = status
+    response.url = url
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = content
+    response.truncated = truncated
+
+    return response
+
+
+async def read_until(response, target, chunk_size=STREAM_CHUNK_SIZE):
+    """Async counterpart to http_session.read_until: returns
+    [body, truncated] for an aiohttp response, with the body read up to the end
+    of the first element matching target. truncated is True if the rest was
+    never read. It is dropped along with the connection when the response
+    closes.
+    """
+
+    watcher = ElementWatcher(target)
+    chunks = []
+    truncated = False
+
+    async for chunk in response.content.iter_chunked(chunk_size):
+        chunks.append(chunk)
+
+        if watcher.feed(chunk):
+            truncated = True
+            break
+
+    return [b"".join(chunks), truncated]
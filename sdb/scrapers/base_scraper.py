@@ -1,15 +1,35 @@
 from abc import ABC, abstractmethod
-from bs4 import BeautifulSoup
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import datetime
-import requests
-
+from urllib.parse import urlsplit
+
+from sdb.scrapers.http_cache import (
+    HttpCache,
+    CacheRule,
+    DEFAULT_CACHE_DIR,
+    LISTING_TTL,
+    ARTICLE_TTL,
+    get_listing_pattern,
+)
+from sdb.scrapers.http_session import PooledSession, DEFAULT_POOL_SIZE
+from sdb.scrapers.pagination import Pagination
+from sdb.scrapers.parse_pool import PARSE_POOL
+from sdb.scrapers.parsing import DEFAULT_PARSER, make_soup
+from sdb.scrapers.politeness import DEFAULT_REQUESTS_PER_SECOND
+from sdb.scrapers.retry import DEFAULT_RETRY_POLICY
 from sdb.scrapers.scraping_error import ScrapingError
-from sdb.scrapers.scrape_result import ScrapeResult
-from sdb.scrapers.utils import DEFAULT_HEADERS
+from sdb.scrapers.scrape_result import (
+    ScrapeResult,
+    DEFAULT_BATCH_SIZE,
+    get_resume_page,
+)
 
 from sdb.processes import STOP_EVENT
 
+# Default number of article pages fetched concurrently per listing page
+DEFAULT_MAX_WORKERS = 5
+
 
 ScraperConfig = namedtuple(
     "ScraperConfig",
@@ -17,9 +37,30 @@ ScraperConfig = namedtuple(
         "url_template",
         "publication",
         "should_get_metadata_during_pagination",
+        "pool_size",
+        "max_workers",
+        "requests_per_second",
+        "parser",
+        "listing_strainer",
+        "article_strainer",
+        "selectors",
+        "listing_end",
     ],
+    defaults=(
+        DEFAULT_POOL_SIZE,
+        DEFAULT_MAX_WORKERS,
+        DEFAULT_REQUESTS_PER_SECOND,
+        DEFAULT_PARSER,
+        None,
+        None,
+        None,
+        None,
+    ),
 )
 
+# Newest article a previous scrape already ingested for a publication
+HighWaterMark = namedtuple("HighWaterMark", ["date_posted", "link"])
+
 
 class BaseScraper(ABC):
     """This is the default class for each web scraper. It contains base functionality
@@ -29,126 +70,319 @@ class BaseScraper(ABC):
 
     def __init__(self):
         self.config = None  # Overridden in subclasses
+        self._session = None
+
+        # Page bodies already fetched elsewhere, keyed by url
+        self.prefetched_pages = {}
+
+        # Stops scraping early once set. Jobs pass their own (see get_data).
+        self.stop_event = STOP_EVENT
+
+        # Which failed requests are retried, and after how long
+        self.retry_policy = DEFAULT_RETRY_POLICY
+
+        # Where responses are cached on disk (None turns caching off)
+        self.http_cache_dir = DEFAULT_CACHE_DIR
+
+        # Worker processes that parse article pages (None parses in threads)
+        self.parse_pool = PARSE_POOL
 
-    def get_data(self, stop_timestamp):
+    @property
+    def session(self):
+        """Pooled keep-alive session shared by every request this scraper makes.
+        Created lazily so that instancing a scraper (e.g. to read its config)
+        doesn't open any connections.
+        """
+
+        if self._session is None:
+            self._session = PooledSession(
+                pool_size=self.config.pool_size,
+                requests_per_second=self.config.requests_per_second,
+                cache=self.get_http_cache(),
+            )
+
+        return self._session
+
+    def get_http_cache(self):
+        """Returns the HttpCache for this scraper's pages, or None if caching is
+        off. Listing pages go stale after LISTING_TTL and article pages after
+        ARTICLE_TTL.
+        """
+
+        if self.http_cache_dir is None:
+            return None
+
+        listing_rule = CacheRule(
+            pattern=get_listing_pattern(self.config.url_template), ttl=LISTING_TTL
+        )
+
+        return HttpCache(
+            self.http_cache_dir, rules=[listing_rule], default_ttl=ARTICLE_TTL
+        )
+
+    def get_data(
+        self,
+        stop_timestamp,
+        high_water_mark=None,
+        known_links=None,
+        sink=None,
+        batch_size=DEFAULT_BATCH_SIZE,
+        stop_event=None,
+        checkpoint=None,
+        on_checkpoint=None,
+    ):
         """Default method for initializing scraper. Can be called on any instanced
         subclass with a timetsamp and will return scraped data up until said
-        timestamp.
+        timestamp. If a high_water_mark is given (incremental scrape), scraping
+        also stops as soon as already ingested content is reached.
+
+        known_links maps links already stored in the db to their timestamps.
+        Those articles are skipped without downloading their pages.
+
+        If a sink is given, articles are handed to it in batches of batch_size
+        while scraping instead of being kept in the returned article_list.
+
+        stop_event cancels just this scrape when set (default STOP_EVENT).
+
+        on_checkpoint receives a Checkpoint after every completed listing page.
+        Given a checkpoint from an earlier run, scraping resumes at the page
+        after it.
         """
-        scraped_articles = self.get_news_articles_by_page(stop_timestamp=stop_timestamp)
+        if stop_event is not None:
+            self.stop_event = stop_event
+
+        scraped_articles = ScrapeResult(
+            publication=self.config.publication,
+            sink=sink,
+            batch_size=batch_size,
+            on_checkpoint=on_checkpoint,
+        )
+
+        try:
+            self.get_news_articles_by_page(
+                page_num=get_resume_page(checkpoint),
+                stop_timestamp=stop_timestamp,
+                high_water_mark=high_water_mark,
+                known_links=known_links,
+                scrape_result=scraped_articles,
+            )
+        finally:
+            # Hands over the last partial batch, even if scraping failed midway
+            scraped_articles.flush()
+
+        # Log how many handshakes the pooled session saved us
+        self.connection_stats_message()
 
         return scraped_articles
 
-    def get_soup(self, url):
-        """Generates a response/gets soup from a given server using requests and
-        default headers. If an error occurs, a ScrapingError is raised.
+    def get_soup(self, url, parse_only=None, until=None):
+        """Generates a response/gets soup from a given server using the pooled
+        session and default headers. If an error occurs, a ScrapingError is raised.
+
+        parse_only (the scraper's listing_strainer or article_strainer) limits
+        the soup to the parts of the page the scraper reads. until (the
+        scraper's listing_end) stops downloading the page once that element has
+        closed.
+        """
+
+        content = self.get_page_content(url, until=until)
+
+        return self.make_soup(content, parse_only=parse_only)
+
+    def get_page_content(self, url, until=None):
+        """Returns the raw body of a page. Pages handed over by another engine
+        (see async_scraper.py) are used as-is, everything else is requested
+        through the pooled session. If the request still fails after the retry
+        policy's attempts, a ScrapingError is raised.
+        """
+
+        if url in self.prefetched_pages:
+            return self.prefetched_pages.pop(url)
+
+        # Timeouts, throttling and server errors are retried with backoff
+        return self.retry_policy.call(
+            self.request_page, url, until, stop_event=self.stop_event
+        )
+
+    def request_page(self, url, until=None):
+        """Makes a single request for a page and returns its body. Raises a
+        ScrapingError carrying the response status (None if there was no
+        response).
         """
 
-        # bs4 setup: Attempts get request from server and prints error message
-        # if any error occurs.
+        # Attempts get request from server and raises ScrapingError if any
+        # error occurs.
 
         # NOTE: This will raise a scraping error BUT it will retain the original
         # exception in the __cause__ atribute of the ScrapingError object. The
         # "from e" is a neat little trick to ease debugging a bit.
 
+        # A bad config raises here rather than as a retryable ScrapingError
+        session = self.session
+
         try:
-            response = requests.get(url, headers=DEFAULT_HEADERS, timeout=10)
+            response = session.get(
+                url, timeout=10, until=until, stop_event=self.stop_event
+            )
         except Exception as e:
             raise ScrapingError(f"Failed to get response from {url}", url) from e
 
         if response.status_code not in range(200, 300):
-            raise ScrapingError(f"Server responded with {response.status_code}", url)
+            raise ScrapingError(
+                f"Server responded with {response.status_code}",
+                url,
+                status_code=response.status_code,
+                retry_after=response.headers.get("Retry-After"),
+            )
+
+        return response.content
+
+    def make_soup(self, content, parse_only=None):
+        """Parses a page body into soup with the scraper's parser backend."""
+
+        return make_soup(content, parser=self.config.parser, parse_only=parse_only)
+
+    def get_news_articles_by_page(
+        self,
+        page_num=1,
+        stop_timestamp=False,
+        high_water_mark=None,
+        known_links=None,
+        scrape_result=None,
+    ):
+        """Placeholder method overidden in subclasses where articles are gathered
+        through pagination. When to stop is decided by a Pagination (see
+        pagination.py), shared with the asyncio engine.
+        """
 
-        soup = BeautifulSoup(response.content, "html.parser")
+        pagination = Pagination(
+            self,
+            page_num=page_num,
+            stop_timestamp=stop_timestamp,
+            high_water_mark=high_water_mark,
+            known_links=known_links,
+            scrape_result=scrape_result,
+        )
+
+        # Bounded pool of workers for fetching article pages
+        with ThreadPoolExecutor(max_workers=self.config.max_workers) as executor:
+            while True:
+                url = pagination.get_url()
+                if url is None:
+                    return pagination.scrape_result
+
+                # bs4 setup
+                try:
+                    soup = self.get_soup(
+                        url=url,
+                        parse_only=self.config.listing_strainer,
+                        until=self.config.listing_end,
+                    )
+                except ScrapingError as e:
+                    pagination.fail(e)
+                    return pagination.scrape_result
+
+                listing = pagination.read_listing(soup)
+
+                # Article pages are fetched and parsed concurrently. Futures are
+                # consumed in page order so the stop timestamp logic is unchanged.
+                # Articles already stored in the db are never fetched (None).
+                futures = [
+                    executor.submit(self.fetch_article, link)
+                    if pagination.should_fetch(link)
+                    else None
+                    for [title, link, date_posted] in listing
+                ]
+
+                try:
+                    # Gathers article info for each post on single page
+                    for item, future in zip(listing, futures):
+                        fetched = None
+                        error = None
+
+                        if future is not None:
+                            try:
+                                fetched = future.result()
+                            except Exception as e:
+                                error = e
+
+                        if not pagination.add_article(item, fetched, error):
+                            return pagination.scrape_result
+                finally:
+                    # Drops any fetches still queued once we stop reading this page
+                    for future in futures:
+                        if future is not None:
+                            future.cancel()
+
+                if not pagination.complete_page():
+                    return pagination.scrape_result
+
+    def get_listing_details(self, articles):
+        """Returns [title, link, date_posted] for each article on a listing page.
+        date_posted is None unless the scraper reads it during pagination.
+        """
 
-        return soup
+        listing = []
 
-    def get_news_articles_by_page(self, page_num=1, stop_timestamp=False):
-        """Placeholder method overidden in subclasses where articles are gathered
-        through pagination.
-        """
-
-        # Dataclass scrape result to be returned
-        scrape_result = ScrapeResult()
-        url_template = self.config.url_template
-
-        while True:
-            if STOP_EVENT.is_set():
-                return scrape_result
-            # Generate correct url from template
-            url = url_template.format(page_num=page_num)
-
-            # bs4 setup
-            try:
-                soup = self.get_soup(url=url)
-            except ScrapingError as e:
-                print(f"Scraping error: {e}")
-                scrape_result.success = False
-                scrape_result.error_message = str(e)
-                return scrape_result
-
-            # Gets all articles on page
-            articles = self.get_all_articles(soup)
-
-            count = 1
-
-            # Gathers article info for each post on single page
-            for a in articles:
-                # Gets article title
-                title = self.get_article_title(a)
-                link = self.get_article_link(a)
-
-                if self.config.should_get_metadata_during_pagination:
-                    date_posted = self.get_article_date_posted(a)
-                    current_timestamp = self.get_timestamp(date_posted)
-                    full_text = self.get_article_full_text(link)
-                else:
-                    [date_posted, full_text] = self.get_full_text_and_date_posted(
-                        link
-                    )
-                    print("LAST UPDATED: ", date_posted)
-                    current_timestamp = self.get_timestamp(date_posted)
-
-                # Breaks loop if timestamp reached
-                if self.reached_time_limit_loop(
-                    stop_timestamp=stop_timestamp, current_timestamp=current_timestamp
-                ):
-                    print("LOOP LIMIT REACHED")
-                    return scrape_result
-
-                article = {
-                    "title": title,
-                    "date_posted": current_timestamp,
-                    "publication": self.config.publication,
-                    "link": link,
-                    "full_text": full_text,
-                }
-
-                # Send console message
-                self.entry_added_message(count=count, page_num=page_num)
-                print(current_timestamp)
-                count += 1
-
-                # Add article to scrape result
-                scrape_result.article_list.append(article)
-
-            # Checks if stop timestamp reached
-            if not self.should_continue_pagination(
-                stop_timestamp=stop_timestamp, current_timestamp=current_timestamp
+        for a in articles:
+            item = self.get_listing_item(a)
+            listing.append([item["title"], item["link"], item["date_posted"]])
+
+        return listing
+
+    def get_listing_item(self, article):
+        """Returns every field of an article on a listing page in one call:
+        {"title": ..., "link": ..., "date_posted": ...}. date_posted is None
+        unless the scraper reads it during pagination.
+
+        Scrapers whose fields share elements may override this to look each
+        element up only once.
+        """
+
+        date_posted = None
+        if self.config.should_get_metadata_during_pagination:
+            date_posted = self.get_article_date_posted(article)
+
+        return {
+            "title": self.get_article_title(article),
+            "link": self.get_article_link(article),
+            "date_posted": date_posted,
+        }
+
+    def truncate_listing_at_mark(self, listing, high_water_mark=None):
+        """Cuts a listing off at the first article already ingested by a previous
+        scrape so its page is never fetched. Returns [listing, reached_mark].
+        """
+
+        for index, [title, link, date_posted] in enumerate(listing):
+            current_timestamp = None
+            if date_posted is not None:
+                current_timestamp = self.get_timestamp(date_posted)
+
+            if self.reached_high_water_mark(
+                high_water_mark=high_water_mark,
+                link=link,
+                current_timestamp=current_timestamp,
             ):
-                print(
-                    "PAGINATION LIMIT REACHED, STOP_TIMESTAMP= ",
-                    stop_timestamp,
-                    "CURRENT_TIMESTAMP= ",
-                    current_timestamp,
-                )
-                return scrape_result
+                return [listing[:index], True]
+
+        return [listing, False]
 
-            # Go to next page
-            page_num = page_num + 1
+    def fetch_article(self, link):
+        """Fetches and parses a single article page. Runs in a worker thread.
 
-            # Send console message
-            self.next_page_message(count=count, page_num=page_num)
+        Returns [date_posted, full_text] (date_posted is None for scrapers that
+        read it during pagination) or None if the stop event was set before the
+        article was fetched.
+        """
+
+        if self.stop_event.is_set():
+            return None
+
+        if self.config.should_get_metadata_during_pagination:
+            return [None, self.get_article_full_text(link)]
+
+        return self.get_full_text_and_date_posted(link)
 
     # NOTE: These methods are all overridden in subclasses.
 
@@ -180,13 +414,38 @@ class BaseScraper(ABC):
             date_posted, "%Y-%m-%dT%H:%M:%S%z"
         ).timestamp()
 
-    def get_full_text_and_date_posted(self, article):
-        """Returns text and last updated simultaneously"""
+    @abstractmethod
+    def parse_article(self, soup):
+        """Returns {"date_posted": ..., "full_text": ...} from an article
+        page's soup (date_posted is None for scrapers that read it during
+        pagination). Runs in a parse worker process, so it must not rely on
+        state set up outside of __init__.
+        """
         pass
 
+    def get_full_text_and_date_posted(self, article_link):
+        """Returns text and last updated simultaneously"""
+
+        article = self.get_article(article_link)
+        return [article["date_posted"], article["full_text"]]
+
     def get_article_full_text(self, article_link):
         """Returns the text of an article."""
-        pass
+
+        return self.get_article(article_link)["full_text"]
+
+    def get_article(self, article_link):
+        """Downloads an article page and extracts it with parse_article, in the
+        parse pool if there is one.
+        """
+
+        content = self.get_page_content(article_link)
+
+        if self.parse_pool is None:
+            soup = self.make_soup(content, parse_only=self.config.article_strainer)
+            return self.parse_article(soup)
+
+        return self.parse_pool.extract_article(type(self), self.config, content)
 
     def entry_added_message(self, count=1, page_num=1):
         """Prints a terminal message to the user when a new entry is added."""
@@ -200,6 +459,35 @@ class BaseScraper(ABC):
 
         print(f"Continuing to page {page_num}")
 
+    def connection_stats_message(self):
+        """Prints the number of connections opened vs. reused by the session,
+        and how the publication's host limits adapted.
+        """
+
+        stats = self.session.get_connection_stats()
+        print(
+            f"{self.config.publication}: {stats['requests']} requests, "
+            f"{stats['opened']} connections opened, {stats['reused']} reused"
+        )
+
+        host = urlsplit(self.config.url_template).netloc
+        host_stats = self.session.get_host_stats().get(host)
+
+        if host_stats:
+            print(
+                f"{self.config.publication}: {host_stats['throttled']} throttled, "
+                f"{host_stats['errors']} failed, settled at "
+                f"{host_stats['concurrency']:.1f} requests in flight"
+            )
+
+        if self.session.cache is not None:
+            cache_stats = self.session.cache.get_stats()
+            print(
+                f"{self.config.publication}: {cache_stats['hits']} pages from "
+                f"cache, {cache_stats['revalidated']} revalidated, "
+                f"{cache_stats['misses']} downloaded"
+            )
+
     # NOTE: These conditions are left in the base class to reduce repetition.
     # Should they change in the future I only need to update them here rather
     # than in each individual scraper.
@@ -215,6 +503,29 @@ class BaseScraper(ABC):
 
         return False
 
+    @staticmethod
+    def reached_high_water_mark(
+        high_water_mark=None, link=None, current_timestamp=None
+    ):
+        """Returns true if an article was already ingested by a previous scrape:
+        it is the newest known article or it is older than it. Timestamps are
+        compared strictly since some publications only list the day posted.
+        """
+
+        if not high_water_mark:
+            return False
+
+        if link is not None and link == high_water_mark.link:
+            return True
+
+        if (
+            current_timestamp is not None
+            and current_timestamp < high_water_mark.date_posted
+        ):
+            return True
+
+        return False
+
     @staticmethod
     def should_continue_pagination(stop_timestamp=False, current_timestamp=False):
         """Returns true if current timestamp hasn't reached limit, else returns
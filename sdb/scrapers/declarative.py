@@ -0,0 +1,173 @@
+import functools
+from collections import namedtuple
+
+import soupsieve
+
+from sdb.scrapers.base_scraper import BaseScraper
+
+# CSS selectors that locate each field of a site's pages. Every selector may
+# end in " @attribute" to read that attribute instead of the element's text,
+# e.g. "h2.entry-title a @href".
+SiteSelectors = namedtuple(
+    "SiteSelectors",
+    [
+        # Listing page: each article, within the first listing match if given
+        "articles",
+        "listing",
+        # Within each listed article
+        "title",
+        "link",
+        "date_posted",
+        # Article page: the date, and the element whose <p> children are the text
+        "page_date_posted",
+        "full_text",
+    ],
+    defaults=(None, None, None, None, None, None),
+)
+
+
+class Extractor:
+    """A single selector, compiled once with soupsieve and reused on every page."""
+
+    def __init__(self, selector):
+        [css, _, attribute] = selector.partition(" @")
+
+        self.selector = selector
+        self.css = css.strip()
+        self.matcher = soupsieve.compile(self.css)
+        self.attribute = attribute.strip() or None
+
+    def first(self, tag):
+        """Returns the first element under tag that matches. Raises a
+        LookupError if there is none, e.g. after a site's layout changed.
+        """
+
+        element = self.matcher.select_one(tag)
+
+        if element is None:
+            raise LookupError(f'Nothing matches "{self.selector}"')
+
+        return element
+
+    def all(self, tag):
+        """Returns every element under tag that matches."""
+
+        return self.matcher.select(tag)
+
+    def get(self, tag):
+        """Returns the text (or attribute) of the first element that matches."""
+
+        return self.read(self.first(tag))
+
+    def read(self, element):
+        """Returns the text (or attribute) of an element this selector matched."""
+
+        if self.attribute is None:
+            return element.text
+
+        return element.get(self.attribute)
+
+
+@functools.lru_cache(maxsize=None)
+def compile_selectors(selectors):
+    """Returns selectors (a SiteSelectors) with each selector compiled into an
+    Extractor. Compiled once per process and shared by every page.
+    """
+
+    return SiteSelectors(
+        *(
+            None if selector is None else Extractor(selector)
+            for selector in selectors
+        )
+    )
+
+
+class DeclarativeScraper(BaseScraper):
+    """Scraper driven entirely by the selectors in its config, so a site with
+    the usual layout needs no code of its own:
+
+    DeclarativeScraper(ScraperConfig(..., selectors=SiteSelectors(...)))
+
+    Subclasses only override the hooks their site needs.
+    """
+
+    def __init__(self, config=None):
+        super().__init__()
+        self.config = config
+
+    @property
+    def extractors(self):
+        """The config's selectors, compiled."""
+
+        return compile_selectors(self.config.selectors)
+
+    def get_all_articles(self, soup):
+        """Returns all articles on a listing page."""
+
+        if self.extractors.listing is not None:
+            soup = self.extractors.listing.first(soup)
+
+        return self.extractors.articles.all(soup)
+
+    def get_article_title(self, article):
+        """Returns the title of an article."""
+
+        return self.extractors.title.get(article)
+
+    def get_article_link(self, article):
+        """Returns the link of an article."""
+
+        return self.extractors.link.get(article)
+
+    def get_article_date_posted(self, article):
+        """Returns the date an article was posted, from the listing page."""
+
+        return self.extractors.date_posted.get(article)
+
+    def get_listing_item(self, article):
+        """Returns the title, link and date posted (None unless it's read during
+        pagination) of an article on a listing page. Fields read from the same
+        element (e.g. a link's text and href) share a single lookup.
+        """
+
+        extractors = self.extractors
+        fields = {"title": extractors.title, "link": extractors.link}
+
+        if self.config.should_get_metadata_during_pagination:
+            fields["date_posted"] = extractors.date_posted
+
+        item = {"date_posted": None}
+        elements = {}
+
+        for name, extractor in fields.items():
+            if extractor.css not in elements:
+                elements[extractor.css] = extractor.first(article)
+
+            item[name] = extractor.read(elements[extractor.css])
+
+        return item
+
+    def parse_article(self, soup):
+        """Returns the date posted (None if it's read from the listing page) and
+        full text of an article page.
+        """
+
+        date_posted = None
+        if not self.config.should_get_metadata_during_pagination:
+            date_posted = self.get_page_date_posted(soup)
+
+        body = self.extractors.full_text.first(soup)
+
+        return {"date_posted": date_posted, "full_text": self.get_full_text(body)}
+
+    def get_page_date_posted(self, soup):
+        """Returns the date an article was posted, from its own page."""
+
+        return self.extractors.page_date_posted.get(soup)
+
+    def get_full_text(self, body):
+        """Joins the paragraphs directly inside an article's body."""
+
+        paragraphs = body.find_all("p", recursive=False)
+
+        return "\n\n".join(paragraph.text for paragraph in paragraphs)
@@ -1,53 +1,39 @@
-from sdb.scrapers.base_scraper import BaseScraper, ScraperConfig
+from sdb.scrapers.base_scraper import ScraperConfig
+from sdb.scrapers.declarative import DeclarativeScraper, SiteSelectors
+from sdb.scrapers.parsing import strain
 import json
 
 HouranFL_config = ScraperConfig(
     url_template="https://www.horanfree.com/page/{page_num}?cat=%2A",
     publication="Houran Free League",
     should_get_metadata_during_pagination=False,
+    # Small site that throttles aggressive crawlers
+    requests_per_second=2,
+    selectors=SiteSelectors(
+        articles="li.post-item",
+        title="h2.post-title",
+        link="a:not([class]) @href",
+        # Holds the page's JSON-LD schema, see get_page_date_posted
+        page_date_posted="script#tie-schema-json",
+        full_text="div.entry-content.entry.clearfix",
+    ),
+    # Only the parts of each page the selectors above read
+    listing_strainer=strain(("li", {"class": "post-item"})),
+    article_strainer=strain(
+        ("script", {"id": "tie-schema-json"}),
+        ("div", {"class": "entry-content"}),
+    ),
 )
 
 
-class HouranFL(BaseScraper):
+class HouranFL(DeclarativeScraper):
     def __init__(self):
-        self.config = HouranFL_config
+        super().__init__(HouranFL_config)
 
-    def get_all_articles(self, soup):
-        """Returns all articles on a page."""
-
-        return soup.find_all("li", class_="post-item")
-
-    def get_article_title(self, article):
-        """Returns title of article."""
-
-        return article.find("h2", class_="post-title").text
-
-    def get_article_link(self, article):
-        """Returns link to article."""
-
-        return article.find("a", class_=None).get("href")
-
-    def get_full_text_and_date_posted(self, article_link):
-        """Gathers article text content from link to given article. Concatenates all
-        paragraph elements into single string and returns it."""
-
-        # bs4 setup
-        soup = self.get_soup(url=article_link)
-
-        # Get last updated date
-        script = soup.find("script", id="tie-schema-json")
+    def get_page_date_posted(self, soup):
+        """Returns the date an article was created, from the page's schema."""
 
         # Load script as json
-        data = json.loads(script.text)
-
-        # Get last updated date
-        date_posted = data["dateCreated"]
-
-        # iterates thru paragraphs and concatenates text content
-        paragraphs = soup.find("div", class_="entry-content entry clearfix").find_all(
-            "p", recursive=False
-        )
-
-        full_text = "\n\n".join(paragraph.text for paragraph in paragraphs)
+        data = json.loads(super().get_page_date_posted(soup))
 
-        return date_posted, full_text
+        return data["dateCreated"]
@@ -0,0 +1,266 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Directory responses are cached in. Caching is off unless it's set.
+DEFAULT_CACHE_DIR = os.getenv("HTTP_CACHE_DIR")
+
+# Seconds a cached listing page is used without asking the server. New
+# articles show up on listing pages, so they go stale quickly.
+LISTING_TTL = int(os.getenv("HTTP_CACHE_LISTING_TTL", 10 * 60))
+
+# Seconds a cached article page is used without asking the server. Articles
+# are rarely edited once published.
+ARTICLE_TTL = int(os.getenv("HTTP_CACHE_ARTICLE_TTL", 30 * 24 * 60 * 60))
+
+# Response headers kept with a cached body
+STORED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+# Urls matching pattern (a compiled regex) are fresh for ttl seconds
+CacheRule = namedtuple("CacheRule", ["pattern", "ttl"])
+
+
+class CachedPage(namedtuple("CachedPage", ["url", "headers", "stored_at", "body"])):
+    """A response body read from the cache, with the headers needed to
+    revalidate it.
+    """
+
+    def is_fresh(self, ttl):
+        """Returns True if the page can be used without asking the server."""
+
+        return time.time() - self.stored_at < ttl
+
+    def get_validators(self):
+        """Returns the conditional request headers for this page, if the server
+        sent any validators with it.
+        """
+
+        validators = {}
+
+        if self.headers.get("ETag"):
+            validators["If-None-Match"] = self.headers["ETag"]
+        if self.headers.get("Last-Modified"):
+            validators["If-Modified-Since"] = self.headers["Last-Modified"]
+
+        return validators
+
+    def to_response(self):
+        """Returns the page as a 200 requests.Response."""
+
+        response = requests.Response()
+        response.status_code = 200
+        response.url = self.url
+        response.headers = CaseInsensitiveDict(self.headers)
+        response._content = self.body
+
+        return response
+
+
+class HttpCache:
+    """Persistent cache of successful GET responses, stored on disk so that it
+    is shared by every scraper process and survives restarts.
+
+    Each url has a gzip-compressed body and a small JSON file of headers.
+    Within its TTL (the first matching rule's, else default_ttl) a page is
+    served from disk without a request. After that it is revalidated with
+    If-None-Match / If-Modified-Since, and a 304 reuses the stored body.
+
+    A page streamed only up to an element (until, see PooledSession) is cached
+    apart from the whole page, under a key of its url and that element, so
+    later requests streaming it the same way can use it.
+    """
+
+    def __init__(self, directory, rules=(), default_ttl=ARTICLE_TTL):
+        self.directory = directory
+        self.rules = list(rules)
+        self.default_ttl = default_ttl
+
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def get(self, url, fetch, **kwargs):
+        """Returns the response for url, calling fetch(url, **kwargs) only if
+        the cached copy is missing or stale.
+        """
+
+        until = kwargs.get("until")
+        page = self.load(url, until)
+
+        if self.is_fresh(url, page):
+            self.count("hits")
+            return page.to_response()
+
+        response = fetch(url, **self.add_validators(page, kwargs))
+
+        return self.update(url, page, response, until)
+
+    async def get_async(self, url, fetch, **kwargs):
+        """Async counterpart to get, for a coroutine function fetch that
+        returns a requests.Response. Files are read and written in a worker
+        thread.
+        """
+
+        until = kwargs.get("until")
+        page = await asyncio.to_thread(self.load, url, until)
+
+        if self.is_fresh(url, page):
+            self.count("hits")
+            return page.to_response()
+
+        response = await fetch(url, **self.add_validators(page, kwargs))
+
+        return await asyncio.to_thread(self.update, url, page, response, until)
+
+    def is_fresh(self, url, page):
+        """Returns True if a loaded page (None if it isn't cached) can be used
+        without asking the server.
+        """
+
+        return page is not None and page.is_fresh(self.get_ttl(url))
+
+    @staticmethod
+    def add_validators(page, kwargs):
+        """Returns fetch's kwargs with a stale page's validators added to its
+        headers, so an unchanged page comes back as a 304.
+        """
+
+        if page is None:
+            return kwargs
+
+        headers = {**kwargs.get("headers", {}), **page.get_validators()}
+
+        return {**kwargs, "headers": headers}
+
+    def update(self, url, page, response, until=None):
+        """Stores the response fetched for url (streamed up to until, if
+        given), or refreshes the cached page (None if there was none) if the
+        server says it is unchanged. Returns the response to use.
+        """
+
+        if page is not None and response.status_code == 304:
+            # Unchanged, so only the headers are rewritten. The validators are
+            # the whole page's, so a streamed part is unchanged as well.
+            page = page._replace(stored_at=time.time())
+            self.write(self.get_path(url, ".json", until), self.dump_headers(page))
+            self.count("revalidated")
+            return page.to_response()
+
+        self.count("misses")
+
+        if response.status_code == 200:
+            self.store(url, response, until)
+
+        return response
+
+    def get_ttl(self, url):
+        """Returns how long url stays fresh, in seconds."""
+
+        for rule in self.rules:
+            if rule.pattern.match(url):
+                return rule.ttl
+
+        return self.default_ttl
+
+    def load(self, url, until=None):
+        """Returns url's CachedPage (streamed up to until, if given), or None
+        if it isn't cached.
+        """
+
+        try:
+            with open(self.get_path(url, ".json", until), "rb") as file:
+                stored = json.load(file)
+            with gzip.open(self.get_path(url, ".gz", until), "rb") as file:
+                body = file.read()
+        except (OSError, EOFError, ValueError):
+            # Missing, or partly written by a process that died
+            return None
+
+        return CachedPage(url, stored["headers"], stored["stored_at"], body)
+
+    def store(self, url, response, until=None):
+        """Caches a successful response (streamed up to until, if given)."""
+
+        headers = {
+            name: response.headers[name]
+            for name in STORED_HEADERS
+            if name in response.headers
+        }
+        page = CachedPage(url, headers, time.time(), response.content)
+
+        # The body goes first, so the headers never point at a missing body
+        self.write(self.get_path(url, ".gz", until), gzip.compress(page.body))
+        self.write(self.get_path(url, ".json", until), self.dump_headers(page))
+
+    def get_path(self, url, suffix, until=None):
+        """Returns the file a url's body (.gz) or headers (.json) are kept in,
+        spread over subdirectories to keep each one small. A page streamed up
+        to until is kept apart from the whole page.
+        """
+
+        name = url if until is None else f"{url} until {until!r}"
+        key = hashlib.sha256(name.encode("utf-8")).hexdigest()
+
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    @staticmethod
+    def dump_headers(page):
+        """Returns the JSON stored next to a page's body."""
+
+        return json.dumps(
+            {"url": page.url, "headers": page.headers, "stored_at": page.stored_at}
+        ).encode("utf-8")
+
+    @staticmethod
+    def write(path, data):
+        """Writes a file atomically. Scrapers in other processes may be reading
+        it at the same time.
+        """
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get_stats(self):
+        """Returns counters for this cache.
+
+        Returns: {"hits": 40, "revalidated": 5, "misses": 10}
+        """
+
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+        }
+
+
+def get_listing_pattern(url_template):
+    """Returns a regex matching every listing page of a url_template, e.g.
+    "https://sana.sy/?cat=29582&paged={page_num}".
+    """
+
+    [before, after] = url_template.split("{page_num}", 1)
+
+    return re.compile(re.escape(before) + r"\d+" + re.escape(after) + "$")
@@ -0,0 +1,185 @@
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from sdb.scrapers.parsing import ElementWatcher
+from sdb.scrapers.politeness import HOST_LIMITERS, DEFAULT_REQUESTS_PER_SECOND
+from sdb.scrapers.scraping_error import ScrapingError
+from sdb.scrapers.utils import DEFAULT_HEADERS
+
+# Default number of keep-alive connections held open per host
+DEFAULT_POOL_SIZE = 10
+
+# Number of per-host connection pools kept by a single session
+DEFAULT_POOL_HOSTS = 10
+
+# Bytes read at a time from a streamed response
+STREAM_CHUNK_SIZE = 16 * 1024
+
+
+class PooledSession:
+    """Wraps a requests.Session with a pooled, keep-alive connection adapter.
+
+    A scraper keeps a single PooledSession for the whole job so that listing
+    pages and article pages on the same host reuse open connections instead of
+    paying for a fresh TCP/TLS handshake on every request.
+
+    Requests are also kept polite: each host gets at most requests_per_second
+    requests, and as many in flight at once as it handles without slowing down
+    or throttling us (up to pool_size, see politeness.py). requests_per_second
+    None or 0 turns this off.
+
+    Given an HttpCache, fresh cached pages are returned without a request and
+    stale ones are revalidated (see http_cache.py).
+
+    Given an element target (until, see parsing.strain), a page is streamed
+    and reading stops as soon as that element has closed.
+    """
+
+    def __init__(
+        self,
+        pool_size=DEFAULT_POOL_SIZE,
+        pool_hosts=DEFAULT_POOL_HOSTS,
+        requests_per_second=DEFAULT_REQUESTS_PER_SECOND,
+        limiters=HOST_LIMITERS,
+        cache=None,
+    ):
+        if requests_per_second is not None and requests_per_second < 0:
+            raise ValueError(
+                f"requests_per_second can't be negative, got {requests_per_second}"
+            )
+
+        self.pool_size = pool_size
+        self.requests_per_second = requests_per_second
+        self.limiters = limiters
+        self.cache = cache
+
+        self.adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size)
+
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        self.session.headers["Connection"] = "keep-alive"
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+    def get(self, url, **kwargs):
+        """Returns the response for a GET request, from the cache if possible."""
+
+        if self.cache is not None:
+            return self.cache.get(url, self.fetch, **kwargs)
+
+        return self.fetch(url, **kwargs)
+
+    def fetch(self, url, until=None, stop_event=None, **kwargs):
+        """Makes a GET request through the pooled session, once the host's
+        limits allow it. Raises a ScrapingError if stop_event is set while
+        waiting for them.
+        """
+
+        limiter = self.get_limiter(url)
+
+        if limiter is None:
+            return self.request(url, until, **kwargs)
+
+        if not limiter.acquire(stop_event=stop_event):
+            raise ScrapingError(f"Stopped before requesting {url}", url)
+
+        start = time.monotonic()
+
+        try:
+            response = self.request(url, until, **kwargs)
+        except Exception:
+            limiter.release(time.monotonic() - start)
+            raise
+
+        limiter.release(
+            time.monotonic() - start,
+            status=response.status_code,
+            retry_after=response.headers.get("Retry-After"),
+        )
+
+        return response
+
+    def get_limiter(self, url):
+        """Returns the HostLimiter for url's host, or None if requests aren't
+        limited.
+        """
+
+        if not self.requests_per_second:
+            return None
+
+        return self.limiters.get(url, self.requests_per_second, self.pool_size)
+
+    def request(self, url, until=None, **kwargs):
+        """Makes a GET request. Given an until target, only the body up to the
+        end of that element is read.
+        """
+
+        if until is None:
+            return self.session.get(url, **kwargs)
+
+        response = self.session.get(url, stream=True, **kwargs)
+        read_until(response, until)
+
+        return response
+
+    def get_host_stats(self):
+        """Returns politeness stats for the hosts this session's limiters have
+        seen (see HostLimiter.get_stats).
+        """
+
+        return self.limiters.get_stats()
+
+    def close(self):
+        """Closes every pooled connection held by the session."""
+
+        self.session.close()
+
+    def get_connection_stats(self):
+        """Returns counters for connections opened vs. reused by this session.
+
+        Returns: {"requests": 12, "opened": 2, "reused": 10}
+        """
+
+        requests_made = 0
+        opened = 0
+
+        # urllib3 keeps one pool per host and counts both requests and the new
+        # connections it had to open for them.
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            requests_made += pool.num_requests
+            opened += pool.num_connections
+
+        return {
+            "requests": requests_made,
+            "opened": opened,
+            "reused": max(requests_made - opened, 0),
+        }
+
+
+def read_until(response, target, chunk_size=STREAM_CHUNK_SIZE):
+    """Reads a streamed response's body until the first element matching target
+    has closed, then closes the response. If the rest of the body was never
+    read, response.truncated is set.
+
+    The connection of a response closed early can't be reused, since part of
+    its body is still unread.
+    """
+
+    watcher = ElementWatcher(target)
+    chunks = []
+    response.truncated = False
+
+    try:
+        for chunk in response.iter_content(chunk_size):
+            chunks.append(chunk)
+
+            if watcher.feed(chunk):
+                response.truncated = True
+                break
+    finally:
+        response._content = b"".join(chunks)
+        response.close()
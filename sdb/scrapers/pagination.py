@@ -0,0 +1,209 @@
+from sdb.scrapers.scrape_result import ScrapeResult
+
+
+class Pagination:
+    """Walks a publication's listing pages for a scraper, one page at a time.
+
+    Which pages and articles are read, when scraping stops and when a page is
+    checkpointed is decided here, so that both engines (BaseScraper and
+    AsyncScraper) behave the same. An engine only downloads: it asks for the
+    next listing url, hands back the listing's soup, fetches the articles that
+    aren't stored yet and passes each one to add_article in listing order,
+    until either method returns False.
+
+    add_article and complete_page may hand articles to the scrape result's sink
+    and checkpoints to its on_checkpoint, so they may block.
+    """
+
+    def __init__(
+        self,
+        scraper,
+        page_num=1,
+        stop_timestamp=False,
+        high_water_mark=None,
+        known_links=None,
+        scrape_result=None,
+    ):
+        self.scraper = scraper
+        self.config = scraper.config
+        self.page_num = page_num
+        self.stop_timestamp = stop_timestamp
+        self.high_water_mark = high_water_mark
+        self.known_links = known_links or {}
+
+        if scrape_result is None:
+            scrape_result = ScrapeResult(publication=self.config.publication)
+        self.scrape_result = scrape_result
+
+        # State of the listing page being read
+        self.listing = []
+        self.reached_mark = False
+        self.current_timestamp = None
+        self.count = 1
+        self.failed = 0
+        self.page_links = {}
+
+    def get_url(self):
+        """Returns the url of the next listing page, or None if the stop event
+        is set.
+        """
+
+        if self.scraper.stop_event.is_set():
+            return None
+
+        return self.config.url_template.format(page_num=self.page_num)
+
+    def fail(self, error):
+        """Records that a listing page couldn't be downloaded."""
+
+        print(f"Scraping error: {error}")
+        self.scrape_result.success = False
+        self.scrape_result.error_message = str(error)
+
+    def read_listing(self, soup):
+        """Reads [title, link, date_posted] for each article on a listing page,
+        dropping articles a previous scrape already ingested. Returns the
+        listing, whose articles are then passed to add_article in order.
+        """
+
+        articles = self.scraper.get_all_articles(soup)
+        listing = self.scraper.get_listing_details(articles)
+
+        [self.listing, self.reached_mark] = self.scraper.truncate_listing_at_mark(
+            listing, self.high_water_mark
+        )
+
+        self.count = 1
+        self.failed = 0
+        self.page_links = {}
+
+        return self.listing
+
+    def should_fetch(self, link):
+        """Returns True if an article's page has to be downloaded. Articles
+        already stored in the db never are.
+        """
+
+        return link not in self.known_links
+
+    def add_article(self, item, fetched=None, error=None):
+        """Adds an article from the listing, given what fetching it returned
+        (see BaseScraper.fetch_article) or the error it raised. Articles that
+        weren't fetched (see should_fetch) are passed without either.
+
+        Returns False once scraping should stop.
+        """
+
+        [title, link, date_posted] = item
+
+        if not self.should_fetch(link):
+            # Stored timestamp still drives the stop logic below
+            current_timestamp = self.known_links[link]
+        else:
+            # A bad article is recorded and skipped rather than failing the
+            # whole publication
+            if error is not None:
+                print(f"Skipping article {link}: {error}")
+                self.scrape_result.add_failed_article(link, error)
+                self.failed += 1
+                return True
+
+            # Article was skipped because the stop event was set
+            if fetched is None or self.scraper.stop_event.is_set():
+                return False
+
+            if self.config.should_get_metadata_during_pagination:
+                full_text = fetched[1]
+            else:
+                [date_posted, full_text] = fetched
+                print("LAST UPDATED: ", date_posted)
+
+            current_timestamp = self.scraper.get_timestamp(date_posted)
+
+        self.current_timestamp = current_timestamp
+
+        # Breaks loop if timestamp reached
+        if self.scraper.reached_time_limit_loop(
+            stop_timestamp=self.stop_timestamp,
+            current_timestamp=current_timestamp,
+        ):
+            print("LOOP LIMIT REACHED")
+            return False
+
+        # Breaks loop if already ingested content is reached
+        if self.scraper.reached_high_water_mark(
+            high_water_mark=self.high_water_mark,
+            current_timestamp=current_timestamp,
+        ):
+            print("HIGH WATER MARK REACHED")
+            return False
+
+        self.page_links[link] = current_timestamp
+
+        # Already stored, nothing to add
+        if not self.should_fetch(link):
+            return True
+
+        article = {
+            "title": title,
+            "date_posted": current_timestamp,
+            "publication": self.config.publication,
+            "link": link,
+            "full_text": full_text,
+        }
+
+        # Send console message
+        self.scraper.entry_added_message(count=self.count, page_num=self.page_num)
+        print(current_timestamp)
+        self.count += 1
+
+        # Add article to scrape result
+        self.scrape_result.add_article(article)
+
+        return True
+
+    def complete_page(self):
+        """Finishes the listing page once all of its articles were added, and
+        checkpoints it. Returns False if scraping should stop here rather than
+        go on to the next page.
+        """
+
+        # Without a single article there is no timestamp to go by, and the
+        # site's layout has likely changed
+        if self.failed and self.failed == len(self.listing):
+            self.scrape_result.success = False
+            self.scrape_result.error_message = (
+                f"Every article on page {self.page_num} failed"
+            )
+            return False
+
+        # Nothing past this point is new
+        if self.reached_mark:
+            print("HIGH WATER MARK REACHED")
+            return False
+
+        # Checks if stop timestamp reached
+        if not self.scraper.should_continue_pagination(
+            stop_timestamp=self.stop_timestamp,
+            current_timestamp=self.current_timestamp,
+        ):
+            print(
+                "PAGINATION LIMIT REACHED, STOP_TIMESTAMP= ",
+                self.stop_timestamp,
+                "CURRENT_TIMESTAMP= ",
+                self.current_timestamp,
+            )
+            return False
+
+        # A resumed scrape can pick up after this page
+        self.scrape_result.complete_page(
+            self.page_num, self.current_timestamp, self.page_links
+        )
+
+        # Go to next page
+        self.page_num = self.page_num + 1
+
+        # Send console message
+        self.scraper.next_page_message(count=self.count, page_num=self.page_num)
+
+        return True
@@ -0,0 +1,97 @@
+import multiprocessing
+import multiprocessing.util
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Processes that parse article pages in each scrape job. 0 (the default) parses
+# in the scrapers' own threads: every job is already a process of its own, up
+# to MAX_SCRAPE_PROCESSES at once, so a pool per job multiplies the processes
+# competing for the cores. Set PARSE_WORKERS to opt in.
+DEFAULT_PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", 0))
+
+# Scraper instances built in this worker process, by class
+worker_scrapers = {}
+
+
+class ParsePool:
+    """Pool of worker processes that turn raw article pages into article dicts
+    with the scrapers' own parse_article hooks. Parsing is pure Python, so in
+    threads it is serialized by the GIL; in processes it scales with cores.
+
+    Workers are spawned rather than forked, since scrapes run in threads and a
+    forked copy of a threaded process can deadlock. As with any spawned pool,
+    a script that scrapes needs an `if __name__ == "__main__":` guard. The
+    pool starts on first use, and again in any process forked from one that
+    started it.
+
+    max_workers defaults to the number of cores.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self.executor = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def get_executor(self):
+        """Returns this process's executor, starting it if needed."""
+
+        with self.lock:
+            if self.executor is None or self.pid != os.getpid():
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                self.pid = os.getpid()
+
+                # A multiprocessing child (e.g. a scrape job) waits for its own
+                # children before the executor's exit hook would stop them, so
+                # the workers are stopped first, while the executor's queues
+                # (closed at exitpriority 10) can still reach them
+                multiprocessing.util.Finalize(None, self.shutdown, exitpriority=20)
+
+            return self.executor
+
+    def extract_article(self, scraper_class, config, content):
+        """Parses an article page body in a worker process and returns
+        {"date_posted": ..., "full_text": ...}. Errors raised by the scraper's
+        hook are raised here.
+        """
+
+        future = self.get_executor().submit(
+            extract_article, scraper_class, config, content
+        )
+
+        return future.result()
+
+    def shutdown(self):
+        """Stops the worker processes. The pool restarts if used again."""
+
+        with self.lock:
+            if self.executor is not None and self.pid == os.getpid():
+                self.executor.shutdown()
+
+            self.executor = None
+
+
+def extract_article(scraper_class, config, content):
+    """Runs in a worker: parses an article page body with a scraper's
+    article_strainer and parse_article hook.
+    """
+
+    scraper = worker_scrapers.get(scraper_class)
+
+    if scraper is None:
+        scraper = worker_scrapers[scraper_class] = scraper_class()
+
+    # Scrapers may run with a modified config (e.g. the benchmark's)
+    scraper.config = config
+
+    soup = scraper.make_soup(content, parse_only=config.article_strainer)
+
+    return scraper.parse_article(soup)
+
+
+# Shared by every scraper in this process (None parses in threads instead)
+PARSE_POOL = ParsePool(DEFAULT_PARSE_WORKERS) if DEFAULT_PARSE_WORKERS else None
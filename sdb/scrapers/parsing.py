@@ -0,0 +1,121 @@
+import importlib.util
+
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+
+# Parser backend used for every page. lxml builds a tree several times faster
+# than Python's html.parser, which is only used if lxml isn't installed.
+DEFAULT_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+if DEFAULT_PARSER == "lxml":
+    from lxml import etree
+
+
+def make_soup(content, parser=DEFAULT_PARSER, parse_only=None):
+    """Parses a page body into soup. Given a SoupStrainer (see strain), only
+    the elements it matches are built.
+    """
+
+    return BeautifulSoup(content, parser, parse_only=parse_only)
+
+
+class ElementStrainer(SoupStrainer):
+    """SoupStrainer that keeps only the given elements, with everything inside
+    them. Each target is (tag name, {attribute: value}), and a class matches
+    if the element has it among its classes.
+    """
+
+    def __init__(self, targets):
+        super().__init__()
+        self.targets = targets
+
+    def matches(self, name, attrs):
+        """Returns True if a tag about to be built is one of the targets."""
+
+        return any(
+            name == target_name and has_attrs(attrs or {}, target_attrs)
+            for target_name, target_attrs in self.targets
+        )
+
+    # Called while parsing by bs4 4.13 and later
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        return self.matches(name, attrs)
+
+    # Called while parsing by earlier versions
+    def search_tag(self, markup_name=None, markup_attrs={}):
+        if isinstance(markup_name, Tag):
+            [markup_name, markup_attrs] = [markup_name.name, markup_name.attrs]
+
+        return markup_name if self.matches(markup_name, markup_attrs) else None
+
+
+class ElementWatcher:
+    """Follows a page while it downloads, with lxml's incremental parser, to
+    tell when the first element matching target (tag name, {attribute: value},
+    as in strain) has closed. Without lxml it never does, so pages are read in
+    full.
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self.element = None
+        self.closed = False
+        self.parser = None
+
+        if DEFAULT_PARSER == "lxml":
+            self.parser = etree.HTMLPullParser(events=("start", "end"))
+
+    def feed(self, chunk):
+        """Parses the next chunk of the page. Returns True once the target has
+        closed, after which the rest of the page isn't needed.
+        """
+
+        if self.parser is None or self.closed:
+            return self.closed
+
+        self.parser.feed(chunk)
+        [target_name, target_attrs] = self.target
+
+        for event, element in self.parser.read_events():
+            if event == "start":
+                if (
+                    self.element is None
+                    and element.tag == target_name
+                    and has_attrs(element.attrib, target_attrs)
+                ):
+                    self.element = element
+            elif element is self.element:
+                self.closed = True
+                break
+
+        return self.closed
+
+
+def strain(*targets):
+    """Returns an ElementStrainer for the given (tag name, {attribute: value})
+    targets, e.g.
+
+    strain(("div", {"class": "entry-content"}),
+           ("meta", {"property": "article:published_time"}))
+    """
+
+    return ElementStrainer(targets)
+
+
+def has_attrs(attrs, wanted):
+    """Returns True if an element's raw attributes include every wanted one."""
+
+    for attr, value in wanted.items():
+        actual = attrs.get(attr)
+
+        if actual is None:
+            return False
+
+        if attr == "class":
+            # Still a single string while the page is being parsed
+            classes = actual.split() if isinstance(actual, str) else actual
+            if value not in classes:
+                return False
+        elif actual != value:
+            return False
+
+    return True
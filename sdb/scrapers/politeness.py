@@ -0,0 +1,225 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+from sdb.rate_limit import TokenBucket
+
+# Default request rate allowed per host
+DEFAULT_REQUESTS_PER_SECOND = 5
+
+# Requests in flight per host when a host is first seen
+INITIAL_CONCURRENCY = 2
+
+# How far the concurrency limit is cut when a host shows signs of overload
+DECREASE_FACTOR = 0.5
+
+# Responses slower than this multiple of a host's usual latency count as a
+# sign of overload
+LATENCY_TOLERANCE = 2.0
+
+# Weight of the newest response in a host's usual latency (moving average)
+LATENCY_SMOOTHING = 0.1
+
+# Seconds a host is paused after a 429 without a Retry-After header
+DEFAULT_RETRY_AFTER = 5
+
+# Longest pause a Retry-After header can ask for (same as RetryPolicy's
+# backoff_max). A scrape waiting longer than that isn't worth keeping alive.
+MAX_RETRY_AFTER = 30
+
+# Statuses meaning the server is overloaded or throttling us
+OVERLOAD_STATUSES = (429, 500, 502, 503, 504)
+
+
+class AIMDLimiter:
+    """Adaptive limit on requests in flight to a single host.
+
+    The limit grows by about one request per round of healthy responses
+    (additive increase) and is halved when the host throttles us, errors or
+    slows down well beyond its usual latency (multiplicative decrease), the way
+    TCP finds the throughput a link can sustain.
+    """
+
+    def __init__(self, max_limit, min_limit=1, initial_limit=INITIAL_CONCURRENCY):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max(min_limit, min(initial_limit, max_limit)))
+
+        self.in_flight = 0
+        self.latency = None
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """Blocks until another request fits under the limit."""
+
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+
+            self.in_flight += 1
+
+    def release(self, latency, overloaded=False):
+        """Records how a request went and adjusts the limit."""
+
+        with self.condition:
+            self.in_flight -= 1
+
+            slow = (
+                not overloaded
+                and self.latency is not None
+                and latency > self.latency * LATENCY_TOLERANCE
+            )
+
+            if overloaded or slow:
+                # Responses to requests sent before the last cut would
+                # otherwise cut the limit again
+                now = time.monotonic()
+                if now - self.last_decrease > (self.latency or latency):
+                    self.limit = max(self.min_limit, self.limit * DECREASE_FACTOR)
+                    self.last_decrease = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+            # Only real responses count towards the usual latency. A host that
+            # stays slow becomes the new normal.
+            if not overloaded:
+                if self.latency is None:
+                    self.latency = latency
+                else:
+                    self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+
+            self.condition.notify_all()
+
+    def cancel(self):
+        """Frees the slot of a request that was abandoned before it got a
+        response, without adjusting the limit.
+        """
+
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+
+class HostLimiter:
+    """Politeness limits for a single host: a token bucket caps the request
+    rate, and an AIMDLimiter caps the requests in flight.
+    """
+
+    def __init__(self, requests_per_second, max_concurrency):
+        if requests_per_second <= 0:
+            raise ValueError(
+                f"requests_per_second must be positive, got {requests_per_second}"
+            )
+
+        self.bucket = TokenBucket(max(1, requests_per_second), requests_per_second)
+        self.concurrency = AIMDLimiter(max_concurrency)
+
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+
+    def acquire(self, stop_event=None):
+        """Blocks until a request to this host is allowed. Returns True once it
+        is, or False if stop_event was set while waiting for the rate limit.
+        """
+
+        self.concurrency.acquire()
+
+        if not self.bucket.acquire(stop_event=stop_event):
+            self.concurrency.cancel()
+            return False
+
+        return True
+
+    def release(self, latency, status=None, retry_after=None):
+        """Records the outcome of a request (status is None if it failed
+        without a response).
+        """
+
+        with self.lock:
+            self.requests += 1
+
+            if status is None:
+                self.errors += 1
+            elif status in OVERLOAD_STATUSES:
+                self.throttled += 1
+
+        if status == 429:
+            self.bucket.pause(get_retry_after_seconds(retry_after))
+
+        self.concurrency.release(
+            latency, overloaded=status is None or status in OVERLOAD_STATUSES
+        )
+
+    def cancel(self):
+        """Frees the slot of an acquired request that was never made or was
+        abandoned, e.g. when a crawl is cancelled.
+        """
+
+        self.concurrency.cancel()
+
+    def get_stats(self):
+        """Returns this host's counters and current limits.
+
+        Returns: {"requests": 40, "throttled": 1, "errors": 0,
+                  "concurrency": 3.5, "latency": 0.21}
+        """
+
+        with self.lock:
+            counters = {
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "errors": self.errors,
+            }
+
+        return {
+            **counters,
+            "concurrency": self.concurrency.limit,
+            "latency": self.concurrency.latency,
+        }
+
+
+class HostLimiterRegistry:
+    """HostLimiters by host, created on first use. Shared by every scraper in
+    the process, so two scrapers on one host share its limits.
+    """
+
+    def __init__(self):
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def get(self, url, requests_per_second, max_concurrency):
+        """Returns the HostLimiter for url's host."""
+
+        host = urlsplit(url).netloc
+
+        with self.lock:
+            if host not in self.limiters:
+                self.limiters[host] = HostLimiter(requests_per_second, max_concurrency)
+
+            return self.limiters[host]
+
+    def get_stats(self):
+        """Returns {host: stats} for every host seen."""
+
+        with self.lock:
+            return {
+                host: limiter.get_stats() for host, limiter in self.limiters.items()
+            }
+
+
+def get_retry_after_seconds(retry_after):
+    """Returns the seconds a Retry-After header asks for (at most
+    MAX_RETRY_AFTER), or the default.
+    """
+
+    try:
+        return min(MAX_RETRY_AFTER, max(0.0, float(retry_after)))
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+# Shared by every PooledSession in this process
+HOST_LIMITERS = HostLimiterRegistry()
@@ -0,0 +1,102 @@
+import asyncio
+import random
+import time
+
+from sdb.scrapers.politeness import get_retry_after_seconds
+from sdb.scrapers.scraping_error import ScrapingError
+
+# Attempts per request, including the first
+DEFAULT_MAX_ATTEMPTS = 4
+
+# Backoff grows as BACKOFF_BASE * 2^attempt seconds, up to BACKOFF_MAX
+BACKOFF_BASE = 1
+BACKOFF_MAX = 30
+
+# Statuses worth retrying: timeouts, throttling and server errors. Any other
+# status (e.g. 404, 403) will fail the same way again.
+RETRYABLE_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+
+
+class RetryPolicy:
+    """Decides which failed requests are retried and how long to wait first.
+
+    Connection errors, timeouts and RETRYABLE_STATUSES are retried with
+    jittered exponential backoff (or the server's Retry-After). Everything else
+    is fatal and raised at once.
+    """
+
+    def __init__(
+        self,
+        max_attempts=DEFAULT_MAX_ATTEMPTS,
+        backoff_base=BACKOFF_BASE,
+        backoff_max=BACKOFF_MAX,
+    ):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def is_retryable(self, error):
+        """Returns True if a request that failed with error may succeed later."""
+
+        if not isinstance(error, ScrapingError):
+            return False
+
+        return error.status_code is None or error.status_code in RETRYABLE_STATUSES
+
+    def get_backoff_seconds(self, error, attempt):
+        """Returns how long to wait before retrying after the given attempt
+        (0 for the first).
+        """
+
+        if getattr(error, "retry_after", None) is not None:
+            return min(self.backoff_max, get_retry_after_seconds(error.retry_after))
+
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2**attempt)
+        )
+
+    def call(self, fn, *args, stop_event=None):
+        """Returns fn(*args), retrying retryable errors. Waiting stops early,
+        raising the last error, once stop_event is set.
+        """
+
+        for attempt in range(self.max_attempts):
+            try:
+                return fn(*args)
+            except Exception as e:
+                if not self.should_retry(e, attempt):
+                    raise
+
+                wait = self.get_backoff_seconds(e, attempt)
+                print(f"{e}, retrying in {wait:.1f}s")
+
+                if stop_event is None:
+                    time.sleep(wait)
+                elif stop_event.wait(wait):
+                    raise
+
+    async def call_async(self, fn, *args, stop_event=None):
+        """Async counterpart to call, for coroutine functions."""
+
+        for attempt in range(self.max_attempts):
+            try:
+                return await fn(*args)
+            except Exception as e:
+                if not self.should_retry(e, attempt):
+                    raise
+
+                wait = self.get_backoff_seconds(e, attempt)
+                print(f"{e}, retrying in {wait:.1f}s")
+                await asyncio.sleep(wait)
+
+                if stop_event is not None and stop_event.is_set():
+                    raise
+
+    def should_retry(self, error, attempt):
+        """Returns True if another attempt should follow a failed one."""
+
+        return attempt + 1 < self.max_attempts and self.is_retryable(error)
+
+
+# Used by every scraper unless it sets its own
+DEFAULT_RETRY_POLICY = RetryPolicy()
@@ -1,8 +1,118 @@
+from collections import namedtuple
 from dataclasses import dataclass, field
-from typing import List, Optional
+from typing import Callable, List, Optional
+
+# Articles buffered by a ScrapeResult before they are handed to its sink
+DEFAULT_BATCH_SIZE = 50
+
+# Last listing page of a publication whose articles were all handed over, with
+# its oldest timestamp and {link: timestamp} for its articles
+Checkpoint = namedtuple(
+    "Checkpoint", ["publication", "page_num", "last_timestamp", "links"]
+)
+
 
 @dataclass
 class ScrapeResult:
+    """Articles scraped from a single publication.
+
+    If a sink is given, articles are handed to it in batches of batch_size as
+    they are added (and on flush), so article_list only ever holds the current
+    batch. Without a sink every article stays in article_list.
+
+    Articles that failed to scrape are listed in failed_articles and don't make
+    the result unsuccessful by themselves.
+
+    If on_checkpoint is given, it receives a Checkpoint after every completed
+    listing page (see complete_page).
+    """
+
     article_list: List[dict] = field(default_factory=list)
     success: bool = True
-    error_message: Optional[str] = None
\ No newline at end of file
+    error_message: Optional[str] = None
+    publication: Optional[str] = None
+    sink: Optional[Callable[[List[dict]], None]] = field(
+        default=None, repr=False, compare=False
+    )
+    batch_size: int = DEFAULT_BATCH_SIZE
+    article_count: int = 0
+    newest_article: Optional[dict] = None
+    failed_articles: List[dict] = field(default_factory=list)
+    on_checkpoint: Optional[Callable[[Checkpoint], None]] = field(
+        default=None, repr=False, compare=False
+    )
+
+    def add_article(self, article):
+        """Adds an article, flushing to the sink once a batch is full."""
+
+        self.article_list.append(article)
+        self.article_count += 1
+
+        # Listings are newest-first, so ">" keeps the first of equal dates
+        if (
+            self.newest_article is None
+            or article["date_posted"] > self.newest_article["date_posted"]
+        ):
+            self.newest_article = article
+
+        if len(self.article_list) >= self.batch_size:
+            self.flush()
+
+    def add_failed_article(self, link, error):
+        """Records an article that couldn't be scraped, so the rest of the
+        publication can carry on without it.
+        """
+
+        self.failed_articles.append(
+            {
+                "link": link,
+                "error": str(error),
+                "status_code": getattr(error, "status_code", None),
+            }
+        )
+
+    def complete_page(self, page_num, last_timestamp, links):
+        """Marks a listing page as done. Its articles are flushed first, so a
+        checkpoint never gets ahead of the articles it covers.
+        """
+
+        if self.on_checkpoint is None:
+            return
+
+        self.flush()
+        self.on_checkpoint(
+            Checkpoint(self.publication, page_num, last_timestamp, links)
+        )
+
+    def flush(self):
+        """Hands any buffered articles to the sink."""
+
+        if self.sink is None or not self.article_list:
+            return
+
+        batch = self.article_list
+        self.article_list = []
+        self.sink(batch)
+
+    def get_newest_article(self):
+        """Returns the newest article added, including ones already flushed."""
+
+        if self.newest_article is not None:
+            return self.newest_article
+
+        if self.article_list:
+            return max(self.article_list, key=lambda a: a["date_posted"])
+
+        return None
+
+
+def get_resume_page(checkpoint):
+    """Returns the listing page a scrape starts at: 1, or the page after the
+    one a Checkpoint (from an earlier, interrupted run) recorded.
+    """
+
+    if checkpoint is None:
+        return 1
+
+    print(f"RESUMING {checkpoint.publication} AFTER PAGE {checkpoint.page_num}")
+    return checkpoint.page_num + 1
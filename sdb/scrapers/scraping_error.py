@@ -1,6 +1,10 @@
 class ScrapingError(Exception):
-    """Custom exception class for errors during web scraping."""
+    """Custom exception class for errors during web scraping. status_code is
+    the server's response status, or None if no response was received.
+    """
 
-    def __init__(self, message, url):
+    def __init__(self, message, url, status_code=None, retry_after=None):
         super().__init__(message)
-        self.url = url
\ No newline at end of file
+        self.url = url
+        self.status_code = status_code
+        self.retry_after = retry_after
@@ -1,12 +1,206 @@
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import argostranslate.package
 import argostranslate.translate
 
+from sdb.cache import ContentCache
+
 from_code = "ar"
 to_code = "en"
 
+# Optional directory of .argosmodel files to install from instead of the
+# Argos package index, for machines without network access
+ARGOS_MODEL_DIR = os.environ.get("ARGOS_MODEL_DIR")
+
+# Paragraphs sent to a pool worker per task
+DEFAULT_TRANSLATION_BATCH_SIZE = 8
+
+# Smaller jobs are translated in-process, since starting workers (and loading
+# the model in each) costs more than it saves
+MIN_SEGMENTS_FOR_POOL = 50
+
+# Translated segments (titles, paragraphs, boilerplate) keyed by source text
+TRANSLATION_MEMORY = ContentCache("translation:ar-en")
+
+# Line breaks between paragraphs (with the whitespace around them), and
+# whitespace around the whole text
+PARAGRAPH_BREAK = re.compile(r"(\A\s+|\s*\n\s*|\s+\Z)")
+
+
+class TranslationError(Exception):
+    """Raised when the translation model can't be installed or loaded."""
+
+
+class TranslationEngine:
+    """Installs and loads the Argos model once per process, then keeps the
+    loaded translator warm for every later call.
+
+    The model is installed from model_dir when one is given, so the app can
+    translate without network access. Otherwise it is downloaded from the
+    Argos package index, but only if it isn't installed already.
+    """
+
+    def __init__(self, from_code=from_code, to_code=to_code, model_dir=ARGOS_MODEL_DIR):
+        self.from_code = from_code
+        self.to_code = to_code
+        self.model_dir = model_dir
+
+        self.translator = None
+        self.status = "cold"
+        self.error = None
+        self.load_seconds = None
+        self.translations = 0
+        self.lock = threading.Lock()
+
+    def warm_up(self, install=True):
+        """Installs (if needed) and loads the translator, once. Safe to call
+        from several threads. Returns the loaded translator.
+
+        With install=False the model is only loaded, e.g. in pool workers whose
+        parent already installed it.
+        """
+
+        if self.translator is not None:
+            return self.translator
+
+        with self.lock:
+            if self.translator is not None:
+                return self.translator
+
+            self.status = "loading"
+            start = time.perf_counter()
+
+            try:
+                if install and not self.is_installed():
+                    self.install()
+                self.translator = self.load()
+            except Exception as e:
+                self.status = "error"
+                self.error = str(e)
+                raise TranslationError(f"Failed to load translator: {e}") from e
+
+            self.load_seconds = time.perf_counter() - start
+            self.status = "ready"
+            self.error = None
+
+        return self.translator
+
+    def ensure_installed(self):
+        """Installs the language pair's package unless it is installed or
+        loaded already, without loading it.
+        """
+
+        if self.translator is not None:
+            return
+
+        with self.lock:
+            try:
+                if not self.is_installed():
+                    self.install()
+            except Exception as e:
+                raise TranslationError(f"Failed to install translator: {e}") from e
+
+    def is_installed(self):
+        """Returns True if the language pair's package is already installed."""
+
+        return any(
+            p.from_code == self.from_code and p.to_code == self.to_code
+            for p in argostranslate.package.get_installed_packages()
+        )
+
+    def install(self):
+        """Installs the language pair's package from model_dir, or from the Argos
+        package index if no model_dir is set.
+        """
+
+        if self.model_dir:
+            for name in sorted(os.listdir(self.model_dir)):
+                if name.endswith(".argosmodel"):
+                    argostranslate.package.install_from_path(
+                        os.path.join(self.model_dir, name)
+                    )
+
+            if not self.is_installed():
+                raise TranslationError(
+                    f"No {self.from_code}->{self.to_code} package in {self.model_dir}"
+                )
+            return
+
+        argostranslate.package.update_package_index()
+        available_packages = argostranslate.package.get_available_packages()
+        package_to_install = next(
+            filter(
+                lambda x: x.from_code == self.from_code and x.to_code == self.to_code,
+                available_packages,
+            )
+        )
+        argostranslate.package.install_from_path(package_to_install.download())
+
+    def load(self):
+        """Returns the translator object for the installed language pair."""
+
+        installed_languages = argostranslate.translate.get_installed_languages()
+        languages = {language.code: language for language in installed_languages}
+
+        if self.from_code not in languages or self.to_code not in languages:
+            raise TranslationError(f"{self.from_code}->{self.to_code} is not installed")
+
+        return languages[self.from_code].get_translation(languages[self.to_code])
+
+    def translate(self, text):
+        """Translates text with the warm translator."""
+
+        translated_text = self.warm_up().translate(text)
+        self.translations += 1
+        return translated_text
+
+    def translate_many(self, paragraphs):
+        """Translates single-line paragraphs with one call to the translator.
+        Argos translates each line of its input as a paragraph of its own, so
+        they are sent as lines of one text and split apart again. If the lines
+        don't come back one per paragraph, they are translated one at a time.
+        """
+
+        if not paragraphs:
+            return []
+
+        lines = self.warm_up().translate("\n".join(paragraphs)).split("\n")
+
+        if len(lines) != len(paragraphs):
+            return [self.translate(paragraph) for paragraph in paragraphs]
+
+        self.translations += len(paragraphs)
+        return lines
+
+    def get_status(self):
+        """Returns the engine's health status.
+
+        Returns: {"status": "ready", "from_code": "ar", "to_code": "en", ...}
+        """
+
+        return {
+            "status": self.status,
+            "from_code": self.from_code,
+            "to_code": self.to_code,
+            "offline": bool(self.model_dir),
+            "load_seconds": self.load_seconds,
+            "translations": self.translations,
+            "error": self.error,
+        }
+
+
+# Shared by every request handled by this process
+ENGINE = TranslationEngine()
+
+
 def initialize_argostranslate():
-    """Should be run at the start of each scrape to update to latest language
-    packs from Argos.
+    """Updates to the latest language packs from Argos. Not needed before
+    translating, since ENGINE installs the model on first use.
     """
 
     argostranslate.package.update_package_index()
@@ -25,9 +219,164 @@ def initialize_argostranslate():
 def translate_ar_to_en(text):
     """Accepts Arabic text and returns it translated to English"""
 
-    translated_text = argostranslate.translate.translate(text, from_code=from_code, to_code=to_code)
+    translated_text = TRANSLATION_MEMORY.get(text)
+
+    if translated_text is None:
+        translated_text = ENGINE.translate(text)
+        TRANSLATION_MEMORY.set(text, translated_text)
+
     return translated_text
 
+
+def split_segments(text):
+    """Splits text into paragraphs and the breaks between them, so it can be
+    rebuilt with its original layout. Paragraphs are at the even indexes.
+
+    Returns: ["First paragraph.", "\n\n", "Next paragraph"]
+    """
+
+    return PARAGRAPH_BREAK.split(text)
+
+
+def warm_up_worker():
+    """Loads the model once when a pool worker starts. The parent installs it
+    first, so workers never download or install it at the same time.
+    """
+
+    ENGINE.warm_up(install=False)
+
+
+def translate_segments(segments):
+    """Translates a batch of segments with this process's warm engine, in a
+    single call. Each segment is a whole paragraph.
+    """
+
+    return ENGINE.translate_many(segments)
+
+
+def translate_segments_in_pool(
+    segments,
+    processes=None,
+    batch_size=DEFAULT_TRANSLATION_BATCH_SIZE,
+    on_progress=None,
+):
+    """Translates segments in order, spreading large jobs in batches across a
+    process pool with one worker per CPU (by default). on_progress(done, total)
+    is called with the number of segments translated after each batch.
+    """
+
+    processes = processes or os.cpu_count() or 1
+
+    batches = [
+        segments[start : start + batch_size]
+        for start in range(0, len(segments), batch_size)
+    ]
+
+    if processes == 1 or len(segments) < MIN_SEGMENTS_FOR_POOL:
+        translated = map(translate_segments, batches)
+        return join_batches(translated, len(segments), on_progress)
+
+    # Installed once here, so workers only have to load it
+    ENGINE.ensure_installed()
+
+    # Spawned workers don't inherit the app's db connections or threads
+    with ProcessPoolExecutor(
+        max_workers=min(processes, len(batches)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=warm_up_worker,
+    ) as executor:
+        translated = executor.map(translate_segments, batches)
+        return join_batches(translated, len(segments), on_progress)
+
+
+def join_batches(batches, total, on_progress=None):
+    """Joins translated batches of total segments as they come in, reporting
+    progress after each one.
+    """
+
+    translated = []
+
+    for batch in batches:
+        translated += batch
+
+        if on_progress is not None:
+            on_progress(len(translated), total)
+
+    return translated
+
+
+def translate_batch(
+    texts,
+    processes=None,
+    batch_size=DEFAULT_TRANSLATION_BATCH_SIZE,
+    on_progress=None,
+):
+    """Translates a list of Arabic texts and returns them in the same order.
+    Texts are split into paragraphs, identical paragraphs across the whole job
+    are translated once, and large jobs are spread across a process pool.
+    Paragraphs already in the translation memory aren't translated at all.
+
+    on_progress(done, total) is called as paragraphs are translated.
+    """
+
+    documents = [None if text is None else split_segments(text) for text in texts]
+
+    # Unique paragraphs, in first-seen order
+    segments = list(
+        dict.fromkeys(
+            paragraph
+            for document in documents
+            if document
+            for paragraph in document[::2]
+            if paragraph
+        )
+    )
+
+    translations = TRANSLATION_MEMORY.get_many(segments)
+    missing = [segment for segment in segments if segment not in translations]
+
+    translated = dict(
+        zip(
+            missing,
+            translate_segments_in_pool(missing, processes, batch_size, on_progress),
+        )
+    )
+    TRANSLATION_MEMORY.set_many(translated)
+    translations.update(translated)
+
+    # Paragraphs are replaced by their translations, breaks are kept as they are
+    return [
+        None
+        if document is None
+        else "".join(
+            translations[segment] if index % 2 == 0 and segment else segment
+            for index, segment in enumerate(document)
+        )
+        for document in documents
+    ]
+
+
+def translate_entries_batch(entries, processes=None, on_progress=None):
+    """Translates the titles and full texts of many entries in one batch.
+    on_progress(done, total) is called as paragraphs are translated.
+
+    Returns: [[en_title, en_full_text], ...] in the same order as entries
+    """
+
+    translated = translate_batch(
+        [e.title for e in entries] + [e.full_text for e in entries],
+        processes=processes,
+        on_progress=on_progress,
+    )
+
+    return [
+        [en_title, en_full_text]
+        for en_title, en_full_text in zip(
+            translated[: len(entries)], translated[len(entries) :]
+        )
+    ]
+
+
 def get_translated_entry_title_and_text(entry):
     """Translates a given entry and updates it in the db"""
 
@@ -38,6 +387,3 @@ def get_translated_entry_title_and_text(entry):
     en_full_text = translate_ar_to_en(ar_full_text)
 
     return [en_title, en_full_text]
-
-
-
@@ -1,12 +1,37 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
 from unittest import TestCase
 from unittest.mock import patch
 
-from sdb.ai_utils import get_ai_summary_for_arabic_text
+import openai
+
+from sdb.ai_utils import (
+    get_ai_summary_for_arabic_text,
+    get_summary_cache_text,
+    split_into_chunks,
+    LIMITER,
+    SummaryScheduler,
+    SUMMARY_CACHE,
+)
+from sdb.rate_limit import RateLimiter
 
 
 class GetAISummaryForArabicTextTestCase(TestCase):
     """Tests for ai_utils.py"""
 
+    def setUp(self):
+        """Start from an empty, memory-only summary cache."""
+
+        SUMMARY_CACHE.clear()
+        self.durable = patch.object(SUMMARY_CACHE, "durable", False)
+        self.durable.start()
+
+    def tearDown(self):
+        self.durable.stop()
+
     @patch("openai.ChatCompletion.create")
     def test_get_ai_summary_for_arabic_text(self, mock_openai):
         """Does get_ai_summary_for_arabic_text run without error?"""
@@ -20,3 +45,311 @@ class GetAISummaryForArabicTextTestCase(TestCase):
 
         """Should return content of response from OpenAI API call"""
         self.assertEqual(result, "Summarized text")
+
+    @patch("openai.ChatCompletion.create")
+    def test_get_ai_summary_cached(self, mock_openai):
+        """Is an article summarized twice only sent to the API once?"""
+
+        mock_openai.return_value = {
+            "choices": [{"message": {"content": "Summarized text"}}]
+        }
+
+        get_ai_summary_for_arabic_text("اختبار")
+
+        """Should return the cached summary without another API call"""
+        self.assertEqual(get_ai_summary_for_arabic_text("اختبار"), "Summarized text")
+        mock_openai.assert_called_once()
+
+    @patch("sdb.ai_utils.ENCODING", False)
+    def test_split_into_chunks(self):
+        """Does split_into_chunks keep chunks within the token budget?"""
+
+        # 10 tokens per paragraph without the tokenizer (2 characters per token)
+        paragraphs = ["أ" * 20, "ب" * 20, "ج" * 20]
+
+        """Should group whole paragraphs while they fit"""
+        self.assertEqual(
+            split_into_chunks("\n".join(paragraphs), max_tokens=20),
+            [f"{paragraphs[0]}\n{paragraphs[1]}", paragraphs[2]],
+        )
+
+        """Should split a paragraph longer than the budget"""
+        self.assertEqual(
+            split_into_chunks("د" * 50, max_tokens=10), ["د" * 20] * 2 + ["د" * 10]
+        )
+
+    def test_get_summary_cache_text(self):
+        """Does the cache key change with the model and prompt?"""
+
+        """Should differ by model and by prompt"""
+        self.assertNotEqual(
+            get_summary_cache_text("اختبار", model="a"),
+            get_summary_cache_text("اختبار", model="b"),
+        )
+        self.assertNotEqual(
+            get_summary_cache_text("اختبار", prompt="a"),
+            get_summary_cache_text("اختبار", prompt="b"),
+        )
+
+
+class FakeCompletionHandler(BaseHTTPRequestHandler):
+    """Answers chat completion requests like the OpenAI API, echoing the
+    user's message. Responds 429 to the first rate_limited requests.
+    """
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            rate_limited = server.requests <= server.rate_limited
+
+        time.sleep(server.latency)
+
+        if rate_limited:
+            status = 429
+            payload = {"error": {"message": "Rate limit reached", "type": "requests"}}
+        else:
+            status = 200
+            content = f"Summary of {body['messages'][-1]['content']}"
+            payload = {
+                "id": "chatcmpl-test",
+                "object": "chat.completion",
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+            }
+
+        with server.lock:
+            server.in_flight -= 1
+
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if rate_limited:
+            self.send_header("Retry-After", "0")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SummarySchedulerTestCase(TestCase):
+    """Tests for SummaryScheduler against a local fake completion server"""
+
+    def setUp(self):
+        """Start the fake server and point the OpenAI client at it."""
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeCompletionHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.requests = 0
+        self.server.in_flight = 0
+        self.server.max_in_flight = 0
+        self.server.rate_limited = 0
+        self.server.latency = 0.2
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.api_base = openai.api_base
+        self.api_key = openai.api_key
+        openai.api_base = f"http://127.0.0.1:{self.server.server_port}/v1"
+        openai.api_key = "test"
+
+        SUMMARY_CACHE.clear()
+        self.durable = patch.object(SUMMARY_CACHE, "durable", False)
+        self.durable.start()
+
+    def tearDown(self):
+        self.durable.stop()
+        openai.api_base = self.api_base
+        openai.api_key = self.api_key
+        self.server.shutdown()
+        self.server.server_close()
+
+    def make_entries(self, count):
+        return [
+            SimpleNamespace(id=i, full_text=f"مقالة {i}", ai_summary=None)
+            for i in range(count)
+        ]
+
+    @patch("sdb.ai_utils.db.session")
+    def test_summarize_entries_concurrently(self, mock_session):
+        """Are entries summarized concurrently up to max_concurrency?"""
+
+        entries = self.make_entries(6)
+        scheduler = SummaryScheduler(max_concurrency=3)
+
+        start = time.perf_counter()
+        errors = scheduler.summarize_entries(entries, batch_size=2)
+        elapsed = time.perf_counter() - start
+
+        """Should summarize every entry"""
+        self.assertEqual(errors, [])
+        for e in entries:
+            self.assertEqual(e.ai_summary, f"Summary of {e.full_text}")
+
+        """Should keep at most max_concurrency requests in flight"""
+        self.assertEqual(self.server.max_in_flight, 3)
+        self.assertLess(elapsed, 6 * self.server.latency)
+
+        """Should commit in batches, plus once at the end"""
+        self.assertEqual(mock_session.commit.call_count, 4)
+
+    @patch("sdb.ai_utils.db.session")
+    def test_summarize_entries_progress(self, mock_session):
+        """Is progress reported for jobs smaller than a batch?"""
+
+        progress = []
+        SummaryScheduler().summarize_entries(
+            self.make_entries(3),
+            on_progress=lambda done, total: progress.append((done, total)),
+        )
+
+        """Should report the job done after the final commit"""
+        self.assertEqual(progress, [(3, 3)])
+
+    @patch("sdb.ai_utils.db.session")
+    def test_summarize_entries_cached(self, mock_session):
+        """Are repeated and already summarized texts kept off the API?"""
+
+        # Two entries share the same text
+        entries = self.make_entries(3)
+        entries[2].full_text = entries[1].full_text
+        SummaryScheduler().summarize_entries(entries)
+
+        """Should summarize a repeated text once"""
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(entries[2].ai_summary, "Summary of مقالة 1")
+
+        # Copies of the entries, e.g. migrated to another collection
+        copies = self.make_entries(2)
+        SummaryScheduler().summarize_entries(copies)
+
+        """Should serve copies from the cache"""
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(copies[0].ai_summary, "Summary of مقالة 0")
+
+    @patch("sdb.ai_utils.ENCODING", False)
+    @patch("sdb.ai_utils.CHUNK_TOKENS", 20)
+    @patch("sdb.ai_utils.MAX_SINGLE_SHOT_TOKENS", 50)
+    def test_chunked_summary(self):
+        """Is a long article summarized in parallel chunks, then merged?"""
+
+        # Six paragraphs of 15 tokens each, one per chunk
+        paragraphs = [f"فقرة {i} " + "ن" * 22 for i in range(6)]
+
+        start = time.perf_counter()
+        summary = get_ai_summary_for_arabic_text("\n".join(paragraphs))
+        elapsed = time.perf_counter() - start
+
+        """Should summarize every chunk, then merge the partial summaries"""
+        self.assertEqual(self.server.requests, 7)
+        self.assertEqual(
+            summary,
+            "Summary of " + "\n\n".join(f"Summary of {p}" for p in paragraphs),
+        )
+
+        """Should summarize the chunks concurrently"""
+        self.assertGreater(self.server.max_in_flight, 1)
+        self.assertLess(elapsed, 4 * self.server.latency)
+
+    @patch("sdb.ai_utils.db.session")
+    @patch("sdb.ai_utils.ENCODING", False)
+    @patch("sdb.ai_utils.CHUNK_TOKENS", 20)
+    @patch("sdb.ai_utils.MAX_SINGLE_SHOT_TOKENS", 50)
+    def test_summarize_long_entries_concurrently(self, mock_session):
+        """Do the chunks of many long entries share max_concurrency?"""
+
+        # Four chunks each, so every entry alone could fill the limit
+        entries = [
+            SimpleNamespace(
+                id=i,
+                full_text="\n".join(f"فقرة {i}-{j} " + "ن" * 22 for j in range(4)),
+                ai_summary=None,
+            )
+            for i in range(3)
+        ]
+
+        errors = SummaryScheduler(max_concurrency=2).summarize_entries(entries)
+
+        """Should summarize every chunk and merge them"""
+        self.assertEqual(errors, [])
+        self.assertEqual(self.server.requests, 15)
+
+        """Should keep at most max_concurrency requests in flight in total"""
+        self.assertEqual(self.server.max_in_flight, 2)
+
+    def test_short_summary(self):
+        """Is a short article summarized in a single request?"""
+
+        get_ai_summary_for_arabic_text("مقالة قصيرة")
+
+        """Should make one request"""
+        self.assertEqual(self.server.requests, 1)
+
+    @patch("sdb.ai_utils.db.session")
+    def test_summarize_entries_rate_limited(self, mock_session):
+        """Are rate limited requests retried with backoff?"""
+
+        self.server.rate_limited = 2
+        entries = self.make_entries(1)
+
+        errors = SummaryScheduler(max_concurrency=1).summarize_entries(entries)
+
+        """Should retry until the request succeeds"""
+        self.assertEqual(errors, [])
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(entries[0].ai_summary, "Summary of مقالة 0")
+
+    @patch("sdb.ai_utils.db.session")
+    def test_summarize_entries_gives_up(self, mock_session):
+        """Does an entry that keeps failing return an error without raising?"""
+
+        self.server.rate_limited = 100
+        entries = self.make_entries(1)
+
+        errors = SummaryScheduler(
+            max_concurrency=1, max_retries=1
+        ).summarize_entries(entries)
+
+        """Should report the entry's error and leave it unsummarized"""
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].startswith("Entry 0: "))
+        self.assertIsNone(entries[0].ai_summary)
+
+    def test_requests_per_minute_budget(self):
+        """Does the scheduler wait once the request budget is spent?"""
+
+        self.server.latency = 0
+        scheduler = SummaryScheduler(limiter=RateLimiter(60, 90000))
+        scheduler.limiter.requests.tokens = 1
+
+        start = time.perf_counter()
+        scheduler.summarize("أ")
+        scheduler.summarize("ب")
+
+        """Should wait about a second (60 per minute) for the second request"""
+        self.assertGreater(time.perf_counter() - start, 0.9)
+
+    def test_shared_limiter(self):
+        """Do schedulers share one set of budgets, and are empty budgets refused?"""
+
+        """Should give every scheduler the module's limiter"""
+        self.assertIs(SummaryScheduler().limiter, LIMITER)
+        self.assertIs(SummaryScheduler(max_concurrency=2).limiter, LIMITER)
+
+        """Should refuse budgets of 0 or below"""
+        with self.assertRaises(ValueError):
+            RateLimiter(0, 90000)
+        with self.assertRaises(ValueError):
+            RateLimiter(60, -1)
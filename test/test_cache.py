@@ -0,0 +1,141 @@
+import os
+import threading
+from unittest import TestCase, mock
+from sdb.models import db, CacheEntry
+
+os.environ["DATABASE_URL"] = "postgresql:///sdb_test"
+
+from sdb.app import app
+from sdb.cache import ContentCache, normalize
+
+db.drop_all()
+db.create_all()
+
+
+class ContentCacheTestCase(TestCase):
+    """Tests for cache.py"""
+
+    def setUp(self):
+        """Create an empty cache."""
+
+        CacheEntry.query.delete()
+        db.session.commit()
+
+        self.cache = ContentCache("test", max_size=2)
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def test_normalize(self):
+        """Does normalize collapse trivial differences between copies?"""
+
+        """Should strip and collapse whitespace"""
+        self.assertEqual(normalize("  المصدر:\n سانا  "), "المصدر: سانا")
+
+        """Should share a key between copies that only differ in whitespace"""
+        self.assertEqual(
+            self.cache.make_key("المصدر: سانا"), self.cache.make_key(" المصدر:  سانا")
+        )
+
+    def test_get_and_set(self):
+        """Does the cache return stored values and count hits and misses?"""
+
+        """Should miss before a value is set"""
+        self.assertIsNone(self.cache.get("عنوان"))
+
+        self.cache.set("عنوان", "Title")
+
+        """Should hit the memory tier afterwards"""
+        self.assertEqual(self.cache.get("عنوان"), "Title")
+
+        stats = self.cache.get_stats()
+        self.assertEqual(stats["memory_hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_lru_eviction(self):
+        """Does the memory tier evict the least recently used value?"""
+
+        self.cache.durable = False
+
+        self.cache.set("أ", "a")
+        self.cache.set("ب", "b")
+        self.cache.get("أ")
+        self.cache.set("ج", "c")
+
+        """Should keep the recently used value and evict the other"""
+        self.assertEqual(self.cache.get("أ"), "a")
+        self.assertIsNone(self.cache.get("ب"))
+        self.assertEqual(self.cache.get_stats()["size"], 2)
+
+    def test_durable_tier(self):
+        """Are values served from the db once evicted from memory?"""
+
+        self.cache.set_many({"أ": "a", "ب": "b"})
+        self.cache.clear()
+
+        """Should be stored in the db"""
+        self.assertEqual(CacheEntry.query.filter_by(namespace="test").count(), 2)
+
+        """Should serve values from the db tier"""
+        self.assertEqual(self.cache.get_many(["أ", "ب", "ج"]), {"أ": "a", "ب": "b"})
+        self.assertEqual(self.cache.get_stats()["db_hits"], 2)
+
+        """Should ignore values already stored"""
+        self.cache.set("أ", "a")
+        self.assertEqual(CacheEntry.query.filter_by(namespace="test").count(), 2)
+
+    def test_chunked_lookup(self):
+        """Does get_many look up many db keys a chunk at a time?"""
+
+        values = {f"نص {i}": f"text {i}" for i in range(5)}
+        self.cache.set_many(values)
+        self.cache.clear()
+
+        with mock.patch("sdb.cache.DB_CHUNK_SIZE", 2):
+            found = self.cache.get_many(list(values))
+
+        """Should find every value across the chunks"""
+        self.assertEqual(found, values)
+        self.assertEqual(self.cache.get_stats()["db_hits"], 5)
+
+    def test_none(self):
+        """Is None never cached?"""
+
+        self.cache.set(None, "value")
+
+        """Should not store or return anything for None"""
+        self.assertIsNone(self.cache.get(None))
+        self.assertEqual(CacheEntry.query.count(), 0)
+
+    def test_portable_insert(self):
+        """Does the db tier skip stored keys on databases without upserts?"""
+
+        self.cache.set("أ", "a")
+
+        with mock.patch.dict("sdb.cache.UPSERT_INSERTS", clear=True):
+            self.cache.set_many({"أ": "a", "ب": "b"})
+
+        """Should add only the new key"""
+        self.assertEqual(CacheEntry.query.filter_by(namespace="test").count(), 2)
+
+    def test_threaded_stats(self):
+        """Are hits and misses counted exactly from several threads?"""
+
+        self.cache.durable = False
+        self.cache.set("أ", "a")
+
+        def look_up():
+            for _ in range(1000):
+                self.cache.get_many(["أ", "ب"])
+
+        threads = [threading.Thread(target=look_up) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        """Should count every lookup"""
+        stats = self.cache.get_stats()
+        self.assertEqual(stats["memory_hits"], 4000)
+        self.assertEqual(stats["misses"], 4000)
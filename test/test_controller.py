@@ -1,5 +1,7 @@
 import os
+import time
 from enum import Enum
+from multiprocessing import Event
 from unittest import TestCase
 from unittest.mock import Mock, patch
 
@@ -8,16 +10,25 @@ os.environ["DATABASE_URL"] = "postgresql:///sdb_test"
 from sdb.app import app
 from sdb.controller import (
     run_selected_scrapers,
+    get_known_links,
     add_entries_to_db,
     ScraperMap,
     generate_excel_from_collection,
     get_available_scrapers,
+    get_high_water_marks,
+    update_high_water_marks,
+    get_checkpoints,
+    get_scrape_progress,
+    save_checkpoint,
 )
 
 from sdb.scrapers import dez24, sana
 
-from sdb.models import db, Collection, Entry
-from sdb.scrapers.scrape_result import ScrapeResult
+from sdb.models import db, Collection, Entry, CrawlMark, Job
+from sdb.processes import STOP_EVENT
+from sdb.scrapers.base_scraper import HighWaterMark
+from sdb.scrapers.parsing import make_soup
+from sdb.scrapers.scrape_result import Checkpoint, ScrapeResult
 
 db.drop_all()
 db.create_all()
@@ -31,6 +42,7 @@ class ControllerTestCase(TestCase):
 
         Collection.query.delete()
         Entry.query.delete()
+        CrawlMark.query.delete()
 
         collection = Collection(name="Test Collection")
 
@@ -174,6 +186,36 @@ class ControllerTestCase(TestCase):
         self.assertEqual(test_entry.date_posted, "123456789")
         self.assertEqual(test_entry.full_text, "Test Full Text")
 
+    def test_add_entries_to_db_chunked(self):
+        """Does add_entries_to_db insert in chunks and return new ids in order?"""
+
+        entries = [
+            {"title": f"Bulk Entry {i}", "publication": "Test Publication"}
+            for i in range(5)
+        ]
+
+        ids = add_entries_to_db(
+            entries=entries,
+            collection_id=self.collection_id,
+            chunk_size=2,
+            return_ids=True,
+        )
+
+        """Should insert every entry across chunks"""
+        self.assertEqual(len(Entry.query.all()), 6)
+
+        """Should return ids in the same order as the given entries"""
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(
+            [Entry.query.get(id).title for id in ids],
+            [e["title"] for e in entries],
+        )
+
+        """Should return nothing unless ids are requested"""
+        self.assertIsNone(
+            add_entries_to_db(entries=entries, collection_id=self.collection_id)
+        )
+
     @patch("sdb.scrapers.sana.SANA.get_data")
     @patch("sdb.scrapers.dez24.DEZ24.get_data")
     def test_run_selected_scrapers_errorful(self, mock_sana, mock_dez24):
@@ -206,6 +248,425 @@ class ControllerTestCase(TestCase):
         """Should add no entries to db"""
         self.assertEqual(len(Entry.query.all()), 1)
 
+    @patch("sdb.scrapers.sana.SANA.get_data")
+    @patch("sdb.scrapers.dez24.DEZ24.get_data")
+    def test_run_selected_scrapers_parallel(self, mock_dez24, mock_sana):
+        """Does run_selected_scrapers run publications in parallel?"""
+
+        def slow_scrape(stop_timestamp, **kwargs):
+            time.sleep(0.5)
+            return ScrapeResult(article_list=[], success=True)
+
+        mock_sana.side_effect = slow_scrape
+        mock_dez24.side_effect = slow_scrape
+
+        start = time.time()
+        [dataclasses, errors] = run_selected_scrapers(
+            selections=[ScraperMap.SANA, ScraperMap.DEZ24],
+            stop_timestamp=0,
+            collection_id=self.collection_id,
+        )
+        elapsed = time.time() - start
+
+        """Should take about as long as the slowest scraper, not the sum"""
+        self.assertLess(elapsed, 0.9)
+        self.assertEqual(len(dataclasses), 2)
+        self.assertEqual(errors, [])
+
+    @patch("sdb.scrapers.dez24.DEZ24.get_data")
+    def test_run_selected_scrapers_streaming(self, mock_dez24):
+        """Are batches saved even if the scraper crashes later in the job?"""
+
+        def crashing_scrape(stop_timestamp, sink=None, **kwargs):
+            sink(
+                [
+                    {"title": f"Streamed Entry {i}", "publication": "Deir Ezzor 24"}
+                    for i in range(3)
+                ]
+            )
+            raise Exception("Connection reset")
+
+        mock_dez24.side_effect = crashing_scrape
+
+        [dataclasses, errors] = run_selected_scrapers(
+            selections=[ScraperMap.DEZ24],
+            stop_timestamp=0,
+            collection_id=self.collection_id,
+        )
+
+        """Should report the crash"""
+        self.assertEqual(errors, ["Deir Ezzor 24: Connection reset"])
+
+        """Should keep the batch handed over before the crash"""
+        self.assertEqual(
+            Entry.query.filter(Entry.title.like("Streamed Entry%")).count(), 3
+        )
+
+    @patch("sdb.scrapers.sana.SANA.get_data")
+    @patch("sdb.scrapers.dez24.DEZ24.get_data")
+    def test_run_selected_scrapers_exception(self, mock_dez24, mock_sana):
+        """Does one scraper raising an exception leave the others unaffected?"""
+
+        mock_sana.side_effect = Exception("Connection reset")
+        mock_dez24.return_value = ScrapeResult(
+            article_list=[{"title": "Scraped Entry", "publication": "Deir Ezzor 24"}],
+            success=True,
+        )
+
+        [dataclasses, errors] = run_selected_scrapers(
+            selections=[ScraperMap.SANA, ScraperMap.DEZ24],
+            stop_timestamp=0,
+            collection_id=self.collection_id,
+        )
+
+        """Should record the failure against its publication"""
+        self.assertFalse(dataclasses[0].success)
+        self.assertEqual(
+            errors, ["SANA (Syrian Arab News Agency): Connection reset"]
+        )
+
+        """Should still add entries from the successful scraper"""
+        self.assertTrue(dataclasses[1].success)
+        self.assertEqual(Entry.query.filter_by(title="Scraped Entry").count(), 1)
+
+    def test_update_high_water_marks(self):
+        """Does update_high_water_marks keep the newest article per publication?"""
+
+        result = ScrapeResult(
+            article_list=[
+                {"date_posted": 300, "link": "newest"},
+                {"date_posted": 200, "link": "older"},
+            ],
+            publication="Deir Ezzor 24",
+        )
+        failed = ScrapeResult(
+            article_list=[{"date_posted": 300, "link": "failed"}],
+            success=False,
+            publication="Enab Baladi",
+        )
+
+        update_high_water_marks([result, failed], self.collection_id)
+
+        """Should store the newest article of successful results only"""
+        self.assertEqual(
+            get_high_water_marks(self.collection_id),
+            {"Deir Ezzor 24": HighWaterMark(date_posted=300, link="newest")},
+        )
+
+        """Should never move a mark backwards"""
+        result.article_list = [{"date_posted": 100, "link": "backfill"}]
+        update_high_water_marks([result], self.collection_id)
+        self.assertEqual(
+            get_high_water_marks(self.collection_id)["Deir Ezzor 24"].link, "newest"
+        )
+
+        """Should keep marks apart for another collection"""
+        other = Collection(name="Other Collection")
+        db.session.add(other)
+        db.session.commit()
+
+        self.assertEqual(get_high_water_marks(other.id), {})
+
+        update_high_water_marks([result], other.id)
+        self.assertEqual(
+            get_high_water_marks(other.id)["Deir Ezzor 24"].link, "backfill"
+        )
+        self.assertEqual(
+            get_high_water_marks(self.collection_id)["Deir Ezzor 24"].link, "newest"
+        )
+
+    @patch("sdb.scrapers.dez24.DEZ24.get_data")
+    def test_run_selected_scrapers_incremental(self, mock_dez24):
+        """Does an incremental run pass each scraper its high-water mark?"""
+
+        db.session.add(
+            CrawlMark(
+                publication="Deir Ezzor 24",
+                collection_id=self.collection_id,
+                date_posted=300,
+                link="newest",
+            )
+        )
+        db.session.commit()
+
+        mock_dez24.return_value = ScrapeResult(
+            article_list=[{"title": "New", "date_posted": 400, "link": "new"}],
+            publication="Deir Ezzor 24",
+        )
+
+        run_selected_scrapers(
+            selections=[ScraperMap.DEZ24],
+            stop_timestamp=0,
+            collection_id=self.collection_id,
+            incremental=True,
+        )
+
+        """Should pass the stored mark to the scraper"""
+        mock_dez24.assert_called_once_with(
+            stop_timestamp=0,
+            high_water_mark=HighWaterMark(date_posted=300, link="newest"),
+            known_links={},
+            sink=mock_dez24.call_args.kwargs["sink"],
+            batch_size=50,
+            stop_event=STOP_EVENT,
+            checkpoint=None,
+            on_checkpoint=None,
+        )
+
+        """Should move the mark up to the newest scraped article"""
+        self.assertEqual(
+            get_high_water_marks(self.collection_id)["Deir Ezzor 24"].link, "new"
+        )
+
+    @patch("sdb.scrapers.dez24.DEZ24.get_soup")
+    @patch("sdb.scrapers.dez24.DEZ24.get_full_text_and_date_posted")
+    def test_run_selected_scrapers_incremental_failed_article(
+        self, mock_article, mock_soup
+    ):
+        """Does the next incremental run retry an article that failed?"""
+
+        dates = {
+            "a": "2023-07-23T13:00:00+00:00",
+            "b": "2023-07-23T12:00:00+00:00",
+            "c": "2023-07-23T11:00:00+00:00",
+            "d": "2023-07-23T10:00:00+00:00",
+        }
+        fetched = []
+
+        def get_article(link):
+            fetched.append(link)
+
+            # The 3rd article only fails the first time
+            if fetched.count(link) == 1 and link == "c":
+                raise ValueError("layout changed")
+
+            return [dates[link], f"Text {link}"]
+
+        mock_article.side_effect = get_article
+        mock_soup.return_value = make_soup(
+            '<div class="vce-loop-wrap">'
+            + "".join(
+                f'<article><h2 class="entry-title"><a href="{link}">{link}</a>'
+                "</h2></article>"
+                for link in dates
+            )
+            + "</div>"
+        )
+
+        for _ in range(2):
+            run_selected_scrapers(
+                selections=[ScraperMap.DEZ24],
+                stop_timestamp=0,
+                collection_id=self.collection_id,
+                incremental=True,
+            )
+
+        """Should not move the mark past the failed article"""
+        self.assertEqual(fetched.count("c"), 2)
+
+        """Should store the failed article on the next run"""
+        self.assertEqual(Entry.query.filter_by(link="c").count(), 1)
+        self.assertEqual(
+            Entry.query.filter_by(collection_id=self.collection_id)
+            .filter(Entry.link.in_(list(dates)))
+            .count(),
+            4,
+        )
+
+    @patch("sdb.scrapers.dez24.DEZ24.get_data")
+    def test_run_selected_scrapers_stop_event(self, mock_dez24):
+        """Does a job's own stop event reach its scrapers and cancel only it?"""
+
+        db.session.add(
+            CrawlMark(
+                publication="Deir Ezzor 24",
+                collection_id=self.collection_id,
+                date_posted=300,
+                link="newest",
+            )
+        )
+        db.session.commit()
+
+        mock_dez24.return_value = ScrapeResult(
+            article_list=[{"title": "New", "date_posted": 400, "link": "new"}],
+            publication="Deir Ezzor 24",
+        )
+
+        stop_event = Event()
+        stop_event.set()
+
+        run_selected_scrapers(
+            selections=[ScraperMap.DEZ24],
+            stop_timestamp=0,
+            collection_id=self.collection_id,
+            incremental=True,
+            stop_event=stop_event,
+        )
+
+        """Should pass the job's stop event to the scraper"""
+        self.assertIs(mock_dez24.call_args.kwargs["stop_event"], stop_event)
+
+        """Should not move marks for a cancelled job"""
+        self.assertEqual(
+            get_high_water_marks(self.collection_id)["Deir Ezzor 24"].link, "newest"
+        )
+
+        """Should leave the default stop event alone"""
+        self.assertFalse(STOP_EVENT.is_set())
+
+    @patch("sdb.scrapers.dez24.DEZ24.get_data")
+    def test_run_selected_scrapers_resume(self, mock_dez24):
+        """Does a resumed job continue from the checkpoints of the old one?"""
+
+        [old_job, new_job] = [
+            Job(kind="scrape", status=status, created_at=time.time())
+            for status in ("cancelled", "running")
+        ]
+        db.session.add_all([old_job, new_job])
+        db.session.commit()
+
+        old_checkpoint = Checkpoint(
+            publication="Deir Ezzor 24",
+            page_num=4,
+            last_timestamp=300,
+            links={"page-4-link": 300},
+        )
+        save_checkpoint(old_job.id, old_checkpoint)
+
+        def scrape_page_5(**kwargs):
+            kwargs["sink"]([{"title": "Old", "date_posted": 200, "link": "old"}])
+            kwargs["on_checkpoint"](
+                Checkpoint("Deir Ezzor 24", 5, 200, {"old": 200})
+            )
+            return ScrapeResult(publication="Deir Ezzor 24")
+
+        mock_dez24.side_effect = scrape_page_5
+
+        run_selected_scrapers(
+            selections=[ScraperMap.DEZ24],
+            stop_timestamp=0,
+            collection_id=self.collection_id,
+            job_id=new_job.id,
+            resume_from=old_job.id,
+        )
+
+        """Should hand the scraper its checkpoint and the links on that page"""
+        kwargs = mock_dez24.call_args.kwargs
+        self.assertEqual(kwargs["checkpoint"], old_checkpoint)
+        self.assertEqual(kwargs["known_links"]["page-4-link"], 300)
+
+        """Should save the new job's checkpoint after its articles"""
+        self.assertEqual(get_checkpoints(new_job.id)["Deir Ezzor 24"].page_num, 5)
+        self.assertEqual(Entry.query.filter_by(link="old").count(), 1)
+
+        """Should keep the old job's checkpoint"""
+        self.assertEqual(get_checkpoints(old_job.id)["Deir Ezzor 24"], old_checkpoint)
+
+        """Should report the new job's progress as its pages are saved"""
+        db.session.expire_all()
+        self.assertGreater(Job.query.get(new_job.id).progress, 0)
+
+    def test_get_scrape_progress(self):
+        """Does get_scrape_progress estimate how much of a job is done?"""
+
+        checkpoints = {
+            "SANA": Checkpoint("SANA", 3, 700, {}),
+            "Enab Baladi": Checkpoint("Enab Baladi", 1, 900, {}),
+        }
+        publications = ["SANA", "Enab Baladi", "Deir Ezzor 24"]
+
+        """Should average the share of each publication's date range covered"""
+        self.assertAlmostEqual(
+            get_scrape_progress(checkpoints, publications, 1000, 0), 0.4 / 3
+        )
+
+        """Should stop each publication's range at its high-water mark"""
+        marks = {"SANA": HighWaterMark(date_posted=500, link="a")}
+        self.assertAlmostEqual(
+            get_scrape_progress(
+                checkpoints, publications, 1000, 0, high_water_marks=marks
+            ),
+            0.7 / 3,
+        )
+
+    def test_get_known_links(self):
+        """Does get_known_links return stored links for the right scope?"""
+
+        other = Collection(name="Other Collection")
+        db.session.add(other)
+        db.session.commit()
+
+        db.session.add_all(
+            [
+                Entry(
+                    title="In collection",
+                    publication="Test Publication",
+                    collection_id=self.collection_id,
+                    link="https://example.com/1",
+                    date_posted="100.0",
+                ),
+                Entry(
+                    title="Elsewhere",
+                    publication="Test Publication",
+                    collection_id=other.id,
+                    link="https://example.com/2",
+                    date_posted="200",
+                ),
+            ]
+        )
+        db.session.commit()
+
+        """Should only return links from the given collection"""
+        self.assertEqual(
+            get_known_links(collection_id=self.collection_id),
+            {"https://example.com/1": 100.0},
+        )
+
+        """Should return links from every collection without a collection_id"""
+        self.assertEqual(
+            get_known_links(),
+            {"https://example.com/1": 100.0, "https://example.com/2": 200.0},
+        )
+
+    @patch("sdb.scrapers.dez24.DEZ24.get_data")
+    def test_run_selected_scrapers_skip_known(self, mock_dez24):
+        """Does run_selected_scrapers pass stored links for the chosen scope?"""
+
+        db.session.add(
+            Entry(
+                title="Stored",
+                publication="Test Publication",
+                collection_id=self.collection_id,
+                link="https://example.com/stored",
+                date_posted="100",
+            )
+        )
+        db.session.commit()
+
+        mock_dez24.return_value = ScrapeResult(article_list=[], success=True)
+
+        run_selected_scrapers(
+            selections=[ScraperMap.DEZ24],
+            stop_timestamp=0,
+            collection_id=self.collection_id,
+        )
+
+        """Should skip links in the target collection by default"""
+        self.assertEqual(
+            mock_dez24.call_args.kwargs["known_links"],
+            {"https://example.com/stored": 100.0},
+        )
+
+        run_selected_scrapers(
+            selections=[ScraperMap.DEZ24],
+            stop_timestamp=0,
+            collection_id=self.collection_id,
+            skip_known=None,
+        )
+
+        """Should skip nothing when disabled"""
+        self.assertEqual(mock_dez24.call_args.kwargs["known_links"], {})
+
     def test_get_available_scrapers(self):
         """Does get_available_scrapers return correct scrapers?"""
 
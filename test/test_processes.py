@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from unittest import TestCase
+
+from sdb.models import db
+
+os.environ["DATABASE_URL"] = "postgresql:///sdb_test"
+
+from sdb.app import app
+from sdb.processes import CONTEXT, ProcessManager
+
+db.drop_all()
+db.create_all()
+
+
+def report_stop_event(results, stop_event=None):
+    """Child process target that reports whether it got a stop event."""
+
+    results.put(stop_event is not None and not stop_event.is_set())
+
+
+def wait_for_stop(stop_event=None):
+    """Child process target that runs until its job is stopped."""
+
+    stop_event.wait(10)
+
+
+def fail(stop_event=None):
+    """Child process target that fails."""
+
+    raise ValueError("Listing layout changed")
+
+
+def summarize(count, stop_event=None):
+    """Child process target that returns a result larger than a pipe's buffer."""
+
+    return {"errors": [f"Article {i} failed" for i in range(count)]}
+
+
+def wait_for_status(manager, job_id, status):
+    """Waits until a job reaches a status."""
+
+    for _ in range(100):
+        if any(
+            s["job_id"] == job_id and s["status"] == status
+            for s in manager.get_status()
+        ):
+            return True
+        time.sleep(0.05)
+
+    return False
+
+
+class ProcessManagerTestCase(TestCase):
+    """Tests for ProcessManager"""
+
+    def test_run(self):
+        """Does run() give the child process its own stop event?"""
+
+        manager = ProcessManager(max_processes=2)
+        results = CONTEXT.Queue()
+
+        managed = manager.run(1, report_stop_event, results)
+
+        """Should pass an unset stop event to the target"""
+        self.assertTrue(results.get(timeout=10))
+
+        """Should finish cleanly and forget the job"""
+        self.assertEqual(managed.status, "finished")
+        self.assertEqual(managed.process.exitcode, 0)
+        self.assertEqual(manager.get_status(), [])
+
+    def test_run_result(self):
+        """Does run() hand the child's return value back to its parent?"""
+
+        manager = ProcessManager(max_processes=1)
+
+        managed = manager.run(1, summarize, 10_000)
+
+        """Should keep the whole result, however large"""
+        self.assertEqual(managed.process.exitcode, 0)
+        self.assertEqual(len(managed.result["errors"]), 10_000)
+        self.assertIsNone(managed.error)
+
+    def test_run_error(self):
+        """Does run() report the exception a child process failed with?"""
+
+        manager = ProcessManager(max_processes=1)
+
+        managed = manager.run(1, fail)
+
+        """Should keep the child's traceback"""
+        self.assertNotEqual(managed.process.exitcode, 0)
+        self.assertIn("ValueError: Listing layout changed", managed.error)
+        self.assertIn("Traceback", managed.error)
+
+    def test_concurrency_limit_and_stop(self):
+        """Do jobs beyond max_processes wait, and can each be stopped alone?"""
+
+        manager = ProcessManager(max_processes=1)
+        finished = {}
+
+        def run(job_id):
+            finished[job_id] = manager.run(job_id, wait_for_stop)
+
+        manager.add(1, key="collection 1")
+        manager.add(2, key="collection 2")
+
+        first = threading.Thread(target=run, args=(1,))
+        first.start()
+        self.assertTrue(wait_for_status(manager, 1, "running"))
+
+        second = threading.Thread(target=run, args=(2,))
+        second.start()
+
+        """Should hold the second job until a slot is free"""
+        time.sleep(0.2)
+        self.assertTrue(wait_for_status(manager, 2, "waiting"))
+        self.assertEqual(manager.find("collection 2"), [2])
+
+        """Should stop a waiting job without starting its process"""
+        self.assertTrue(manager.stop(2))
+        second.join(timeout=10)
+        self.assertEqual(finished[2].status, "stopped")
+        self.assertIsNone(finished[2].process)
+
+        """Should leave the other job running"""
+        self.assertTrue(wait_for_status(manager, 1, "running"))
+
+        self.assertTrue(manager.stop(1))
+        first.join(timeout=10)
+        self.assertEqual(finished[1].status, "stopped")
+        self.assertEqual(finished[1].process.exitcode, 0)
+
+        """Should report unknown jobs as not running"""
+        self.assertFalse(manager.stop(1))
@@ -1,8 +1,15 @@
+import multiprocessing
 import os
+import socket
+import threading
+import time
 from unittest import TestCase, mock
-from unittest.mock import patch, Mock
+from unittest.mock import patch
 from sdb.controller import ScraperMap
-from sdb.models import db, Collection, Entry
+from sdb.jobs import JOBS, JobRunner, fail_interrupted_jobs
+from sdb.models import db, Collection, Entry, Job
+from sdb.processes import ManagedProcess
+from sdb.scrapers.scrape_result import ScrapeResult
 
 os.environ["DATABASE_URL"] = "postgresql:///sdb_test"
 
@@ -12,6 +19,28 @@ db.drop_all()
 db.create_all()
 
 
+class ThreadProcess(threading.Thread):
+    """Stands in for a scraper process. Runs its target in a thread of this
+    process, so the tests' mocks apply to it.
+    """
+
+    pid = None
+    exitcode = 0
+
+
+def get_job_result(client, response):
+    """Waits for the job started by a request and returns the response of
+    GET /api/jobs/<id>/result."""
+
+    job_id = response.json["job"]["id"]
+    JOBS.wait(job_id, timeout=30)
+
+    # The job updated the db from its own session
+    db.session.expire_all()
+
+    return client.get(f"/api/jobs/{job_id}/result")
+
+
 class APICollectionsRoutesTestCase(TestCase):
     """Tests for /api/collections routes"""
 
@@ -347,21 +376,26 @@ class APITranslateTestCase(TestCase):
         """Does POST /api/translate translate multiple entries?"""
 
         with mock.patch(
-            "sdb.translation.get_translated_entry_title_and_text",
-            mock.Mock(return_value=["English Title", "English Text"]),
-        ), mock.patch(
-            "sdb.translation.initialize_argostranslate", mock.Mock(return_value=None)
+            "sdb.translation.translate_entries_batch",
+            mock.Mock(
+                side_effect=lambda entries: [["English Title", "English Text"]]
+                * len(entries)
+            ),
         ):
             response = self.client.post(
                 "/api/translate",
                 json={"entry_ids": [self.entry1_id, self.entry2_id]},
             )
+
+            """Should return 202 status code and a job handle"""
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.json["job"]["kind"], "translate")
+
+            response = get_job_result(self.client, response)
             data = response.json
 
-            """Should return 200 status code"""
+            """Should return JSON of translated entries as the job's result"""
             self.assertEqual(response.status_code, 200)
-
-            """Should return JSON of translated entries"""
             self.assertEqual(len(data["Translated"]), 2)
             self.assertEqual(data["Translated"][0]["title_translated"], "English Title")
             self.assertEqual(
@@ -379,14 +413,57 @@ class APITranslateTestCase(TestCase):
                 Entry.query.get(self.entry2_id).full_text_translated, "English Text"
             )
 
+    def test_get_translation_status(self):
+        """Does GET /api/translate/status return the engine's status?"""
+
+        with mock.patch(
+            "sdb.translation.ENGINE.get_status",
+            mock.Mock(return_value={"status": "ready"}),
+        ):
+            response = self.client.get("/api/translate/status")
+
+            """Should return the status as JSON"""
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json["status"], "ready")
+
+            """Should include translation memory metrics"""
+            self.assertIn("hit_rate", response.json["translation_memory"])
+
+    def test_translate_entries_failed(self):
+        """Does a failed translation job report its error?"""
+
+        with mock.patch(
+            "sdb.translation.translate_entries_batch",
+            mock.Mock(side_effect=Exception("Model not installed")),
+        ):
+            response = self.client.post(
+                "/api/translate",
+                json={"entry_ids": [self.entry1_id, self.entry2_id]},
+            )
+            job_id = response.json["job"]["id"]
+
+            response = get_job_result(self.client, response)
+
+            """Should return the job's error"""
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json["error"], "Model not installed")
+
+            """Should mark the job as failed"""
+            data = self.client.get(f"/api/jobs/{job_id}").json
+            self.assertEqual(data["status"], "failed")
+
+            """Should not update the database"""
+            self.assertFalse(Entry.query.get(self.entry1_id).title_translated)
+
     def test_translate_entries_not_found(self):
         """Does POST /api/translate w/ invalid data (nonexistant entry) return error message?"""
 
         with mock.patch(
-            "sdb.translation.get_translated_entry_title_and_text",
-            mock.Mock(return_value=["English Title", "English Text"]),
-        ), mock.patch(
-            "sdb.translation.initialize_argostranslate", mock.Mock(return_value=None)
+            "sdb.translation.translate_entries_batch",
+            mock.Mock(
+                side_effect=lambda entries: [["English Title", "English Text"]]
+                * len(entries)
+            ),
         ):
             response = self.client.post("/api/translate", json={"entry_ids": [1000]})
             data = response.json
@@ -401,10 +478,11 @@ class APITranslateTestCase(TestCase):
         """Does POST /api/translate w/ invalid JSON data return ValidationError?"""
 
         with mock.patch(
-            "sdb.translation.get_translated_entry_title_and_text",
-            mock.Mock(return_value=["English Title", "English Text"]),
-        ), mock.patch(
-            "sdb.translation.initialize_argostranslate", mock.Mock(return_value=None)
+            "sdb.translation.translate_entries_batch",
+            mock.Mock(
+                side_effect=lambda entries: [["English Title", "English Text"]]
+                * len(entries)
+            ),
         ):
             response = self.client.post(
                 "/api/translate",
@@ -481,12 +559,15 @@ class APISummarizeTestCase(TestCase):
                 json={"entry_ids": [self.entry1_id, self.entry2_id]},
             )
 
+            """Should return 202 status code and a job handle"""
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.json["job"]["kind"], "summarize")
+
+            response = get_job_result(self.client, response)
             data = response.json
 
-            """Should return 200 status code"""
+            """Should return JSON of summarized entries as the job's result"""
             self.assertEqual(response.status_code, 200)
-
-            """Should return JSON of summarized entries"""
             self.assertEqual(len(data["Summarized"]), 2)
             self.assertEqual(data["Summarized"][0]["ai_summary"], "Summarized Text")
             self.assertEqual(data["Summarized"][1]["ai_summary"], "Summarized Text")
@@ -771,13 +852,16 @@ class APIPrintTestCase(TestCase):
             },
         )
 
-        data = response.json
+        """Should return 202 status code and a job handle"""
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json["job"]["kind"], "print")
 
-        """Should return 200 status code"""
-        self.assertEqual(response.status_code, 200)
+        response = get_job_result(self.client, response)
+        data = response.json
 
-        """Should return success message"""
+        """Should return success message as the job's result"""
         self.assertEqual(data["message"], "Excel generated")
+        self.assertEqual(data["path"], "test")
 
     def test_print_invalid_collection(self):
         """Does POST /api/print return error if collection does not exist?"""
@@ -812,6 +896,161 @@ class APIPrintTestCase(TestCase):
         self.assertEqual(data["errors"]["invalid"][0], "Unknown field.")
 
 
+class APIJobsTestCase(TestCase):
+    """Tests for /api/jobs"""
+
+    def setUp(self):
+        """Create test client, add sample jobs."""
+
+        Job.query.delete()
+
+        self.client = app.test_client()
+
+        self.running_job = Job(
+            kind="scrape", status="running", progress=0.5, created_at=1.0
+        )
+        self.finished_job = Job(
+            kind="translate",
+            status="succeeded",
+            progress=1.0,
+            result={"Translated": []},
+            created_at=2.0,
+        )
+
+        db.session.add_all([self.running_job, self.finished_job])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def test_list_jobs(self):
+        """Does GET /api/jobs list recent jobs?"""
+
+        response = self.client.get("/api/jobs")
+        data = response.json
+
+        """Should return jobs newest first"""
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([j["id"] for j in data], [self.finished_job.id, self.running_job.id])
+
+        """Should filter by kind"""
+        data = self.client.get("/api/jobs?kind=scrape").json
+        self.assertEqual([j["id"] for j in data], [self.running_job.id])
+
+    def test_get_job(self):
+        """Does GET /api/jobs/<id> return a job's status and progress?"""
+
+        response = self.client.get(f"/api/jobs/{self.running_job.id}")
+        data = response.json
+
+        """Should return status and progress"""
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["status"], "running")
+        self.assertEqual(data["progress"], 0.5)
+
+        """Should return 404 for unknown jobs"""
+        response = self.client.get("/api/jobs/100000")
+        self.assertEqual(response.status_code, 404)
+
+    def test_get_job_result(self):
+        """Does GET /api/jobs/<id>/result return the result of finished jobs only?"""
+
+        response = self.client.get(f"/api/jobs/{self.finished_job.id}/result")
+
+        """Should return the result"""
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, {"Translated": []})
+
+        response = self.client.get(f"/api/jobs/{self.running_job.id}/result")
+
+        """Should return an error while the job is running"""
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json["status"], "running")
+
+
+    def test_fail_interrupted_jobs(self):
+        """Are jobs left active by exited app processes marked failed?"""
+
+        host = socket.gethostname()
+
+        # A child that has exited (and been reaped) leaves a pid nothing uses
+        child = multiprocessing.get_context("spawn").Process(
+            target=time.sleep, args=(0,)
+        )
+        child.start()
+        child.join()
+
+        orphaned_job = Job(
+            kind="print",
+            status="queued",
+            created_at=3.0,
+            owner_host=host,
+            owner_pid=child.pid,
+        )
+        live_job = Job(
+            kind="print",
+            status="running",
+            created_at=4.0,
+            owner_host=host,
+            owner_pid=os.getpid(),
+        )
+        remote_job = Job(
+            kind="print",
+            status="running",
+            created_at=5.0,
+            owner_host=f"not-{host}",
+            owner_pid=child.pid,
+        )
+        db.session.add_all([orphaned_job, live_job, remote_job])
+        db.session.commit()
+
+        """Should mark active jobs of exited processes as failed"""
+        self.assertEqual(fail_interrupted_jobs(), 1)
+
+        db.session.expire_all()
+        self.assertEqual(Job.query.get(orphaned_job.id).status, "failed")
+
+        """Should leave jobs of live processes and other hosts alone"""
+        self.assertEqual(Job.query.get(live_job.id).status, "running")
+        self.assertEqual(Job.query.get(remote_job.id).status, "running")
+
+        """Should leave finished jobs alone"""
+        self.assertEqual(Job.query.get(self.finished_job.id).status, "succeeded")
+
+    def test_submit_records_owner(self):
+        """Does JobRunner record which process runs a job?"""
+
+        runner = JobRunner(max_workers=1)
+        job = runner.submit("print", lambda job_id: None)
+        runner.wait(job.id, timeout=10)
+
+        self.assertEqual(job.owner_host, socket.gethostname())
+        self.assertEqual(job.owner_pid, os.getpid())
+
+    def test_dedicated_workers(self):
+        """Do kinds with dedicated workers leave the shared workers free?"""
+
+        runner = JobRunner(max_workers=1, dedicated_workers={"scrape": 1})
+        release = threading.Event()
+
+        scrapes = [
+            runner.submit("scrape", lambda job_id: release.wait(10))
+            for _ in range(2)
+        ]
+        export = runner.submit("print", lambda job_id: "done")
+
+        """Should run other jobs while every scrape worker is busy"""
+        runner.wait(export.id, timeout=10)
+        self.assertEqual(runner.get_active(), [scrape.id for scrape in scrapes])
+
+        release.set()
+        for scrape in scrapes:
+            runner.wait(scrape.id, timeout=10)
+
+        """Should still run every queued scrape job"""
+        self.assertEqual(runner.get_active(), [])
+
+
 class APIScrapeTestCase(TestCase):
     """Tests for GET & POST /api/scrape"""
 
@@ -834,7 +1073,7 @@ class APIScrapeTestCase(TestCase):
         db.session.rollback()
 
     @patch(
-        "sdb.app.get_available_scrapers",
+        "sdb.blueprints.scrape.routes.get_available_scrapers",
         return_value=[{"value": "ENUMNAME", "label": "publication_name"}],
     )
     def test_get_scrape_data(self, mock_get_available_scrapers):
@@ -851,8 +1090,21 @@ class APIScrapeTestCase(TestCase):
         self.assertEqual(data[0]["value"], "ENUMNAME")
         self.assertEqual(data[0]["label"], "publication_name")
 
-    @patch("sdb.app.run_selected_scrapers", return_value=None)
-    @patch.dict("sdb.processes.ACTIVE_PROCESSES", {})
+    @patch("sdb.processes.CONTEXT.Process", ThreadProcess)
+    @patch(
+        "sdb.blueprints.scrape.routes.run_selected_scrapers",
+        return_value=(
+            [
+                ScrapeResult(
+                    publication="SANA",
+                    failed_articles=[
+                        {"link": "sana.sy/1", "error": "Gone", "status_code": 404}
+                    ],
+                )
+            ],
+            ["SANA: sana.sy/1: Gone"],
+        ),
+    )
     def test_scrape_data(self, mock_run_selected_scrapers):
         """Does POST /api/scrape scrape entries from publications?"""
 
@@ -867,8 +1119,8 @@ class APIScrapeTestCase(TestCase):
 
         data = response.json
 
-        """Should return 200 status code"""
-        self.assertEqual(response.status_code, 200)
+        """Should return 202 status code"""
+        self.assertEqual(response.status_code, 202)
 
         """Should return success message"""
         self.assertEqual(
@@ -876,20 +1128,66 @@ class APIScrapeTestCase(TestCase):
             "Scraping initiated.",
         )
 
-    @patch("sdb.app.run_selected_scrapers", return_value=None)
-    @patch.dict("sdb.processes.ACTIVE_PROCESSES", {"scraper": "test"})
-    def test_scrape_data_already_in_progress(self, mock_run_selected_scrapers):
-        """Does POST /api/scrape return error if scraping is already in progress?"""
+        """Should run the scrapers in a background job"""
+        result = get_job_result(self.client, response).json
+        self.assertEqual(result["collection_id"], self.collection.id)
+        self.assertEqual(Job.query.get(data["job"]["id"]).status, "succeeded")
+
+        """Should report the scrapers' errors and skipped articles"""
+        self.assertEqual(result["errors"], ["SANA: sana.sy/1: Gone"])
+        self.assertEqual(
+            result["failed_articles"],
+            [
+                {
+                    "publication": "SANA",
+                    "link": "sana.sy/1",
+                    "error": "Gone",
+                    "status_code": 404,
+                }
+            ],
+        )
+
+    @patch("sdb.processes.CONTEXT.Process", ThreadProcess)
+    @patch(
+        "sdb.blueprints.scrape.routes.run_selected_scrapers",
+        side_effect=ValueError("Listing layout changed"),
+    )
+    def test_scrape_data_error(self, mock_run_selected_scrapers):
+        """Does a failed scraper process fail its job with the real error?"""
 
         response = self.client.post(
             "/api/scrape",
             json={
                 "collection_id": self.collection.id,
-                "selected_scrapers": ["SANA", "ENABBALADI"],
+                "selected_scrapers": ["SANA"],
                 "stop_timestamp": 1234567890,
             },
         )
 
+        get_job_result(self.client, response)
+        job = Job.query.get(response.json["job"]["id"])
+
+        """Should record the child's exception and traceback"""
+        self.assertEqual(job.status, "failed")
+        self.assertIn("ValueError: Listing layout changed", job.error)
+        self.assertIn("Traceback", job.error)
+
+    @patch("sdb.blueprints.scrape.routes.run_selected_scrapers", return_value=None)
+    def test_scrape_data_already_in_progress(self, mock_run_selected_scrapers):
+        """Does POST /api/scrape return error if the collection is already being scraped?"""
+
+        running = {-1: ManagedProcess(job_id=-1, key=self.collection.id)}
+
+        with patch.dict("sdb.processes.PROCESSES.processes", running):
+            response = self.client.post(
+                "/api/scrape",
+                json={
+                    "collection_id": self.collection.id,
+                    "selected_scrapers": ["SANA", "ENABBALADI"],
+                    "stop_timestamp": 1234567890,
+                },
+            )
+
         data = response.json
 
         """Should return 400 status code"""
@@ -904,7 +1202,7 @@ class APIScrapeTestCase(TestCase):
         """Should not call run_selected_scrapers"""
         mock_run_selected_scrapers.assert_not_called()
 
-    @patch("sdb.app.run_selected_scrapers", return_value=None)
+    @patch("sdb.blueprints.scrape.routes.run_selected_scrapers", return_value=None)
     def test_scrape_data_invalid_selections(self, mock_run_selected_scrapers):
         """Does POST /api/scrape return error if selections are invalid?"""
 
@@ -928,7 +1226,7 @@ class APIScrapeTestCase(TestCase):
         """Should not call run_selected_scrapers"""
         mock_run_selected_scrapers.assert_not_called()
 
-    @patch("sdb.app.run_selected_scrapers", return_value=None)
+    @patch("sdb.blueprints.scrape.routes.run_selected_scrapers", return_value=None)
     def test_scrape_data_invalid_JSON(self, mock_run_selected_scrapers):
         """Does POST /api/scrape return error if JSON is invalid?"""
 
@@ -954,7 +1252,7 @@ class APIScrapeTestCase(TestCase):
         """Should not call run_selected_scrapers"""
         mock_run_selected_scrapers.assert_not_called()
 
-    @patch.dict("sdb.processes.ACTIVE_PROCESSES", {})
+    @patch.dict("sdb.processes.PROCESSES.processes", {}, clear=True)
     def test_stop_scrape_invalid(self):
         """Does DELETE /api/scrape return error if no scraping in progress?"""
 
@@ -968,11 +1266,21 @@ class APIScrapeTestCase(TestCase):
         """Should return error message"""
         self.assertEqual(data["error"], "Scraping is not currently in progress.")
 
-    @patch.dict("sdb.processes.ACTIVE_PROCESSES", {"scraper": Mock()})
+        response = self.client.delete("/api/scrape/1")
+
+        """Should return 400 status code for a single job too"""
+        self.assertEqual(response.status_code, 400)
+
     def test_stop_scrape(self):
-        """Does DELETE /api/scrape stop a scraping process?"""
+        """Does DELETE /api/scrape stop every scraping job?"""
 
-        response = self.client.delete("/api/scrape")
+        running = {
+            1: ManagedProcess(job_id=1, key=1, status="running"),
+            2: ManagedProcess(job_id=2, key=2, status="running"),
+        }
+
+        with patch.dict("sdb.processes.PROCESSES.processes", running, clear=True):
+            response = self.client.delete("/api/scrape")
 
         data = response.json
 
@@ -981,3 +1289,104 @@ class APIScrapeTestCase(TestCase):
 
         """Should return success message"""
         self.assertEqual(data["message"], "Scraping terminated.")
+        self.assertEqual(data["job_ids"], [1, 2])
+
+        """Should set every job's stop event"""
+        self.assertTrue(running[1].stop_event.is_set())
+        self.assertTrue(running[2].stop_event.is_set())
+
+    def test_stop_scrape_job(self):
+        """Does DELETE /api/scrape/<job_id> stop only that job?"""
+
+        running = {
+            1: ManagedProcess(job_id=1, key=1, status="running"),
+            2: ManagedProcess(job_id=2, key=2, status="running"),
+        }
+
+        with patch.dict("sdb.processes.PROCESSES.processes", running, clear=True):
+            response = self.client.delete("/api/scrape/2")
+
+            """Should report the job as stopping"""
+            statuses = self.client.get("/api/scrape/active").json
+            self.assertEqual(
+                [s["status"] for s in statuses], ["running", "stopping"]
+            )
+
+        """Should return 200 status code"""
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["job_ids"], [2])
+
+        """Should only set that job's stop event"""
+        self.assertFalse(running[1].stop_event.is_set())
+        self.assertTrue(running[2].stop_event.is_set())
+
+    @patch("sdb.processes.CONTEXT.Process", ThreadProcess)
+    @patch("sdb.blueprints.scrape.routes.run_selected_scrapers", return_value=([], []))
+    def test_resume_scrape(self, mock_run_selected_scrapers):
+        """Does POST /api/scrape/<job_id>/resume restart a cancelled job?"""
+
+        params = {
+            "collection_id": self.collection.id,
+            "selected_scrapers": ["SANA"],
+            "stop_timestamp": 1234567890,
+            "incremental": False,
+            "skip_known": "collection",
+        }
+        old_job = Job(
+            kind="scrape", status="cancelled", params=params, created_at=time.time()
+        )
+        db.session.add(old_job)
+        db.session.commit()
+
+        response = self.client.post(f"/api/scrape/{old_job.id}/resume")
+        data = response.json
+
+        """Should start a new job with the old job's parameters"""
+        self.assertEqual(response.status_code, 202)
+        self.assertNotEqual(data["job"]["id"], old_job.id)
+
+        result = get_job_result(self.client, response).json
+        self.assertEqual(result["collection_id"], self.collection.id)
+
+        """Should record which job it resumes"""
+        new_job = Job.query.get(data["job"]["id"])
+        self.assertEqual(new_job.params, {**params, "resume_from": old_job.id})
+
+    def test_resume_scrape_invalid(self):
+        """Does POST /api/scrape/<job_id>/resume refuse jobs it can't resume?"""
+
+        finished = Job(
+            kind="scrape",
+            status="succeeded",
+            params={"collection_id": self.collection.id},
+            created_at=time.time(),
+        )
+        running = Job(
+            kind="scrape",
+            status="running",
+            params={"collection_id": self.collection.id},
+            created_at=time.time(),
+        )
+        translation = Job(kind="translate", status="failed", created_at=time.time())
+        db.session.add_all([finished, running, translation])
+        db.session.commit()
+
+        response = self.client.post(f"/api/scrape/{finished.id}/resume")
+
+        """Should refuse a job that already finished"""
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json["error"], f"Job {finished.id} is succeeded.")
+
+        response = self.client.post(f"/api/scrape/{running.id}/resume")
+
+        """Should refuse a job that is still running"""
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json["error"], f"Job {running.id} is running.")
+
+        response = self.client.post(f"/api/scrape/{translation.id}/resume")
+
+        """Should refuse other kinds of jobs"""
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json["error"], f"Job {translation.id} is not a scraping job."
+        )
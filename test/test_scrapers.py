@@ -1,11 +1,29 @@
+import tempfile
 from unittest import TestCase, mock
 from bs4 import BeautifulSoup
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
 
 # import every file from scrapers directory
 
 from sdb.scrapers.scraping_error import ScrapingError
-from sdb.scrapers.scrape_result import ScrapeResult
-from sdb.scrapers.base_scraper import ScraperConfig
+from sdb.scrapers.scrape_result import ScrapeResult, Checkpoint
+from sdb.scrapers.base_scraper import ScraperConfig, HighWaterMark
+from sdb.scrapers.declarative import DeclarativeScraper, Extractor, SiteSelectors
+from sdb.scrapers.http_cache import HttpCache, CacheRule, get_listing_pattern
+from sdb.scrapers.http_session import PooledSession
+from sdb.scrapers.parse_pool import ParsePool
+from sdb.scrapers.parsing import make_soup, strain
+from sdb.scrapers.politeness import (
+    AIMDLimiter,
+    HostLimiter,
+    HostLimiterRegistry,
+    MAX_RETRY_AFTER,
+)
+from sdb.scrapers.retry import RetryPolicy
+from sdb.scrapers.async_scraper import crawl
+from sdb.benchmark import StubServer, make_stub_scraper, get_stub_stop_timestamp
 
 from sdb.scrapers import (
     base_scraper,
@@ -90,6 +108,1175 @@ class BaseScraperTestCase(TestCase):
         )
 
 
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """Minimal HTTP/1.1 handler that keeps connections open between requests."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"<html><body><p>test</p></body></html>"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PooledSessionTestCase(TestCase):
+    """Tests for http_session.py"""
+
+    def setUp(self):
+        """Start a local keep-alive server."""
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_reuse(self):
+        """Does PooledSession reuse one connection across sequential requests?"""
+
+        session = PooledSession(pool_size=2)
+
+        for page_num in range(1, 4):
+            response = session.get(f"{self.url}/page/{page_num}/", timeout=10)
+            self.assertEqual(response.status_code, 200)
+
+        """Should open a single connection and reuse it for the other requests"""
+        self.assertEqual(
+            session.get_connection_stats(), {"requests": 3, "opened": 1, "reused": 2}
+        )
+
+        session.close()
+
+    def test_scraper_session(self):
+        """Does a scraper create its pooled session lazily and keep it?"""
+
+        test_scraper = dez24.DEZ24()
+
+        """Should not create a session until one is needed"""
+        self.assertIsNone(test_scraper._session)
+
+        """Should return the same session on every access"""
+        self.assertIsInstance(test_scraper.session, PooledSession)
+        self.assertIs(test_scraper.session, test_scraper.session)
+        self.assertEqual(test_scraper.session.pool_size, test_scraper.config.pool_size)
+
+
+class ThrottlingHandler(KeepAliveHandler):
+    """Handler that throttles every request to /busy with a 429."""
+
+    def do_GET(self):
+        if self.path != "/busy":
+            return super().do_GET()
+
+        self.send_response(429)
+        self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class HostLimiterTestCase(TestCase):
+    """Tests for politeness.py"""
+
+    def test_additive_increase_multiplicative_decrease(self):
+        """Does the concurrency limit grow slowly and shrink fast?"""
+
+        limiter = AIMDLimiter(max_limit=4, initial_limit=2)
+
+        for _ in range(20):
+            limiter.acquire()
+            limiter.release(1.0)
+
+        """Should grow up to max_limit on healthy responses"""
+        self.assertEqual(limiter.limit, 4)
+
+        limiter.acquire()
+        limiter.release(1.0, overloaded=True)
+
+        """Should halve when the host is overloaded"""
+        self.assertEqual(limiter.limit, 2)
+
+        limiter.acquire()
+        limiter.release(1.0, overloaded=True)
+
+        """Should not halve again for responses to requests already in flight"""
+        self.assertEqual(limiter.limit, 2)
+
+    def test_slow_responses_cut_limit(self):
+        """Does a response far slower than usual count as overload?"""
+
+        limiter = AIMDLimiter(max_limit=8, initial_limit=4)
+
+        limiter.acquire()
+        limiter.release(0.01)
+        limit = limiter.limit
+
+        limiter.acquire()
+        limiter.release(1.0)
+
+        """Should halve the limit"""
+        self.assertEqual(limiter.limit, limit / 2)
+
+    def test_concurrency_cap(self):
+        """Does acquire block while the host has the limit in flight?"""
+
+        limiter = AIMDLimiter(max_limit=1, initial_limit=1)
+        limiter.acquire()
+
+        acquired = threading.Event()
+        waiter = threading.Thread(
+            target=lambda: (limiter.acquire(), acquired.set()), daemon=True
+        )
+        waiter.start()
+
+        """Should wait for a request to finish"""
+        self.assertFalse(acquired.wait(0.2))
+
+        limiter.release(0.01)
+        self.assertTrue(acquired.wait(5))
+
+    def test_rate_limit(self):
+        """Does a host get at most requests_per_second requests?"""
+
+        limiter = HostLimiter(requests_per_second=20, max_concurrency=5)
+        start = time.monotonic()
+
+        for _ in range(30):
+            limiter.acquire()
+            limiter.release(0.01, status=200)
+
+        """Should spread requests beyond the first second's burst"""
+        self.assertGreaterEqual(time.monotonic() - start, 0.45)
+        self.assertEqual(limiter.get_stats()["requests"], 30)
+
+    def test_requests_per_second_validation(self):
+        """Is a rate of 0 treated as no limit, and a negative one refused?"""
+
+        session = PooledSession(requests_per_second=0)
+
+        """Should make requests without a limiter for 0"""
+        self.assertIsNone(session.get_limiter("https://sana.sy/"))
+
+        """Should refuse rates that aren't positive"""
+        with self.assertRaises(ValueError):
+            PooledSession(requests_per_second=-1)
+        with self.assertRaises(ValueError):
+            HostLimiter(requests_per_second=0, max_concurrency=5)
+
+    def test_session_backs_off_on_429(self):
+        """Does PooledSession slow down for a host that throttles it?"""
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), ThrottlingHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        try:
+            limiters = HostLimiterRegistry()
+            session = PooledSession(limiters=limiters)
+            url = f"http://127.0.0.1:{server.server_port}"
+
+            response = session.get(f"{url}/busy", timeout=10)
+            self.assertEqual(response.status_code, 429)
+
+            stats = limiters.get_stats()[f"127.0.0.1:{server.server_port}"]
+
+            """Should count the throttled request and cut the host's concurrency"""
+            self.assertEqual(stats["throttled"], 1)
+            self.assertEqual(stats["concurrency"], 1)
+
+            """Should leave other requests alone"""
+            self.assertEqual(session.get(url, timeout=10).status_code, 200)
+
+            session.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_retry_after_capped(self):
+        """Is a 429's pause capped however long Retry-After asks for?"""
+
+        limiter = HostLimiter(requests_per_second=10, max_concurrency=5)
+        limiter.acquire()
+
+        with mock.patch.object(limiter.bucket, "pause") as pause:
+            limiter.release(0.01, status=429, retry_after="86400")
+
+        """Should pause for at most MAX_RETRY_AFTER seconds"""
+        pause.assert_called_once_with(MAX_RETRY_AFTER)
+
+    def test_stop_event_interrupts_acquire(self):
+        """Does setting the stop event end a wait for a paused host?"""
+
+        limiter = HostLimiter(requests_per_second=10, max_concurrency=5)
+        limiter.acquire()
+        limiter.release(0.01, status=429, retry_after="30")
+
+        stop_event = threading.Event()
+        threading.Timer(0.1, stop_event.set).start()
+
+        start = time.monotonic()
+
+        """Should give up without taking a slot"""
+        self.assertFalse(limiter.acquire(stop_event=stop_event))
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(limiter.concurrency.in_flight, 0)
+
+    def test_counters_thread_safe(self):
+        """Are requests counted exactly when many threads release at once?"""
+
+        limiter = HostLimiter(requests_per_second=10_000, max_concurrency=100)
+
+        def make_requests():
+            for _ in range(500):
+                limiter.acquire()
+                limiter.release(0.001, status=503)
+
+        threads = [threading.Thread(target=make_requests) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = limiter.get_stats()
+
+        """Should lose no increments"""
+        self.assertEqual(stats["requests"], 4000)
+        self.assertEqual(stats["throttled"], 4000)
+
+
+def make_dez24_listing(links):
+    """Builds a DEZ24-style listing page containing the given links."""
+
+    articles = "".join(
+        f'<article><h2 class="entry-title"><a href="{link}">{link}</a></h2></article>'
+        for link in links
+    )
+    return BeautifulSoup(
+        f'<div class="vce-loop-wrap">{articles}</div>', "html.parser"
+    )
+
+
+class RevalidatingHandler(KeepAliveHandler):
+    """Handler that tags pages with an ETag and answers a matching
+    If-None-Match with 304. Requests are recorded on the server.
+    """
+
+    def do_GET(self):
+        self.server.seen.append((self.path, self.headers.get("If-None-Match")))
+
+        if self.path == "/missing":
+            self.send_response(404)
+        elif self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+        else:
+            return super().do_GET()
+
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def end_headers(self):
+        self.send_header("ETag", '"v1"')
+        super().end_headers()
+
+
+class HttpCacheTestCase(TestCase):
+    """Tests for http_cache.py"""
+
+    def setUp(self):
+        """Start a local server and create an empty cache directory."""
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), RevalidatingHandler)
+        self.server.seen = []
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def make_session(self, ttl):
+        cache = HttpCache(self.directory.name, default_ttl=ttl)
+        return PooledSession(requests_per_second=None, cache=cache)
+
+    def test_fresh_pages_skip_the_server(self):
+        """Is a fresh page served from disk without a request?"""
+
+        first = self.make_session(ttl=60).get(f"{self.url}/page", timeout=10)
+
+        """Should persist pages for later sessions and processes"""
+        session = self.make_session(ttl=60)
+        second = session.get(f"{self.url}/page", timeout=10)
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(len(self.server.seen), 1)
+        self.assertEqual(session.cache.get_stats()["hits"], 1)
+
+    def test_stale_pages_are_revalidated(self):
+        """Is a stale page revalidated with its ETag, reusing the body on 304?"""
+
+        first = self.make_session(ttl=0).get(f"{self.url}/page", timeout=10)
+
+        session = self.make_session(ttl=0)
+        second = session.get(f"{self.url}/page", timeout=10)
+
+        """Should send the stored ETag and keep the stored body"""
+        self.assertEqual(self.server.seen, [("/page", None), ("/page", '"v1"')])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(session.cache.get_stats()["revalidated"], 1)
+
+    def test_errors_not_cached(self):
+        """Are unsuccessful responses left out of the cache?"""
+
+        session = self.make_session(ttl=60)
+
+        for _ in range(2):
+            self.assertEqual(session.get(f"{self.url}/missing").status_code, 404)
+
+        """Should ask the server every time"""
+        self.assertEqual(len(self.server.seen), 2)
+
+    def test_ttl_rules(self):
+        """Do listing pages get their own TTL?"""
+
+        test_scraper = sana.SANA()
+        test_scraper.http_cache_dir = self.directory.name
+        cache = test_scraper.get_http_cache()
+
+        """Should match every listing page but no article page"""
+        pattern = get_listing_pattern(test_scraper.config.url_template)
+        self.assertTrue(pattern.match("https://sana.sy/?cat=29582&paged=12"))
+        self.assertFalse(pattern.match("https://sana.sy/?p=1949133"))
+
+        self.assertEqual(cache.rules, [CacheRule(pattern, cache.rules[0].ttl)])
+        self.assertLess(
+            cache.get_ttl("https://sana.sy/?cat=29582&paged=3"),
+            cache.get_ttl("https://sana.sy/?p=1949133"),
+        )
+
+        """Should not cache at all without a directory"""
+        self.assertIsNone(sana.SANA().get_http_cache())
+
+    def test_rescrape_from_cache(self):
+        """Is a second scrape of the same pages served from the cache?"""
+
+        stub_server = StubServer(padding_bytes=0).start()
+        stop_timestamp = get_stub_stop_timestamp(2)
+
+        results = []
+        for _ in range(2):
+            scraper = make_stub_scraper(stub_server, "sync")
+            scraper.http_cache_dir = self.directory.name
+            results.append(scraper.get_data(stop_timestamp))
+
+            if len(results) == 1:
+                first_run_requests = stub_server.request_count
+
+        stub_server.stop()
+
+        """Should return the same articles without downloading them again"""
+        self.assertEqual(results[1].article_list, results[0].article_list)
+
+        # Only articles past the stop timestamp that the first run cancelled
+        # before fetching may be new
+        self.assertLessEqual(
+            stub_server.request_count - first_run_requests, scraper.config.max_workers
+        )
+
+
+class ParsingTestCase(TestCase):
+    """Tests for parsing.py"""
+
+    def test_strain(self):
+        """Does a strainer keep only its target elements?"""
+
+        html = (
+            '<html><head><meta property="article:published_time" content="x"/>'
+            '<meta property="og:title" content="y"/></head><body>loose text'
+            '<div class="entry-content entry clearfix"><p>a</p><div>b</div></div>'
+            '<div class="footer"><p>c</p></div></body></html>'
+        )
+        strainer = strain(
+            ("div", {"class": "entry-content"}),
+            ("meta", {"property": "article:published_time"}),
+        )
+
+        for parser in ("lxml", "html.parser"):
+            soup = make_soup(html, parser=parser, parse_only=strainer)
+
+            """Should keep matching elements, with everything inside them"""
+            self.assertEqual(
+                str(soup),
+                '<meta content="x" property="article:published_time"/>'
+                '<div class="entry-content entry clearfix"><p>a</p><div>b</div></div>',
+            )
+
+            """Should still match the element's full class string"""
+            self.assertIsNotNone(
+                soup.find("div", class_="entry-content entry clearfix")
+            )
+
+    def test_strained_extraction_matches_full_parse(self):
+        """Do strained lxml pages give the same data as full html.parser pages?"""
+
+        server = StubServer(padding_bytes=2000).start()
+        stop_timestamp = get_stub_stop_timestamp(2)
+
+        results = []
+        for parser, strained in (("html.parser", False), ("lxml", True)):
+            scraper = make_stub_scraper(server, "sync")
+            scraper.config = scraper.config._replace(parser=parser)
+            if not strained:
+                scraper.config = scraper.config._replace(
+                    listing_strainer=None, article_strainer=None
+                )
+            results.append(scraper.get_data(stop_timestamp))
+
+        server.stop()
+
+        """Should scrape identical articles"""
+        self.assertEqual(len(results[0].article_list), 20)
+        self.assertEqual(results[1].article_list, results[0].article_list)
+
+
+class DeclarativeScraperTestCase(TestCase):
+    """Tests for declarative.py"""
+
+    def setUp(self):
+        """Create a scraper for a site defined only by its config."""
+
+        self.scraper = DeclarativeScraper(
+            ScraperConfig(
+                url_template="https://example.com/page/{page_num}",
+                publication="Example",
+                should_get_metadata_during_pagination=False,
+                selectors=SiteSelectors(
+                    listing="div.posts",
+                    articles="article",
+                    title="h2 a",
+                    link="h2 a @href",
+                    page_date_posted='meta[property="published"] @content',
+                    full_text="div.body",
+                ),
+            )
+        )
+
+    def test_listing_details(self):
+        """Are titles and links read with the configured selectors?"""
+
+        soup = make_soup(
+            '<div class="sidebar"><article><h2><a href="/x">x</a></h2></article>'
+            '</div><div class="posts">'
+            '<article><h2><a href="/a">A</a></h2></article>'
+            '<article><h2><a href="/b">B</a></h2></article></div>'
+        )
+        articles = self.scraper.get_all_articles(soup)
+
+        """Should only read articles within the listing"""
+        self.assertEqual(
+            self.scraper.get_listing_details(articles),
+            [["A", "/a", None], ["B", "/b", None]],
+        )
+
+    def test_listing_item_shared_lookup(self):
+        """Do fields read from the same element share a single lookup?"""
+
+        soup = make_soup('<article><h2><a href="/a">A</a></h2></article>')
+        original_first = Extractor.first
+
+        with mock.patch.object(Extractor, "first", autospec=True) as first:
+            first.side_effect = original_first
+            item = self.scraper.get_listing_item(soup.find("article"))
+
+        """Should return every field of the article"""
+        self.assertEqual(item, {"title": "A", "link": "/a", "date_posted": None})
+
+        """Should look the shared element up once"""
+        self.assertEqual(first.call_count, 1)
+
+    def test_parse_article(self):
+        """Is an article page's date and text read with the configured selectors?"""
+
+        soup = make_soup(
+            '<meta property="published" content="2023-07-23T12:00:00+00:00"/>'
+            '<div class="body"><p>one</p><div><p>nested</p></div><p>two</p></div>'
+        )
+
+        """Should return the date and the body's own paragraphs"""
+        self.assertEqual(
+            self.scraper.parse_article(soup),
+            {"date_posted": "2023-07-23T12:00:00+00:00", "full_text": "one\n\ntwo"},
+        )
+
+        """Should raise LookupError if a selector matches nothing"""
+        with self.assertRaises(LookupError):
+            self.scraper.parse_article(make_soup("<div></div>"))
+
+
+class StreamingFetchTestCase(TestCase):
+    """Tests for streamed listing pages (http_session.read_until)"""
+
+    def setUp(self):
+        """Start a stub server whose listing pages end in a large footer."""
+
+        self.server = StubServer(padding_bytes=200000).start()
+        self.scraper = make_stub_scraper(self.server, "streaming")
+        self.url = self.scraper.config.url_template.format(page_num=1)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_read_until(self):
+        """Does reading stop once the listing has closed?"""
+
+        session = PooledSession(requests_per_second=None)
+        until = self.scraper.config.listing_end
+
+        full = session.get(self.url, timeout=10)
+        streamed = session.get(self.url, timeout=10, until=until)
+
+        """Should skip the rest of the page"""
+        self.assertTrue(streamed.truncated)
+        self.assertLess(len(streamed.content), len(full.content) // 4)
+
+        """Should still list every article"""
+        listings = [
+            self.scraper.get_listing_details(
+                self.scraper.get_all_articles(self.scraper.make_soup(content))
+            )
+            for content in (full.content, streamed.content)
+        ]
+        self.assertEqual(len(listings[0]), 10)
+        self.assertEqual(listings[1], listings[0])
+
+        """Should read the whole page if the element never closes"""
+        missing = session.get(self.url, timeout=10, until=("div", {"id": "none"}))
+        self.assertFalse(missing.truncated)
+        self.assertEqual(missing.content, full.content)
+
+    def test_streamed_pages_cached(self):
+        """Is a listing streamed only in part served from the cache?"""
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = HttpCache(directory, default_ttl=60)
+            session = PooledSession(requests_per_second=None, cache=cache)
+            until = self.scraper.config.listing_end
+
+            streamed = session.get(self.url, timeout=10, until=until)
+
+            self.server.request_count = 0
+            cached = session.get(self.url, timeout=10, until=until)
+
+            """Should serve the second fetch from disk"""
+            self.assertEqual(self.server.request_count, 0)
+            self.assertEqual(cache.get_stats()["hits"], 1)
+            self.assertEqual(cached.content, streamed.content)
+
+            """Should keep the streamed part apart from the whole page"""
+            self.assertIsNone(cache.load(self.url))
+            full = session.get(self.url, timeout=10)
+            self.assertGreater(len(full.content), len(streamed.content))
+
+
+class ParsePoolTestCase(TestCase):
+    """Tests for parse_pool.py"""
+
+    def setUp(self):
+        """Start a parse pool and a local stub server."""
+
+        self.pool = ParsePool(max_workers=2)
+        self.server = StubServer(padding_bytes=0).start()
+
+    def tearDown(self):
+        self.pool.shutdown()
+        self.server.stop()
+
+    def test_extract_article(self):
+        """Does a worker process extract the same article as a thread?"""
+
+        scraper = make_stub_scraper(self.server, "sync")
+        link = f"{self.server.url}/sync/article/1/0/"
+
+        scraper.parse_pool = None
+        in_thread = scraper.get_full_text_and_date_posted(link)
+
+        scraper.parse_pool = self.pool
+        in_pool = scraper.get_full_text_and_date_posted(link)
+
+        """Should return the article's date and text"""
+        self.assertEqual(in_pool, in_thread)
+        self.assertTrue(in_pool[1].startswith("فقرة 0"))
+
+        """Should have parsed it in another process"""
+        self.assertIsNotNone(self.pool.executor)
+
+    def test_extract_article_error(self):
+        """Are errors from a scraper's hook raised in the scraper?"""
+
+        scraper = make_stub_scraper(self.server, "sync")
+        scraper.parse_pool = self.pool
+        scraper.prefetched_pages["missing"] = b"<html><body></body></html>"
+
+        """Should raise the worker's error"""
+        with self.assertRaises(LookupError):
+            scraper.get_full_text_and_date_posted("missing")
+
+
+class ConcurrentFetchTestCase(TestCase):
+    """Tests for concurrent article fetching in get_news_articles_by_page"""
+
+    def setUp(self):
+        """Create scraper with a fake listing page and fake article pages."""
+
+        self.dez24 = dez24.DEZ24()
+        self.links = ["a", "b", "c", "d"]
+        self.dates = {
+            "a": "2023-07-23T13:00:00+00:00",
+            "b": "2023-07-23T12:00:00+00:00",
+            "c": "2023-07-23T11:00:00+00:00",
+            "d": "2023-07-23T10:00:00+00:00",
+        }
+
+    def tearDown(self):
+        base_scraper.STOP_EVENT.clear()
+
+    def fake_article(self, link):
+        """Earlier articles respond slowest so completion order is reversed."""
+
+        time.sleep(0.05 * (len(self.links) - self.links.index(link)))
+        return [self.dates[link], f"text {link}"]
+
+    def test_keeps_page_order_and_stop_timestamp(self):
+        """Are articles returned in page order, stopping at stop_timestamp?"""
+
+        stop_timestamp = self.dez24.get_timestamp("2023-07-23T10:30:00+00:00")
+
+        with mock.patch.object(
+            self.dez24, "get_soup", return_value=make_dez24_listing(self.links)
+        ), mock.patch.object(
+            self.dez24, "get_full_text_and_date_posted", side_effect=self.fake_article
+        ):
+            scrape_result = self.dez24.get_news_articles_by_page(
+                stop_timestamp=stop_timestamp
+            )
+
+        """Should keep listing order and stop at the first article past the limit"""
+        self.assertTrue(scrape_result.success)
+        self.assertEqual(
+            [a["link"] for a in scrape_result.article_list], ["a", "b", "c"]
+        )
+        self.assertEqual(scrape_result.article_list[0]["full_text"], "text a")
+
+    def test_stop_event_mid_batch(self):
+        """Does setting STOP_EVENT mid-batch stop the scraper?"""
+
+        def stopping_article(link):
+            if link == "b":
+                base_scraper.STOP_EVENT.set()
+            return [self.dates[link], f"text {link}"]
+
+        # A single worker makes the fetch order deterministic
+        self.dez24.config = self.dez24.config._replace(max_workers=1)
+
+        with mock.patch.object(
+            self.dez24, "get_soup", return_value=make_dez24_listing(self.links)
+        ), mock.patch.object(
+            self.dez24, "get_full_text_and_date_posted", side_effect=stopping_article
+        ):
+            scrape_result = self.dez24.get_news_articles_by_page(stop_timestamp=1)
+
+        """Should only keep articles gathered before the stop event was set"""
+        self.assertEqual([a["link"] for a in scrape_result.article_list], ["a"])
+
+    def test_skips_failed_article(self):
+        """Is a single bad article recorded and skipped?"""
+
+        stop_timestamp = self.dez24.get_timestamp("2023-07-23T10:30:00+00:00")
+
+        def failing_article(link):
+            if link == "b":
+                raise ScrapingError("Server responded with 404", link, status_code=404)
+            return [self.dates[link], f"text {link}"]
+
+        with mock.patch.object(
+            self.dez24, "get_soup", return_value=make_dez24_listing(self.links)
+        ), mock.patch.object(
+            self.dez24, "get_full_text_and_date_posted", side_effect=failing_article
+        ):
+            scrape_result = self.dez24.get_news_articles_by_page(
+                stop_timestamp=stop_timestamp
+            )
+
+        """Should keep scraping the rest of the publication"""
+        self.assertTrue(scrape_result.success)
+        self.assertEqual(
+            [a["link"] for a in scrape_result.article_list], ["a", "c"]
+        )
+
+        """Should record the failed article"""
+        self.assertEqual(
+            scrape_result.failed_articles,
+            [{"link": "b", "error": "Server responded with 404", "status_code": 404}],
+        )
+
+    def test_every_article_failed(self):
+        """Does a page where every article fails end the publication?"""
+
+        with mock.patch.object(
+            self.dez24, "get_soup", return_value=make_dez24_listing(self.links)
+        ), mock.patch.object(
+            self.dez24, "get_full_text_and_date_posted", side_effect=AttributeError
+        ):
+            scrape_result = self.dez24.get_news_articles_by_page(stop_timestamp=1)
+
+        """Should return an unsuccessful result instead of paginating blindly"""
+        self.assertFalse(scrape_result.success)
+        self.assertEqual(scrape_result.error_message, "Every article on page 1 failed")
+        self.assertEqual(len(scrape_result.failed_articles), 4)
+
+
+class RetryPolicyTestCase(TestCase):
+    """Tests for retry.py"""
+
+    def test_is_retryable(self):
+        """Are transient errors retried and everything else fatal?"""
+
+        policy = RetryPolicy()
+
+        """Should retry connection errors, throttling and server errors"""
+        self.assertTrue(policy.is_retryable(ScrapingError("Timed out", "url")))
+        self.assertTrue(
+            policy.is_retryable(ScrapingError("Busy", "url", status_code=429))
+        )
+        self.assertTrue(
+            policy.is_retryable(ScrapingError("Down", "url", status_code=503))
+        )
+
+        """Should not retry client errors or parsing errors"""
+        self.assertFalse(
+            policy.is_retryable(ScrapingError("Missing", "url", status_code=404))
+        )
+        self.assertFalse(policy.is_retryable(AttributeError()))
+
+    def test_retries_until_success(self):
+        """Does call retry retryable errors until the request succeeds?"""
+
+        policy = RetryPolicy(max_attempts=3, backoff_base=0)
+        request = mock.Mock(
+            side_effect=[
+                ScrapingError("Down", "url", status_code=503),
+                ScrapingError("Timed out", "url"),
+                "content",
+            ]
+        )
+
+        """Should return the successful response"""
+        self.assertEqual(policy.call(request, "url"), "content")
+        self.assertEqual(request.call_count, 3)
+
+    def test_gives_up(self):
+        """Does call raise after max_attempts, or at once for fatal errors?"""
+
+        policy = RetryPolicy(max_attempts=3, backoff_base=0)
+
+        request = mock.Mock(side_effect=ScrapingError("Down", "url", status_code=503))
+        with self.assertRaises(ScrapingError):
+            policy.call(request, "url")
+
+        """Should make max_attempts attempts"""
+        self.assertEqual(request.call_count, 3)
+
+        request = mock.Mock(side_effect=ScrapingError("Gone", "url", status_code=410))
+        with self.assertRaises(ScrapingError):
+            policy.call(request, "url")
+
+        """Should not retry fatal errors"""
+        self.assertEqual(request.call_count, 1)
+
+    def test_backoff(self):
+        """Is the backoff jittered, capped and overridden by Retry-After?"""
+
+        policy = RetryPolicy(backoff_base=1, backoff_max=4)
+        error = ScrapingError("Down", "url", status_code=503)
+
+        """Should stay within the exponential bound and the cap"""
+        for attempt in range(6):
+            self.assertLessEqual(
+                policy.get_backoff_seconds(error, attempt), min(4, 2**attempt)
+            )
+
+        """Should wait as long as the server asks"""
+        error = ScrapingError("Busy", "url", status_code=429, retry_after="3")
+        self.assertEqual(policy.get_backoff_seconds(error, 0), 3)
+
+    def test_stop_event_interrupts_backoff(self):
+        """Does setting the stop event end the wait between attempts?"""
+
+        policy = RetryPolicy(backoff_base=60, backoff_max=60)
+        request = mock.Mock(side_effect=ScrapingError("Down", "url", status_code=503))
+        stop_event = threading.Event()
+        stop_event.set()
+
+        start = time.monotonic()
+        with self.assertRaises(ScrapingError):
+            policy.call(request, "url", stop_event=stop_event)
+
+        """Should raise without waiting out the backoff"""
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(request.call_count, 1)
+
+
+class IncrementalScrapeTestCase(TestCase):
+    """Tests for incremental scrapes with a HighWaterMark"""
+
+    def setUp(self):
+        """Create scraper with a fake listing page and fake article pages."""
+
+        self.dez24 = dez24.DEZ24()
+        self.dates = {
+            "a": "2023-07-23T13:00:00+00:00",
+            "b": "2023-07-23T12:00:00+00:00",
+            "c": "2023-07-23T11:00:00+00:00",
+            "d": "2023-07-23T10:00:00+00:00",
+        }
+
+    def scrape(self, high_water_mark, known_links=None, stop_timestamp=1):
+        with mock.patch.object(
+            self.dez24, "get_soup", return_value=make_dez24_listing(list(self.dates))
+        ), mock.patch.object(
+            self.dez24,
+            "get_full_text_and_date_posted",
+            side_effect=lambda link: [self.dates[link], f"text {link}"],
+        ) as mock_article:
+            scrape_result = self.dez24.get_news_articles_by_page(
+                stop_timestamp=stop_timestamp,
+                high_water_mark=high_water_mark,
+                known_links=known_links,
+            )
+
+        return scrape_result, [c.args[0] for c in mock_article.call_args_list]
+
+    def test_stops_at_known_link(self):
+        """Does an incremental scrape stop at the newest known link?"""
+
+        mark = HighWaterMark(
+            date_posted=self.dez24.get_timestamp(self.dates["c"]), link="c"
+        )
+
+        [scrape_result, fetched] = self.scrape(mark)
+
+        """Should only return and fetch articles newer than the mark"""
+        self.assertEqual([a["link"] for a in scrape_result.article_list], ["a", "b"])
+        self.assertEqual(sorted(fetched), ["a", "b"])
+
+    def test_stops_at_older_timestamp(self):
+        """Does an incremental scrape stop at articles older than the mark?"""
+
+        mark = HighWaterMark(
+            date_posted=self.dez24.get_timestamp("2023-07-23T11:30:00+00:00"),
+            link="removed",
+        )
+
+        [scrape_result, fetched] = self.scrape(mark)
+
+        """Should stop at the first article older than the mark"""
+        self.assertEqual([a["link"] for a in scrape_result.article_list], ["a", "b"])
+
+    def test_skips_known_links(self):
+        """Are links already in the db skipped without being fetched?"""
+
+        known_links = {"b": self.dez24.get_timestamp(self.dates["b"])}
+
+        # Stops after the last article on the page
+        stop_timestamp = self.dez24.get_timestamp(self.dates["d"])
+
+        [scrape_result, fetched] = self.scrape(
+            None, known_links=known_links, stop_timestamp=stop_timestamp
+        )
+
+        """Should neither fetch nor return the known article"""
+        self.assertEqual(
+            [a["link"] for a in scrape_result.article_list], ["a", "c", "d"]
+        )
+        self.assertEqual(sorted(fetched), ["a", "c", "d"])
+
+    def test_known_links_drive_stop_timestamp(self):
+        """Does a skipped article's stored timestamp still stop the scrape?"""
+
+        known_links = {"c": 1.0}
+
+        with mock.patch.object(
+            self.dez24, "get_soup", return_value=make_dez24_listing(list(self.dates))
+        ), mock.patch.object(
+            self.dez24,
+            "get_full_text_and_date_posted",
+            side_effect=lambda link: [self.dates[link], f"text {link}"],
+        ):
+            scrape_result = self.dez24.get_news_articles_by_page(
+                stop_timestamp=100, known_links=known_links
+            )
+
+        """Should stop at the stored article older than the stop timestamp"""
+        self.assertEqual([a["link"] for a in scrape_result.article_list], ["a", "b"])
+
+    def test_reached_high_water_mark(self):
+        """Does reached_high_water_mark return correct boolean?"""
+
+        mark = HighWaterMark(date_posted=1000, link="known")
+
+        """Should return True for the known link or an older article"""
+        self.assertTrue(self.dez24.reached_high_water_mark(mark, link="known"))
+        self.assertTrue(self.dez24.reached_high_water_mark(mark, current_timestamp=1))
+
+        """Should return False for a new article posted on the same date"""
+        self.assertFalse(
+            self.dez24.reached_high_water_mark(mark, link="new", current_timestamp=1000)
+        )
+
+        """Should return False if no mark is given"""
+        self.assertFalse(self.dez24.reached_high_water_mark(None, link="known"))
+
+
+class AsyncScraperTestCase(TestCase):
+    """Tests for async_scraper.py"""
+
+    def setUp(self):
+        """Start a local stub server."""
+
+        self.server = StubServer(padding_bytes=0).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_crawl_matches_sync_engine(self):
+        """Does an unchanged scraper return the same data on the asyncio engine?"""
+
+        stop_timestamp = get_stub_stop_timestamp(2)
+
+        sync_result = make_stub_scraper(self.server, "sync").get_data(stop_timestamp)
+        [async_result] = crawl(
+            [make_stub_scraper(self.server, "sync")], stop_timestamp
+        )
+
+        """Should gather both pages of articles in the same order"""
+        self.assertTrue(async_result.success)
+        self.assertEqual(len(async_result.article_list), 20)
+        self.assertEqual(async_result.article_list, sync_result.article_list)
+
+    def test_crawl_error(self):
+        """Does a failing publication return an unsuccessful ScrapeResult?"""
+
+        scraper = make_stub_scraper(self.server, "missing")
+        scraper.config = scraper.config._replace(
+            url_template=f"{self.server.url}/missing/{{page_num}}/"
+        )
+
+        [result] = crawl([scraper], get_stub_stop_timestamp(1))
+
+        """Should report the server error without raising"""
+        self.assertFalse(result.success)
+        self.assertEqual(result.error_message, "Server responded with 404")
+
+    def test_crawl_uses_http_cache(self):
+        """Does the asyncio engine serve pages from the scraper's HttpCache?"""
+
+        stop_timestamp = get_stub_stop_timestamp(2)
+
+        with tempfile.TemporaryDirectory() as directory:
+            scrapers = [make_stub_scraper(self.server, "sync") for _ in range(2)]
+            for scraper in scrapers:
+                scraper.http_cache_dir = directory
+
+            [first] = crawl([scrapers[0]], stop_timestamp)
+            [second] = crawl([scrapers[1]], stop_timestamp)
+
+        """Should read every article page of the second crawl from disk"""
+        self.assertGreaterEqual(scrapers[1].session.cache.get_stats()["hits"], 20)
+        self.assertEqual(second.article_list, first.article_list)
+
+    def test_crawl_uses_host_limiter(self):
+        """Does the asyncio engine keep to the scraper's host limits?"""
+
+        limiters = HostLimiterRegistry()
+        scraper = make_stub_scraper(self.server, "sync")
+        scraper._session = PooledSession(requests_per_second=1000, limiters=limiters)
+
+        crawl([scraper], get_stub_stop_timestamp(2))
+
+        """Should count both listing pages and their articles against the host"""
+        [stats] = limiters.get_stats().values()
+        self.assertGreaterEqual(stats["requests"], 22)
+
+    def test_crawl_calls_sink_off_the_loop(self):
+        """Are blocking sinks kept off the asyncio engine's event loop?"""
+
+        threads = []
+
+        def sink(batch):
+            threads.append(threading.current_thread())
+
+        crawl(
+            [make_stub_scraper(self.server, "sync")],
+            get_stub_stop_timestamp(2),
+            sink=sink,
+            batch_size=5,
+            on_checkpoint=lambda checkpoint: threads.append(
+                threading.current_thread()
+            ),
+        )
+
+        """Should call the sink and on_checkpoint from worker threads"""
+        self.assertTrue(threads)
+        self.assertNotIn(threading.current_thread(), threads)
+
+
+class StreamingScrapeTestCase(TestCase):
+    """Tests for streaming articles out of a ScrapeResult in batches"""
+
+    def setUp(self):
+        """Start a local stub server."""
+
+        self.server = StubServer(padding_bytes=0).start()
+        self.batches = []
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_add_article_flushes_batches(self):
+        """Does ScrapeResult hand full batches to its sink?"""
+
+        result = ScrapeResult(sink=self.batches.append, batch_size=2)
+
+        for i in range(5):
+            result.add_article({"date_posted": i, "link": str(i)})
+
+        """Should only buffer the current partial batch"""
+        self.assertEqual([len(b) for b in self.batches], [2, 2])
+        self.assertEqual(len(result.article_list), 1)
+
+        result.flush()
+
+        """Should count and track every article, including flushed ones"""
+        self.assertEqual([len(b) for b in self.batches], [2, 2, 1])
+        self.assertEqual(result.article_count, 5)
+        self.assertEqual(result.get_newest_article()["link"], "4")
+
+    def test_get_data_streams_to_sink(self):
+        """Do both engines stream every article to the sink?"""
+
+        stop_timestamp = get_stub_stop_timestamp(2)
+
+        sync_result = make_stub_scraper(self.server, "sync").get_data(
+            stop_timestamp, sink=self.batches.append, batch_size=3
+        )
+
+        """Should stream all articles in order and keep none buffered"""
+        self.assertEqual(sync_result.article_list, [])
+        self.assertEqual(sync_result.article_count, 20)
+        self.assertEqual(len([a for b in self.batches for a in b]), 20)
+
+        async_batches = []
+        [async_result] = crawl(
+            [make_stub_scraper(self.server, "async")],
+            stop_timestamp,
+            sink=async_batches.append,
+            batch_size=3,
+        )
+
+        sync_links = [a["link"] for b in self.batches for a in b]
+        async_links = [a["link"] for b in async_batches for a in b]
+
+        self.assertEqual(async_result.article_list, [])
+        self.assertEqual(async_links, [l.replace("sync", "async") for l in sync_links])
+
+
+class CheckpointScrapeTestCase(TestCase):
+    """Tests for checkpointing and resuming a scrape"""
+
+    def setUp(self):
+        """Start a local stub server."""
+
+        self.server = StubServer(padding_bytes=0).start()
+        self.events = []
+
+    def tearDown(self):
+        self.server.stop()
+
+    def record_batch(self, batch):
+        self.events.append(("batch", [a["link"] for a in batch]))
+
+    def record_checkpoint(self, checkpoint):
+        self.events.append(("checkpoint", checkpoint))
+
+    def test_checkpoint_after_each_page(self):
+        """Is a checkpoint handed over after every completed listing page?"""
+
+        make_stub_scraper(self.server, "sync").get_data(
+            get_stub_stop_timestamp(3),
+            sink=self.record_batch,
+            on_checkpoint=self.record_checkpoint,
+        )
+
+        """Should flush each page's articles before its checkpoint"""
+        self.assertEqual(
+            [kind for kind, _ in self.events],
+            ["batch", "checkpoint"] * 3,
+        )
+
+        """Should record the page, its oldest timestamp and its links"""
+        [_, page_2_links] = self.events[2]
+        [_, checkpoint] = self.events[3]
+        self.assertEqual(checkpoint.publication, "sync")
+        self.assertEqual(checkpoint.page_num, 2)
+        self.assertEqual(list(checkpoint.links), page_2_links)
+        self.assertEqual(checkpoint.last_timestamp, min(checkpoint.links.values()))
+
+    def test_resume_from_checkpoint(self):
+        """Does a resumed scrape skip the pages its checkpoint covers?"""
+
+        stop_timestamp = get_stub_stop_timestamp(3)
+        full_result = make_stub_scraper(self.server, "sync").get_data(stop_timestamp)
+
+        checkpoint = Checkpoint(
+            publication="sync", page_num=2, last_timestamp=None, links={}
+        )
+
+        scraper = make_stub_scraper(self.server, "sync")
+        with mock.patch.object(
+            scraper, "get_soup", wraps=scraper.get_soup
+        ) as mock_get_soup:
+            result = scraper.get_data(stop_timestamp, checkpoint=checkpoint)
+
+        urls = [c.kwargs["url"] for c in mock_get_soup.call_args_list]
+
+        """Should start at the third page without fetching earlier ones"""
+        self.assertEqual(result.article_list, full_result.article_list[20:])
+        self.assertTrue(urls[0].endswith("/sync/page/3/"))
+        self.assertFalse(
+            [url for url in urls if url.endswith(("/page/1/", "/page/2/"))]
+        )
+
+        """Should resume the same way on the asyncio engine"""
+        [async_result] = crawl(
+            [make_stub_scraper(self.server, "sync")],
+            stop_timestamp,
+            checkpoints={"sync": checkpoint},
+        )
+        self.assertEqual(async_result.article_list, result.article_list)
+
+
 class DEZ24TestCase(TestCase):
     """Test for dez24.py"""
 
@@ -1,6 +1,7 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from unittest import TestCase, mock
-from sdb.models import db, Collection, Entry
+from sdb.models import db, Collection, Entry, CacheEntry
 
 os.environ["DATABASE_URL"] = "postgresql:///sdb_test"
 
@@ -10,6 +11,13 @@ from sdb.translation import (
     initialize_argostranslate,
     translate_ar_to_en,
     get_translated_entry_title_and_text,
+    TranslationEngine,
+    TranslationError,
+    ENGINE,
+    TRANSLATION_MEMORY,
+    split_segments,
+    translate_batch,
+    translate_entries_batch,
 )
 
 db.drop_all()
@@ -28,6 +36,8 @@ class TranslationTestCase(TestCase):
 
         Collection.query.delete()
         Entry.query.delete()
+        CacheEntry.query.delete()
+        TRANSLATION_MEMORY.clear()
 
         self.client = app.test_client()
 
@@ -57,11 +67,17 @@ class TranslationTestCase(TestCase):
         """Should run without throwing error"""
         initialize_argostranslate()
 
+    def mock_translator(self, return_value="test"):
+        """Patches the shared engine with an already warm translator."""
+
+        translator = mock.Mock()
+        translator.translate.return_value = return_value
+        return mock.patch.object(ENGINE, "warm_up", return_value=translator)
+
     def test_translate_ar_to_en(self):
         """Does translate_ar_to_en run without error?"""
 
-        with mock.patch("argostranslate.translate.translate") as mocked_translation:
-            mocked_translation.return_value = "test"
+        with self.mock_translator():
 
             """Should run without throwing error"""
             translation = translate_ar_to_en("اختبار")
@@ -72,8 +88,7 @@ class TranslationTestCase(TestCase):
     def test_get_translated_entry_title_and_text(self):
         """Does test_get_translated_entry_title_and_text return translated title and text in list?"""
 
-        with mock.patch("argostranslate.translate.translate") as mocked_translation:
-            mocked_translation.return_value = "test"
+        with self.mock_translator():
 
             """Should run without throwing error"""
             [en_title, en_full_text] = get_translated_entry_title_and_text(self.entry)
@@ -81,3 +96,201 @@ class TranslationTestCase(TestCase):
             """Should return mocked return value"""
             self.assertEqual(en_title, "test")
             self.assertEqual(en_full_text, "test")
+
+    def test_engine_loads_once(self):
+        """Does the engine install and load the model only once per process?"""
+
+        engine = TranslationEngine()
+        translator = mock.Mock()
+        translator.translate.return_value = "test"
+
+        with mock.patch.object(
+            engine, "is_installed", return_value=False
+        ), mock.patch.object(engine, "install") as mock_install, mock.patch.object(
+            engine, "load", return_value=translator
+        ) as mock_load:
+            engine.translate("اختبار")
+            engine.translate("اختبار")
+
+        """Should install and load once, then reuse the warm translator"""
+        mock_install.assert_called_once()
+        mock_load.assert_called_once()
+        self.assertEqual(translator.translate.call_count, 2)
+
+        """Should report itself as ready"""
+        status = engine.get_status()
+        self.assertEqual(status["status"], "ready")
+        self.assertEqual(status["translations"], 2)
+
+    def test_engine_offline_install(self):
+        """Does the engine install from a local model directory without network?"""
+
+        engine = TranslationEngine(model_dir="/models")
+
+        files = ["readme.txt", "ar_en.argosmodel"]
+
+        with mock.patch("os.listdir", return_value=files), mock.patch(
+            "argostranslate.package.install_from_path"
+        ) as mock_install, mock.patch(
+            "argostranslate.package.update_package_index"
+        ) as mock_update, mock.patch.object(
+            engine, "is_installed", return_value=True
+        ):
+            engine.install()
+
+        """Should install only the local model file, without the package index"""
+        mock_install.assert_called_once_with("/models/ar_en.argosmodel")
+        mock_update.assert_not_called()
+
+    def test_engine_error_status(self):
+        """Does a failed warm up raise TranslationError and report the error?"""
+
+        engine = TranslationEngine()
+
+        with mock.patch.object(
+            engine, "is_installed", side_effect=Exception("No network")
+        ):
+            """Should raise TranslationError"""
+            with self.assertRaises(TranslationError):
+                engine.warm_up()
+
+        """Should report the error in its status"""
+        self.assertEqual(engine.get_status()["status"], "error")
+        self.assertEqual(engine.get_status()["error"], "No network")
+
+    def test_split_segments(self):
+        """Does split_segments split text into paragraphs and breaks?"""
+
+        text = "جملة أولى. جملة ثانية؟\n\nفقرة ثانية\n"
+
+        """Should keep whole paragraphs, with the breaks between them"""
+        self.assertEqual(
+            split_segments(text),
+            ["جملة أولى. جملة ثانية؟", "\n\n", "فقرة ثانية", "\n", ""],
+        )
+
+    def test_translate_batch(self):
+        """Does translate_batch translate each unique paragraph once, in order?"""
+
+        translator = self.make_line_translator()
+
+        with mock.patch.object(ENGINE, "warm_up", return_value=translator):
+            translated = translate_batch(
+                ["أ. ب\n\nج\n\n", None, "ج"], processes=1
+            )
+
+        """Should send whole paragraphs to the translator in one call"""
+        translator.translate.assert_called_once_with("أ. ب\nج")
+
+        """Should rebuild paragraphs with their original breaks, in order"""
+        self.assertEqual(translated, ["en(أ. ب)\n\nen(ج)\n\n", None, "en(ج)"])
+
+    def make_line_translator(self):
+        """Returns a mock translator that translates its input line by line,
+        like Argos does.
+        """
+
+        translator = mock.Mock()
+        translator.translate.side_effect = lambda text: "\n".join(
+            f"en({line})" for line in text.split("\n")
+        )
+        return translator
+
+    def test_translate_many_fallback(self):
+        """Are paragraphs translated one at a time if lines come back merged?"""
+
+        translator = mock.Mock()
+        translator.translate.side_effect = lambda text: text.replace("\n", " ")
+
+        with mock.patch.object(ENGINE, "warm_up", return_value=translator):
+            translated = ENGINE.translate_many(["أ", "ب"])
+
+        """Should still return one translation per paragraph"""
+        self.assertEqual(translated, ["أ", "ب"])
+        self.assertEqual(translator.translate.call_count, 3)
+
+    def test_worker_only_loads(self):
+        """Do pool workers load the model without installing it?"""
+
+        engine = TranslationEngine()
+
+        with mock.patch.object(engine, "install") as mock_install, mock.patch.object(
+            engine, "is_installed", return_value=False
+        ), mock.patch.object(engine, "load", return_value=mock.Mock()):
+            engine.warm_up(install=False)
+
+        """Should leave installing to the parent process"""
+        mock_install.assert_not_called()
+
+    def test_translate_batch_pool(self):
+        """Does translate_batch spread large jobs across a pool of workers?"""
+
+        translator = self.make_line_translator()
+        texts = [f"فقرة {i}.\n\nجملة {i}." for i in range(5)]
+
+        # Threads stand in for worker processes so the mocked engine is shared
+        def make_pool(max_workers, initializer, **kwargs):
+            return ThreadPoolExecutor(max_workers=max_workers, initializer=initializer)
+
+        with mock.patch.object(
+            ENGINE, "warm_up", return_value=translator
+        ), mock.patch.object(
+            ENGINE, "ensure_installed"
+        ) as mock_ensure_installed, mock.patch(
+            "sdb.translation.MIN_SEGMENTS_FOR_POOL", 0
+        ), mock.patch(
+            "sdb.translation.ProcessPoolExecutor", side_effect=make_pool
+        ) as mock_pool:
+            progress = []
+            translated = translate_batch(
+                texts,
+                processes=4,
+                batch_size=3,
+                on_progress=lambda done, total: progress.append((done, total)),
+            )
+
+        """Should use one worker per process, up to the number of batches"""
+        self.assertEqual(mock_pool.call_args.kwargs["max_workers"], 4)
+
+        """Should install the model once, before starting the workers"""
+        mock_ensure_installed.assert_called_once()
+
+        """Should translate each batch in a single call"""
+        self.assertEqual(translator.translate.call_count, 4)
+
+        """Should report progress after every batch"""
+        self.assertEqual(progress, [(3, 10), (6, 10), (9, 10), (10, 10)])
+
+        """Should return every translation in order"""
+        self.assertEqual(
+            translated,
+            [f"en(فقرة {i}.)\n\nen(جملة {i}.)" for i in range(5)],
+        )
+
+    def test_translate_entries_batch(self):
+        """Does translate_entries_batch return titles and texts per entry?"""
+
+        with self.mock_translator():
+            """Should return a [title, full_text] pair per entry"""
+            self.assertEqual(
+                translate_entries_batch([self.entry], processes=1),
+                [["test", None]],
+            )
+
+    def test_translation_memory(self):
+        """Are repeated segments served from the translation memory?"""
+
+        translator = mock.Mock()
+        translator.translate.side_effect = lambda text: f"en({text})"
+
+        with mock.patch.object(ENGINE, "warm_up", return_value=translator):
+            translate_batch(["المصدر: سانا"], processes=1)
+            TRANSLATION_MEMORY.clear()
+            translated = translate_batch(["المصدر:  سانا\nخبر"], processes=1)
+
+        """Should only translate the new segment"""
+        self.assertEqual(translated, ["en(المصدر: سانا)\nen(خبر)"])
+        self.assertEqual(translator.translate.call_count, 2)
+
+        """Should report the durable hit"""
+        self.assertEqual(TRANSLATION_MEMORY.get_stats()["db_hits"], 1)